@@ -4,21 +4,47 @@ import sys
 import sqlite3
 import logging
 import queue
+import asyncio
 import threading
+import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from concurrent import futures
 from comm import chat_pb2
 from comm import chat_pb2_grpc
 from config import config
+from stream_budget import StreamBudgetInterceptor
 
 class ChatService(chat_pb2_grpc.ChatServiceServicer):
     def __init__(self):
-        self.db_connection = sqlite3.connect('chat_database.db', check_same_thread=False)
+        self.db_name = 'chat_database.db'
+        self.db_local = threading.local()  # Per-thread database connection
         self.initialize_database()
         self.active_users = {}  # Dictionary to store active user streams
         self.message_queues = {}  # Store queues for active users
         self.lock = threading.Lock()
 
+    @property
+    def db_connection(self):
+        """
+        This thread's connection to the database, opened on first use.
+        Each gRPC worker thread gets its own, so reads are not serialized behind other requests.
+        """
+        connection = getattr(self.db_local, "connection", None)
+        if connection is None:
+            connection = self.db_local.connection = self.connect_database()
+        return connection
+
+    def connect_database(self):
+        """
+        Open a connection to the database with WAL journaling, so readers do not block writers.
+        """
+        connection = sqlite3.connect(self.db_name, timeout=config.SQLITE_BUSY_TIMEOUT)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        connection.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+        return connection
+
     def initialize_database(self):
         """Creates necessary tables if they do not exist."""
         with self.db_connection: # automatically commit
@@ -28,7 +54,8 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 uuid INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT NOT NULL,
                 pwd TEXT NOT NULL,
-                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1))
+                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1)),
+                inbox_count INTEGER NOT NULL DEFAULT 0
             )
             ''')
 
@@ -52,6 +79,50 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 checked INTEGER NOT NULL CHECK (checked IN (0, 1))
             )
             ''')
+            self.create_indexes(cursor)
+            # Databases created before inbox counters existed start from their current inbox sizes
+            if "inbox_count" in self.add_missing_columns(cursor, "accounts", {"inbox_count": "INTEGER NOT NULL DEFAULT 0"}):
+                self.recount_inboxes(cursor)
+
+    def create_indexes(self, cursor):
+        """
+        Index the columns the per-user queries filter on, so they do not scan whole tables.
+        Usernames become UNIQUE, unless a database from before that already holds duplicates: those are reported and
+        left for the operator to merge, with a plain index on the column meanwhile. No account is deleted here.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_accounts_username'")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT username FROM accounts GROUP BY username HAVING COUNT(*) > 1 ORDER BY username")
+            duplicates = [row[0] for row in cursor.fetchall()]
+            if duplicates:
+                print(f"[SERVER] Usernames held by more than one account, not indexed as UNIQUE: {', '.join(duplicates)}")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_username_nonunique ON accounts (username)")
+            else:
+                cursor.execute("CREATE UNIQUE INDEX idx_accounts_username ON accounts (username)")
+                cursor.execute("DROP INDEX IF EXISTS idx_accounts_username_nonunique")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_username_inbox ON messages (username, inbox)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_drafts_username ON drafts (username)")
+
+    def add_missing_columns(self, cursor, table, columns):
+        """
+        Add the columns (name -> SQL definition) that an existing table does not have yet.
+        Return: names of the columns that were added
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = [name for name in columns if name not in existing]
+        for name in added:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+        return added
+
+    def recount_inboxes(self, cursor):
+        """
+        Set every account's inbox_count from its messages; writes keep it up to date afterwards.
+        """
+        cursor.execute("""
+            UPDATE accounts SET inbox_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.username = accounts.username AND messages.inbox = 1)
+        """)
 
     def CreateAccount(self, request, context):
         """
@@ -63,7 +134,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
 
         self.active_users[username] = context
         if username not in self.message_queues:
-            self.message_queues[username] = queue.Queue()
+            self.message_queues[username] = self.new_message_queue()
         
         try:
             with self.db_connection: # ensures commit or rollback
@@ -87,12 +158,12 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
 
         self.active_users[username] = context
         if username not in self.message_queues:
-            self.message_queues[username] = queue.Queue()
+            self.message_queues[username] = self.new_message_queue()
         
         try:
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("SELECT uuid FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
+                cursor.execute("SELECT uuid, inbox_count FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
                 account = cursor.fetchone()
                 if account is not None:
                     cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
@@ -141,7 +212,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                     ]
                                      
                     cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
-                    return chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=len(new_message_list), old_messages=old_message_list, inbox_messages=new_message_list, drafts=draft_list)
+                    return chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=account[1], old_messages=old_message_list, inbox_messages=new_message_list, drafts=draft_list)
                 else:
                     print(f"Login Invalid Credentials")
                     return chat_pb2.LoginResponse(success=False, message="Invalid credentials")
@@ -265,7 +336,9 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             # Update inbox status
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("UPDATE messages SET inbox = 0 WHERE username = ? AND msg_id = ?", (username, msg_id,))
+                cursor.execute("UPDATE messages SET inbox = 0 WHERE username = ? AND msg_id = ? AND inbox = 1", (username, msg_id,))
+                if cursor.rowcount > 0:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (username,))
                 return chat_pb2.GenericResponse(success=True, message="Message downloaded from inbox")
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Message unable to download from inbox")
@@ -282,7 +355,10 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             # Remove message from messages table
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM messages WHERE msg_id = ?", (msg_id,))
+                cursor.execute("DELETE FROM messages WHERE msg_id = ? RETURNING username, inbox", (msg_id,))
+                deleted = cursor.fetchall()
+                if deleted and deleted[0][1] == 1:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (deleted[0][0],))
                 return chat_pb2.GenericResponse(success=True, message="Message deleted")
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Message unable to delete")
@@ -294,8 +370,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
             # Remove messages sent to the username, username's drafts, and user's account information
@@ -315,8 +390,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
             with self.db_connection: # ensures commit or rollback
@@ -354,8 +428,8 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 """, (recipient, sender, content, 0, 1))
                 msg_id = cursor.fetchone()[0]
 
-                # Get the recipient's new inbox count
-                cursor.execute("SELECT COUNT(*) FROM messages WHERE username = ? AND inbox = 1", (recipient,))
+                # Bump the recipient's inbox counter; its new value goes out with the push
+                cursor.execute("UPDATE accounts SET inbox_count = inbox_count + 1 WHERE username = ? RETURNING inbox_count", (recipient,))
                 new_inbox_count = cursor.fetchone()[0]
                 # If recipient is online, push message to their queue
                 with self.lock:
@@ -376,37 +450,168 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
     def ReceiveMessageStream(self, request, context):
         username = request.username
         print(f"[SERVER] {username} connected to message stream.")
-        # Ensure the user has a queue
+        # Wake the stream up with None once the client goes away, rather than polling context.is_active()
+        message_queue = self.attach_message_queue(username)
+        if not context.add_callback(lambda: message_queue.put(None)):
+            message_queue.put(None)  # the client is already gone
+
+        try:
+            # Block until a message is available, then send it; None ends the stream (disconnect, logout, newer stream)
+            while (message := message_queue.get()) is not None:
+                yield message
+        finally:
+            with self.lock:
+                if self.message_queues.get(username) is message_queue:
+                    self.active_users.pop(username, None)    # Mark user as offline when they disconnect
+                    self.message_queues.pop(username, None)  # Clean up queue
+            print(f"[SERVER] {username} disconnected from message stream.")
+
+    def attach_message_queue(self, username):
+        """
+        Give a new message stream its own queue, taking over the messages already waiting for the user (e.g. since Login).
+        An older stream of the same user is ended, so the two never split the user's messages.
+        Return: the stream's queue
+        """
+        message_queue = self.new_message_queue()
         with self.lock:
-            if username not in self.message_queues:
-                self.message_queues[username] = queue.Queue()
+            previous = self.message_queues.get(username)
+            self.message_queues[username] = message_queue
             self.active_users[username] = True
+            if previous is not None:
+                self.hand_off_messages(previous, message_queue)
+        return message_queue
+
+    def hand_off_messages(self, previous, message_queue):
+        """
+        Move the messages waiting in a replaced stream's queue to the new one, then end the replaced stream.
+        Called with self.lock held, so no message is put in between.
+        """
+        while True:
+            try:
+                message = previous.get_nowait()
+            except queue.Empty:
+                break
+            if message is not None:
+                message_queue.put(message)
+        previous.put(None)
+
+    def new_message_queue(self):
+        """
+        Return: an empty queue of messages to push to a user
+        """
+        return queue.Queue()
+
+    def drop_message_queue(self, username):
+        """
+        Forget a user who logged out or was deleted, and end their open message stream.
+        """
+        with self.lock:
+            self.active_users.pop(username, None)
+            message_queue = self.message_queues.pop(username, None)
+        if message_queue is not None:
+            message_queue.put(None)
+
+
+class LoopQueue:
+    """
+    Queue of messages for one user that any thread can put into, read by a coroutine on the server's event loop.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        """Add an item; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        """Return: the next item, once there is one"""
+        return await self.queue.get()
+
+    def hand_off(self, other):
+        """Move the waiting items to another LoopQueue, then end this one with None; call on the event loop only."""
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                other.queue.put_nowait(item)
+        self.queue.put_nowait(None)
+
+
+class AsyncChatService(ChatService):
+    """
+    ChatService for a grpc.aio server (--aio).
+    ReceiveMessageStream is an async generator that sleeps on an asyncio queue, so an idle subscriber costs
+    a suspended coroutine instead of a worker thread, and nothing wakes up to poll.
+    Every other RPC is the threaded implementation, run by the server's thread pool.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        super().__init__()
+
+    def new_message_queue(self):
+        """
+        Return: an empty queue of messages to push to a user, read by their ReceiveMessageStream coroutine
+        """
+        return LoopQueue(self.loop)
+
+    def hand_off_messages(self, previous, message_queue):
+        """
+        Like ChatService.hand_off_messages, but on the event loop: puts into the old queue that were scheduled before
+        the swap run first, so none is left behind, and puts into the new queue (scheduled after) land behind the moved ones.
+        """
+        self.loop.call_soon_threadsafe(previous.hand_off, message_queue)
+
+    async def ReceiveMessageStream(self, request, context):
+        username = request.username
+        print(f"[SERVER] {username} connected to message stream.")
+        message_queue = self.attach_message_queue(username)
 
         try:
-            while context.is_active():
-                try:
-                    # Block until a message is available, then send it
-                    message = self.message_queues[username].get(timeout=5)  # 5s timeout to check if still active
-                    yield message
-                except queue.Empty:
-                    continue  # No message yet, keep waiting
-        except Exception as e:
-            print(f"[SERVER] Error in message stream for {username}: {e}")
+            # Ends when the user logs out or opens a newer stream; a client that disconnects cancels us instead
+            while (message := await message_queue.get()) is not None:
+                yield message
         finally:
             with self.lock:
-                del self.active_users[username]  # Mark user as offline when they disconnect
-                del self.message_queues[username]  # Clean up queue
+                if self.message_queues.get(username) is message_queue:
+                    self.active_users.pop(username, None)  # Mark user as offline when they disconnect
+                    self.message_queues.pop(username, None)  # Clean up queue
             print(f"[SERVER] {username} disconnected from message stream.")
         
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+def serve(unary_workers=config.SERVER_UNARY_WORKERS, stream_workers=config.SERVER_STREAM_WORKERS,
+          max_concurrent_rpcs=config.SERVER_MAX_CONCURRENT_RPCS):
+    # Open streams may use at most stream_workers of the worker threads, so unary calls always find one of the others
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=unary_workers + stream_workers),
+                         interceptors=[StreamBudgetInterceptor(stream_workers)],
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
     chat_pb2_grpc.add_ChatServiceServicer_to_server(ChatService(), server)
     server.add_insecure_port(f'{config.HOST}:{config.PORT}')
     server.start()
     logging.info(f"Server started on port {config.PORT}")
     server.wait_for_termination()
 
+async def serve_aio(unary_workers=config.SERVER_UNARY_WORKERS, max_concurrent_rpcs=config.SERVER_ASYNC_MAX_CONCURRENT_RPCS):
+    # Message streams hold no thread on a grpc.aio server, so the pool only runs unary calls
+    # A burst of new calls (e.g. every client reconnecting at once) waits for the event loop instead of being cancelled
+    options = [("grpc.server.max_pending_requests", max_concurrent_rpcs),
+               ("grpc.server.max_pending_requests_hard_limit", max_concurrent_rpcs)]
+    server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=unary_workers),
+                             maximum_concurrent_rpcs=max_concurrent_rpcs, options=options)
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(AsyncChatService(asyncio.get_running_loop()), server)
+    server.add_insecure_port(f'{config.HOST}:{config.PORT}')
+    await server.start()
+    logging.info(f"Async server started on port {config.PORT}")
+    await server.wait_for_termination()
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    serve()
+    parser = argparse.ArgumentParser(description="Start the chat server.")
+    parser.add_argument('--unary-workers', type=int, default=config.SERVER_UNARY_WORKERS, help="Worker threads kept for unary calls")
+    parser.add_argument('--stream-workers', type=int, default=config.SERVER_STREAM_WORKERS, help="Max streams open at once")
+    parser.add_argument('--max-concurrent-rpcs', type=int, help="Max calls accepted at once")
+    parser.add_argument('--aio', action=argparse.BooleanOptionalAction, default=config.SERVER_ASYNC, help="Run the grpc.aio server")
+    args = parser.parse_args()
+    if args.aio:
+        asyncio.run(serve_aio(args.unary_workers, args.max_concurrent_rpcs or config.SERVER_ASYNC_MAX_CONCURRENT_RPCS))
+    else:
+        serve(args.unary_workers, args.stream_workers, args.max_concurrent_rpcs or config.SERVER_MAX_CONCURRENT_RPCS)
     
\ No newline at end of file
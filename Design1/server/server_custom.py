@@ -62,11 +62,31 @@ def db_init(connection=None):
         checked INTEGER NOT NULL CHECK (checked IN (0, 1))
     )
     ''')
+    db_create_indexes(cursor)
 
     db.commit()
     if not connection:
         db.close()
 
+def db_create_indexes(cursor):
+    """
+    Index the columns the per-user queries filter on, so they do not scan whole tables.
+    Usernames become UNIQUE, unless a database from before that already holds duplicates: those are reported and
+    left for the operator to merge, with a plain index on the column meanwhile. No account is deleted here.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_accounts_user'")
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT user FROM accounts GROUP BY user HAVING COUNT(*) > 1 ORDER BY user")
+        duplicates = [row[0] for row in cursor.fetchall()]
+        if duplicates:
+            logging.warning(f"SERVER: db_create_indexes: users held by more than one account, not indexed as UNIQUE: {', '.join(duplicates)}")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_user_nonunique ON accounts (user)")
+        else:
+            cursor.execute("CREATE UNIQUE INDEX idx_accounts_user ON accounts (user)")
+            cursor.execute("DROP INDEX IF EXISTS idx_accounts_user_nonunique")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_user_inbox ON messages (user, inbox)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_drafts_user ON drafts (user)")
+
 
 # +++++++++++++++++++  Variables  +++++++++++++++++++ #
 
@@ -17,6 +17,21 @@ HEARTBEAT_INTERVAL = 2
 HEARTBEAT_TIMEOUT  = 10            
 PLOCK = multiprocessing.Lock()      
 
+# SERVER_UNARY_WORKERS: Worker threads kept free for unary calls (SendMessage, Login, ...)
+# SERVER_STREAM_WORKERS: Max response streams open at once (one ReceiveMessageStream per online user);
+#                        each holds a worker while open, so a server runs SERVER_UNARY_WORKERS + SERVER_STREAM_WORKERS workers
+# SERVER_MAX_CONCURRENT_RPCS: Calls a server accepts at once, running or queued; more are refused with RESOURCE_EXHAUSTED
+SERVER_UNARY_WORKERS       = 32
+SERVER_STREAM_WORKERS      = 2000
+SERVER_MAX_CONCURRENT_RPCS = 4000
+
+# SQLITE_BUSY_TIMEOUT: Seconds a connection waits for another one's write lock before giving up
+# SQLITE_SYNCHRONOUS: "NORMAL" only syncs the WAL at checkpoints (a power cut may lose the last writes); "FULL" syncs on every commit
+# SQLITE_CACHE_KB: Page cache per connection, in KiB (each server thread has its own connection)
+SQLITE_BUSY_TIMEOUT = 5
+SQLITE_SYNCHRONOUS  = "NORMAL"
+SQLITE_CACHE_KB     = 8192
+
 # This is how we will start our databases
 # Two servers on one and one server on another
 # Leader starts as address 0
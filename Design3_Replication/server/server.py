@@ -8,19 +8,20 @@ import os
 import sys
 import grpc
 import time
-import shutil
 import sqlite3
 import logging
 import queue
 import threading
 import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 config_file = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config", "config.py"))
 database_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
 from concurrent import futures
 from comm import chat_pb2
 from comm import chat_pb2_grpc
 from config import config
+from stream_budget import StreamBudgetInterceptor
 
 
 
@@ -48,10 +49,31 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         # Initialize databases and print starting info
         os.makedirs(database_folder, exist_ok=True)  
         self.db_name = os.path.join(database_folder, f"chat_database_{self.pid}.db")
-        self.db_connection = sqlite3.connect(self.db_name, check_same_thread=False)
+        self.db_local = threading.local()  # Per-thread database connection
         self.initialize_database()
         self.print_SQL()
 
+    @property
+    def db_connection(self):
+        """
+        This thread's connection to the database, opened on first use.
+        Each gRPC worker thread gets its own, so reads are not serialized behind other requests.
+        """
+        connection = getattr(self.db_local, "connection", None)
+        if connection is None:
+            connection = self.db_local.connection = self.connect_database()
+        return connection
+
+    def connect_database(self):
+        """
+        Open a connection to the database with WAL journaling, so readers do not block writers.
+        """
+        connection = sqlite3.connect(self.db_name, timeout=config.SQLITE_BUSY_TIMEOUT)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        connection.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+        return connection
+
     def print_SQL(self):
         """
         Print out server registry table contents.
@@ -79,7 +101,8 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 uuid INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT NOT NULL,
                 pwd TEXT NOT NULL,
-                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1))
+                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1)),
+                inbox_count INTEGER NOT NULL DEFAULT 0
             )
             ''')
 
@@ -103,6 +126,10 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 checked INTEGER NOT NULL CHECK (checked IN (0, 1))
             )
             ''')
+            self.create_indexes(cursor)
+            # Databases created before inbox counters existed start from their current inbox sizes
+            if "inbox_count" in self.add_missing_columns(cursor, "accounts", {"inbox_count": "INTEGER NOT NULL DEFAULT 0"}):
+                self.recount_inboxes(cursor)
 
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS registry (
@@ -119,6 +146,46 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", (1, time.time(), config.STARTING_ADDRESSES[1]))
             cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", (2, time.time(), config.STARTING_ADDRESSES[2]))
 
+    def create_indexes(self, cursor):
+        """
+        Index the columns the per-user queries filter on, so they do not scan whole tables.
+        Usernames become UNIQUE, unless a database from before that already holds duplicates: those are reported and
+        left for the operator to merge, with a plain index on the column meanwhile. No account is deleted here.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_accounts_username'")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT username FROM accounts GROUP BY username HAVING COUNT(*) > 1 ORDER BY username")
+            duplicates = [row[0] for row in cursor.fetchall()]
+            if duplicates:
+                print(f"[SERVER {self.pid}] Usernames held by more than one account, not indexed as UNIQUE: {', '.join(duplicates)}")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_username_nonunique ON accounts (username)")
+            else:
+                cursor.execute("CREATE UNIQUE INDEX idx_accounts_username ON accounts (username)")
+                cursor.execute("DROP INDEX IF EXISTS idx_accounts_username_nonunique")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_username_inbox ON messages (username, inbox)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_drafts_username ON drafts (username)")
+
+    def add_missing_columns(self, cursor, table, columns):
+        """
+        Add the columns (name -> SQL definition) that an existing table does not have yet.
+        Return: names of the columns that were added
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = [name for name in columns if name not in existing]
+        for name in added:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+        return added
+
+    def recount_inboxes(self, cursor):
+        """
+        Set every account's inbox_count from its messages; writes keep it up to date afterwards.
+        """
+        cursor.execute("""
+            UPDATE accounts SET inbox_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.username = accounts.username AND messages.inbox = 1)
+        """)
+
     def update_all_registries(self):
         """
         Notify the leader about the new database creation.
@@ -186,20 +253,33 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         try:
             os.makedirs(database_folder, exist_ok=True)  
             pid_db_name = os.path.join(database_folder, f"chat_database_{pid}.db")
-            shutil.copy(pid_db_name, self.db_name)
+            self.copy_database(pid_db_name)
             print(f"[SERVER {self.pid}] Copied database from {pid} to {self.pid}")
         except FileNotFoundError:
             print(f"[SERVER {self.pid}] No previous leader database found. Starting fresh.")
         except Exception as e:
             print(f"[SERVER {self.pid}] Error copying database: {e}")
 
+    def copy_database(self, source_name):
+        """
+        Overwrite our database with the one in source_name.
+        Uses SQLite's backup API, which also picks up writes still in the source's WAL file.
+        """
+        if not os.path.exists(source_name):
+            raise FileNotFoundError(source_name)
+        source = sqlite3.connect(source_name)
+        try:
+            source.backup(self.db_connection)
+        finally:
+            source.close()
+
     def sync_leader_with_latest_database(self):
         """
         If pid=0 is starting and there are existing databases, sync with the latest modified one.
         All other pids will proceed as normal, copying their database over from pid=0
         """
         # List all existing databases, excluding the db with pid 0
-        db_files = [os.path.join(database_folder, f) for f in os.listdir(database_folder)]
+        db_files = [os.path.join(database_folder, f) for f in os.listdir(database_folder) if f.endswith(".db")]
         db_files = [f for f in db_files if f != self.db_name]
         if len(db_files) > 0:
             # Find the most recently modified database
@@ -207,7 +287,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             match = re.search(r"chat_database_(\d+)\.db", latest_db)
             db_number = int(match.group(1))
             # Sync leader database with the latest one
-            shutil.copy(latest_db, self.db_name)
+            self.copy_database(latest_db)
             print(f"[SERVER {self.pid}] Synced database from latest modified {db_number}")
         else:
             print(f"[SERVER {self.pid}] No other database to sync with, keeping database as is")
@@ -258,7 +338,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         try:
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("SELECT uuid FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
+                cursor.execute("SELECT uuid, inbox_count FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
                 account = cursor.fetchone()
                 if account is not None:
                     cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
@@ -307,7 +387,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                     ]
                                      
                     cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
-                    response = chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=len(new_message_list), old_messages=old_message_list, inbox_messages=new_message_list, drafts=draft_list)
+                    response = chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=account[1], old_messages=old_message_list, inbox_messages=new_message_list, drafts=draft_list)
                     if self.IS_LEADER:
                         self.replicate_to_replicas("Login", request)
                     return response
@@ -444,7 +524,9 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             # Update inbox status
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("UPDATE messages SET inbox = 0 WHERE username = ? AND msg_id = ?", (username, msg_id,))
+                cursor.execute("UPDATE messages SET inbox = 0 WHERE username = ? AND msg_id = ? AND inbox = 1", (username, msg_id,))
+                if cursor.rowcount > 0:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (username,))
                 response = chat_pb2.GenericResponse(success=True, message="Message downloaded from inbox")
                 if self.IS_LEADER:
                     self.replicate_to_replicas("DownloadMessage", request)
@@ -464,7 +546,10 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             # Remove message from messages table
             with self.db_connection: # ensures commit or rollback
                 cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM messages WHERE msg_id = ?", (msg_id,))
+                cursor.execute("DELETE FROM messages WHERE msg_id = ? RETURNING username, inbox", (msg_id,))
+                deleted = cursor.fetchall()
+                if deleted and deleted[0][1] == 1:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (deleted[0][0],))
                 response = chat_pb2.GenericResponse(success=True, message="Message deleted")
                 if self.IS_LEADER:
                     self.replicate_to_replicas("DeleteMessage", request)
@@ -479,8 +564,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
             # Remove messages sent to the username, username's drafts, and user's account information
@@ -503,8 +587,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
             with self.db_connection: # ensures commit or rollback
@@ -545,8 +628,8 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 """, (recipient, sender, content, 0, 1))
                 msg_id = cursor.fetchone()[0]
 
-                # Get the recipient's new inbox count
-                cursor.execute("SELECT COUNT(*) FROM messages WHERE username = ? AND inbox = 1", (recipient,))
+                # Bump the recipient's inbox counter; its new value goes out with the push
+                cursor.execute("UPDATE accounts SET inbox_count = inbox_count + 1 WHERE username = ? RETURNING inbox_count", (recipient,))
                 new_inbox_count = cursor.fetchone()[0]
                 # If recipient is online, push message to their queue
                 with self.lock:
@@ -573,30 +656,54 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         username = request.username
         print(f"[SERVER {self.pid}] {username} connected to message stream.")
-        # Ensure the user has a queue
-        with self.lock:
-            if username not in self.message_queues:
-                self.message_queues[username] = queue.Queue()
-            self.active_users[username] = True
+        # Wake the stream up with None once the client goes away, rather than polling context.is_active()
+        message_queue = self.attach_message_queue(username)
+        if not context.add_callback(lambda: message_queue.put(None)):
+            message_queue.put(None)  # the client is already gone
 
         try:
-            while context.is_active():
-                try:
-                    # Block until a message is available, then send it
-                    message = self.message_queues[username].get(timeout=5)  # 5s timeout to check if still active
-                    yield message
-                except queue.Empty:
-                    continue  # No message yet, keep waiting
-        except Exception as e:
-            # If they just logged out, then self.message_queue[username] will throw {e}, ignore
-            # Otherwise, it's a real exception we care about
-            print(f"[SERVER {self.pid}] ReceiveMessageStream Exception: {e} (Note a logout/delete occurred if Exception=username)")
+            # Block until a message is available, then send it; None ends the stream (disconnect, logout, newer stream)
+            while (message := message_queue.get()) is not None:
+                yield message
         finally:
             with self.lock:
-                self.active_users.pop(username, None)    # Mark user as offline when they disconnect
-                self.message_queues.pop(username, None)  # Clean up queue
+                if self.message_queues.get(username) is message_queue:
+                    self.active_users.pop(username, None)    # Mark user as offline when they disconnect
+                    self.message_queues.pop(username, None)  # Clean up queue
             print(f"[SERVER {self.pid}] {username} disconnected from message stream.")
 
+    def attach_message_queue(self, username):
+        """
+        Give a new message stream its own queue, taking over the messages already waiting for the user (e.g. since Login).
+        An older stream of the same user is ended, so the two never split the user's messages.
+        Return: the stream's queue
+        """
+        message_queue = queue.Queue()
+        with self.lock:
+            previous = self.message_queues.get(username)
+            self.message_queues[username] = message_queue
+            self.active_users[username] = True
+            if previous is not None:
+                while True:
+                    try:
+                        message = previous.get_nowait()
+                    except queue.Empty:
+                        break
+                    if message is not None:
+                        message_queue.put(message)
+                previous.put(None)
+        return message_queue
+
+    def drop_message_queue(self, username):
+        """
+        Forget a user who logged out or was deleted, and end their open message stream.
+        """
+        with self.lock:
+            self.active_users.pop(username, None)
+            message_queue = self.message_queues.pop(username, None)
+        if message_queue is not None:
+            message_queue.put(None)
+
     def Replicate(self, request, context):
         """
         Called by the leader on a replica to replicate a write operation.
@@ -772,11 +879,15 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
 
 
 # ++++++++++++++  Serve Functions  ++++++++++++++ #
-def serve(pid, host):
+def serve(pid, host, unary_workers=config.SERVER_UNARY_WORKERS, stream_workers=config.SERVER_STREAM_WORKERS,
+          max_concurrent_rpcs=config.SERVER_MAX_CONCURRENT_RPCS):
     """
     Create a communication point for a server for clients to connect to.
+    Open streams may use at most stream_workers of the worker threads, so unary calls always find one of the others.
     """
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=unary_workers + stream_workers),
+                         interceptors=[StreamBudgetInterceptor(stream_workers)],
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
     chat_service = ChatService(pid, host)
     chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
     server_port = config.BASE_PORT + chat_service.pid
@@ -800,8 +911,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the server with a specific PID.")
     parser.add_argument('--pid', type=int, help="The PID of the server to run.  Example: 0", required=True)
     parser.add_argument('--host', type=str, help="4-digit IP host address.  Example: 127.0.0.1", required=True)
+    parser.add_argument('--unary-workers', type=int, default=config.SERVER_UNARY_WORKERS, help="Worker threads kept for unary calls")
+    parser.add_argument('--stream-workers', type=int, default=config.SERVER_STREAM_WORKERS, help="Max streams open at once")
+    parser.add_argument('--max-concurrent-rpcs', type=int, default=config.SERVER_MAX_CONCURRENT_RPCS, help="Max calls accepted at once")
     args = parser.parse_args()
     pid = args.pid
     host = args.host
-    serve(pid, host)
+    serve(pid, host, args.unary_workers, args.stream_workers, args.max_concurrent_rpcs)
     
\ No newline at end of file
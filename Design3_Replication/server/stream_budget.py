@@ -0,0 +1,58 @@
+# stream_budget.py
+
+
+
+# +++++++++++++++ Imports/Installs +++++++++++++++ #
+import grpc
+import threading
+
+
+
+# ++++++++++ Class Definitions: Stream Budget ++++++++++ #
+class StreamBudgetInterceptor(grpc.ServerInterceptor):
+    """
+    Cap the number of response streams (e.g. ReceiveMessageStream) open at once to `max_streams`.
+    A sync gRPC server runs each open stream on one worker thread for as long as it lasts, so with a pool of
+    `max_streams` + N workers, N workers always stay free for unary calls such as SendMessage.
+    A stream over the budget is refused with RESOURCE_EXHAUSTED instead of waiting for a worker.
+    """
+    def __init__(self, max_streams):
+        self.max_streams = max_streams
+        self.open_streams = 0
+        self.lock = threading.Lock()
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not handler.response_streaming:
+            return handler
+        if handler.request_streaming:
+            return handler._replace(stream_stream=self.limit(handler.stream_stream))
+        return handler._replace(unary_stream=self.limit(handler.unary_stream))
+
+    def limit(self, behavior):
+        """
+        Return: behavior wrapped so that it counts against the budget while its stream is open
+        """
+        def limited(request, context):
+            if not self.acquire():
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many open streams on this server")
+            try:
+                yield from behavior(request, context)
+            finally:
+                self.release()
+        return limited
+
+    def acquire(self):
+        """
+        Return: whether a stream may open (and, if so, count it)
+        """
+        with self.lock:
+            if self.open_streams >= self.max_streams:
+                return False
+            self.open_streams += 1
+            return True
+
+    def release(self):
+        """Count a stream as closed."""
+        with self.lock:
+            self.open_streams -= 1
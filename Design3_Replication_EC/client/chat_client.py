@@ -6,10 +6,13 @@
 import grpc
 import os
 import sys
+import threading
+import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from comm import chat_pb2
 from comm import chat_pb2_grpc
 from config import config
+from client.retry_interceptor import LeaderChannel, RetryInterceptor
 
 
 
@@ -19,6 +22,19 @@ class ChatClient:
         """
         Establish channel and service stub.
         """
+        # last_seq: newest replication log seq this client has seen, so replicas never serve it older data
+        # replica_addresses: cached membership, asked first when looking for a new leader
+        # replica_stubs: every server's stub for spreading reads (empty until the leader tells us who they are)
+        # replica_channels: address -> open channel behind each of replica_stubs, closed once the server leaves
+        # leader_term: term of the newest leader hint seen, so older hints are ignored
+        self.last_seq = 0
+        self.replica_addresses = []
+        self.replica_channels = {}
+        self.replica_stubs = []
+        self.next_replica = 0
+        self.leader_term = 0
+        self.reconnect_lock = threading.Lock()
+
         # for testing purposes, one can set arbitrarily the server address
         # otherwise, simply find the leader by calling get_leader
         # leader_pid will help when needing to find a new leader via incrementing
@@ -28,9 +44,15 @@ class ChatClient:
         else:
             self.leader_pid = None
             leader_address = self.get_leader()
-        self.channel = grpc.insecure_channel(leader_address)
+        # The stub goes through the retry interceptor to whichever server leader_channel points at
+        self.leader_address = leader_address
+        self.leader_channel = LeaderChannel(leader_address)
         print(f"Connected to address {leader_address}")
-        self.stub = chat_pb2_grpc.ChatServiceStub(self.channel)
+        self.stub = chat_pb2_grpc.ChatServiceStub(grpc.intercept_channel(self.leader_channel, RetryInterceptor(self)))
+
+        # A client pinned to an address stays there; otherwise follow leader changes as they are pushed
+        if server_address is None and config.WATCH_LEADER:
+            threading.Thread(target=self.watch_leader, daemon=True).start()
     
     def create_account(self, username, password_hash):
         """
@@ -38,33 +60,21 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.CreateAccountRequest(username=username, password_hash=password_hash)
-        try:
-            response = self.stub.CreateAccount(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.create_account(username, password_hash)
-            raise
+        response = self.stub.CreateAccount(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def login(self, username, password_hash):
         """
         Login existing user
-        Return: inbox count, list of old messages, list of inbox messages, list of drafts
+        Return: inbox count, first page of old messages, of inbox messages and of drafts,
+                the cursor of each one's next page (0 = no more), and the seq to pass to sync_since later
         """
         request = chat_pb2.LoginRequest(username=username, password_hash=password_hash)
-        try:
-            response = self.stub.Login(request)
-            return response.inbox_count, response.old_messages, response.inbox_messages, response.drafts
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.login(username, password_hash)
-            raise
+        response = self.stub.Login(request)
+        self.observe_seq(response.seq)
+        return (response.inbox_count, response.old_messages, response.inbox_messages, response.drafts,
+                response.next_old_cursor, response.next_inbox_cursor, response.next_draft_cursor, response.seq)
     
     def send_message(self, draft_id, recipient, sender, content):
         """
@@ -72,16 +82,9 @@ class ChatClient:
         Return: newly created message ID
         """
         request = chat_pb2.SendMessageRequest(draft_id=draft_id, recipient=recipient, sender=sender, content=content)
-        try:
-            response = self.stub.SendMessage(request)
-            return response.msg_id
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.send_message(draft_id, recipient, sender, content)
-            raise
+        response = self.stub.SendMessage(request)
+        self.observe_seq(response.seq)
+        return response.msg_id
     
     def download_message(self, username, msg_id):
         """
@@ -89,16 +92,9 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.DownloadMessageRequest(username=username, msg_id=msg_id)
-        try:
-            response = self.stub.DownloadMessage(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.download_message(username, msg_id)
-            raise
+        response = self.stub.DownloadMessage(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def check_message(self, username, msg_id):
         """
@@ -106,16 +102,9 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.CheckMessageRequest(username=username, msg_id=msg_id)
-        try:
-            response = self.stub.CheckMessage(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.check_message(username, msg_id)
-            raise
+        response = self.stub.CheckMessage(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def delete_message(self, username, msg_id):
         """
@@ -123,16 +112,9 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.DeleteMessageRequest(username=username, msg_id=msg_id)
-        try:
-            response = self.stub.DeleteMessage(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.delete_message(username, msg_id)
-            raise
+        response = self.stub.DeleteMessage(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def add_draft(self, username, recipient, message, checked):
         """
@@ -140,16 +122,9 @@ class ChatClient:
         Return: newly created draft ID
         """
         request = chat_pb2.AddDraftRequest(username=username, recipient=recipient, message=message, checked=checked)
-        try:
-            response = self.stub.AddDraft(request)
-            return response.draft_id
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.add_draft(username, recipient, message, checked)
-            raise
+        response = self.stub.AddDraft(request)
+        self.observe_seq(response.seq)
+        return response.draft_id
     
     def save_drafts(self, username, drafts):
         """
@@ -157,16 +132,9 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.SaveDraftsRequest(username=username, drafts=drafts)
-        try:
-            response = self.stub.SaveDrafts(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.save_drafts(username, drafts)
-            raise
+        response = self.stub.SaveDrafts(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def logout(self, username):
         """
@@ -174,33 +142,63 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.LogoutRequest(username=username)
-        try:
-            response = self.stub.Logout(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.logout(username)
-            raise
+        response = self.stub.Logout(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def list_accounts(self):
         """
         List all existing accounts
         Return: list of usernames
         """
-        request = chat_pb2.ListAccountsRequest()
-        try:
-            response = self.stub.ListAccounts(request)
-            return response.usernames
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.list_accounts()
-            raise
+        request = chat_pb2.ListAccountsRequest(min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        response = self.read("ListAccounts", request)
+        self.observe_seq(response.seq)
+        return response.usernames
+
+    def list_messages(self, username, inbox, cursor, page_size=0):
+        """
+        Fetch the next page of inbox (inbox=True) or old messages, newest first
+        Return: list of messages, cursor of the next page (0 = no more)
+        """
+        request = chat_pb2.ListMessagesRequest(username=username, inbox=inbox, cursor=cursor, page_size=page_size,
+                                               min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        response = self.read("ListMessages", request)
+        self.observe_seq(response.seq)
+        return response.messages, response.next_cursor
+
+    def list_drafts(self, username, cursor, page_size=0):
+        """
+        Fetch the next page of drafts, oldest first
+        Return: list of drafts, cursor of the next page (0 = no more)
+        """
+        request = chat_pb2.ListDraftsRequest(username=username, cursor=cursor, page_size=page_size,
+                                             min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        response = self.read("ListDrafts", request)
+        self.observe_seq(response.seq)
+        return response.drafts, response.next_cursor
+
+    def sync_since(self, username, since_seq):
+        """
+        Fetch only what changed in the user's mailbox after seq `since_seq` (from login or the last sync_since)
+        Return: SyncSinceResponse (changed messages and drafts, deleted ids, inbox count,
+                whether the mailbox must be reloaded instead, and the seq for the next call)
+        """
+        request = chat_pb2.SyncSinceRequest(username=username, since_seq=since_seq,
+                                            min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        response = self.read("SyncSince", request)
+        self.observe_seq(response.seq)
+        return response
+
+    def sync_mailbox(self, username):
+        """
+        Stream the user's whole mailbox, newest inbox messages first
+        Return: iterator over chunks of (messages, drafts)
+        """
+        request = chat_pb2.SyncMailboxRequest(username=username, min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        for chunk in self.read_stream("SyncMailbox", request):
+            self.observe_seq(chunk.seq)
+            yield chunk.messages, chunk.drafts
     
     def delete_account(self, username):
         """
@@ -208,89 +206,105 @@ class ChatClient:
         Return: success (T/F)
         """
         request = chat_pb2.DeleteAccountRequest(username=username)
-        try:
-            response = self.stub.DeleteAccount(request)
-            return response.success
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.delete_account(username)
-            raise
+        response = self.stub.DeleteAccount(request)
+        self.observe_seq(response.seq)
+        return response.success
     
     def get_password(self, username):
         """
         Get password hash from database to compare
         Return: password hash
         """
-        request = chat_pb2.GetPasswordRequest(username=username)
-        try:
-            response = self.stub.GetPassword(request)
-            return response.password_hash
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    return self.get_password(username)
-            raise
+        request = chat_pb2.GetPasswordRequest(username=username, min_seq=self.last_seq, max_staleness=config.READ_MAX_STALENESS)
+        response = self.read("GetPassword", request)
+        self.observe_seq(response.seq)
+        return response.password_hash
 
-    def receive_messages(self, user, callback):
+    def receive_messages(self, user, callback, on_resume=None):
         """
         Listen for incoming live messages and update GUI inbox count
+        on_resume: called each time the stream is restarted after a failover, to catch up on what it missed
         Return: None
         """
         print("Listening for messages...")
-        try:
-            for response in self.stub.ReceiveMessageStream(chat_pb2.ReceiveMessageRequest(username=user)):
-                print(f"[{response.msg_id}] {response.sender} → {response.username}: {response.msg}")
-                print(f"Inbox Count: {response.inbox_count}\n")          
-                message = chat_pb2.Message(
-                    msg_id = response.msg_id,
-                    username = response.username,
-                    sender = response.sender,
-                    msg = response.msg,
-                    checked = 0,
-                    inbox = 1
-                )
+        resumed = False
+        while True:
+            leader_address = self.leader_address
+            try:
+                responses = self.stub.ReceiveMessageStream(chat_pb2.ReceiveMessageRequest(username=user))
+                if resumed and on_resume is not None:
+                    # Messages sent while we were disconnected were never pushed to us
+                    on_resume()
+                for response in responses:
+                    print(f"[{response.msg_id}] {response.sender} → {response.username}: {response.msg}")
+                    print(f"Inbox Count: {response.inbox_count}\n")          
+                    message = chat_pb2.Message(
+                        msg_id = response.msg_id,
+                        username = response.username,
+                        sender = response.sender,
+                        msg = response.msg,
+                        checked = 0,
+                        inbox = 1
+                    )
 
-                callback(message)
-        except grpc.RpcError as e:
-            # Try again if disconnected from server
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
-                if self.reconnect():
-                    # Restart message stream
-                    self.receive_messages(user, callback)
-                    return
-            raise
+                    callback(message)
+                return
+            except grpc.RpcError as e:
+                # Streams are not retried by the interceptor: restart it on the new leader
+                if e.code() == grpc.StatusCode.UNAVAILABLE:
+                    print("[CLIENT] Connection failed. Attempting to reconnect to new leader...")
+                    if self.reconnect(failed_address=leader_address):
+                        resumed = True
+                        continue
+                raise
 
-    def reconnect(self):
-        """Fetch the new leader's address and reinitialize the connection."""
-        new_leader = self.get_leader()
-        if new_leader:
-            print(f"[CLIENT] New leader found: {new_leader}.  Reconnecting...")
-            # Update channel and stub with the new leader address.
-            self.channel = grpc.insecure_channel(new_leader)
-            print(f"Connecting to address {new_leader}")
-            self.stub = chat_pb2_grpc.ChatServiceStub(self.channel)
-            return True
-        else:
-            print("[CLIENT] Could not get the new leader. Please try again later.")
-            return False
+    def reconnect(self, failed_address=None, hint="", deadline=None):
+        """
+        Fetch the new leader's address (or take the one a server suggested) and reinitialize the connection.
+        Calls that fail together look for the leader only once: if the leader changed since failed_address
+        failed, there is nothing to do.
+        Return: success (T/F)
+        """
+        with self.reconnect_lock:
+            if failed_address is not None and self.leader_address != failed_address:
+                return True
+            new_leader = hint if hint and hint != failed_address else self.get_leader(deadline)
+            if new_leader:
+                print(f"[CLIENT] New leader found: {new_leader}.  Reconnecting...")
+                self.connect(new_leader)
+                return True
+            else:
+                print("[CLIENT] Could not get the new leader. Please try again later.")
+                return False
+
+    def connect(self, leader_address):
+        """
+        Send all later calls to the new leader address.
+        The channel is switched first: a call that sees the new address never runs on the closed old channel.
+        """
+        if leader_address == self.leader_address:
+            return  # e.g. a pushed leader change we already followed; keep the calls running on it
+        self.leader_channel.connect(leader_address)
+        self.leader_address = leader_address
+        print(f"Connecting to address {leader_address}")
 
-    def get_leader(self):
+    def get_leader(self, deadline=None):
         """
-        Contact a known peer (or the current leader) to fetch the current leader's address.
+        Fetch the current leader's address, giving up at deadline (if given).
+        Any server we already know can name the leader, so ask those first (one hop).
+        Only if none of them can do we contact every possible address in turn.
         """
+        leader_address = self.ask_members(deadline)
+        if leader_address:
+            return leader_address
+
         # Determine where to begin looking for range of leaders
         # If first-time, start at 0
         # If new leader, it will be > old leader's pid
         p = 0
         if self.leader_pid is not None:
             p = self.leader_pid
-        while p < config.MAX_PID:
+        while p < config.MAX_PID and (deadline is None or time.time() < deadline):
             print(f"[CLIENT] Contacting With PID: {p}")
             for host in config.ALL_HOSTS:
                 addr = f"{host}:{config.BASE_PORT+p}"
@@ -302,7 +316,7 @@ class ChatClient:
                         stub = chat_pb2_grpc.ChatServiceStub(channel)
                         request = chat_pb2.GetLeaderRequest()
                         response = stub.GetLeader(request, timeout=2)
-                        if response.success and response.leader_address:
+                        if self.observe_leader(response):
                             print(f"[CLIENT] Reported leader: {response.leader_address}")
                             self.leader_pid = p
                             return response.leader_address
@@ -313,5 +327,136 @@ class ChatClient:
             p += 1
         return None
 
+    def ask_members(self, deadline=None):
+        """
+        Ask the cached membership for the leader, for up to LEADER_DISCOVERY_TIMEOUT since an election may be running.
+        Servers that have not yet noticed the loss of the leader we could not reach still name it; skip those hints.
+        Return: leader address, or None
+        """
+        deadline = min(deadline or float("inf"), time.time() + config.LEADER_DISCOVERY_TIMEOUT)
+        while self.replica_addresses and time.time() < deadline:
+            for addr in list(self.replica_addresses):
+                try:
+                    with grpc.insecure_channel(addr) as channel:
+                        stub = chat_pb2_grpc.ChatServiceStub(channel)
+                        response = stub.GetLeader(chat_pb2.GetLeaderRequest(), timeout=config.LEADER_DISCOVERY_RPC_TIMEOUT)
+                except grpc.RpcError:
+                    continue
+                if self.observe_leader(response) and response.leader_address != self.leader_address:
+                    print(f"[CLIENT] {addr} reported leader: {response.leader_address}")
+                    return response.leader_address
+            time.sleep(config.HEARTBEAT_INTERVAL)
+        return None
 
-    
+    def observe_leader(self, response):
+        """
+        Cache the membership from a GetLeader/WatchLeader response, unless its leader hint is from an older term.
+        Return: whether the response names a current leader
+        """
+        if response.term < self.leader_term:
+            return False
+        self.leader_term = response.term
+        if list(response.replica_addresses) != self.replica_addresses:
+            self.replica_addresses = list(response.replica_addresses)
+            self.connect_replicas()
+        return response.success and bool(response.leader_address)
+
+    def watch_leader(self):
+        """
+        Follow the leader changes pushed by a server (WatchLeader), and switch to each new leader right away.
+        If the server we watch goes down, watch another one we know.
+        """
+        while True:
+            for addr in list(self.replica_addresses) or [self.leader_address]:
+                try:
+                    with grpc.insecure_channel(addr) as channel:
+                        stub = chat_pb2_grpc.ChatServiceStub(channel)
+                        for response in stub.WatchLeader(chat_pb2.WatchLeaderRequest()):
+                            if self.observe_leader(response) and response.leader_address != self.leader_address:
+                                print(f"[CLIENT] Leader changed to {response.leader_address}.  Reconnecting...")
+                                with self.reconnect_lock:
+                                    self.connect(response.leader_address)
+                except grpc.RpcError:
+                    continue
+            time.sleep(config.HEARTBEAT_INTERVAL)
+
+    def connect_replicas(self):
+        """
+        Open a stub to every known server, so reads can be spread across them.
+        Channels to servers we already knew are kept; those to servers that left are closed
+        (a read still running on one is cancelled and goes to the leader instead).
+        """
+        if not config.READ_FROM_REPLICAS:
+            return
+        previous = self.replica_channels
+        self.replica_channels = {addr: previous.pop(addr, None) or grpc.insecure_channel(addr) for addr in self.replica_addresses}
+        self.replica_stubs = [chat_pb2_grpc.ChatServiceStub(channel) for channel in self.replica_channels.values()]
+        for channel in previous.values():
+            channel.close()
+
+    def read(self, method, request):
+        """
+        Send a read to the next server in turn. A replica refuses it if it is behind
+        what we have already seen (or too stale); the read then goes to the leader,
+        and if no leader answers either, to any server (READ_STALE_FALLBACK).
+        Return: response
+        """
+        if self.replica_stubs:
+            stub = self.replica_stubs[self.next_replica % len(self.replica_stubs)]
+            self.next_replica += 1
+            try:
+                return getattr(stub, method)(request, timeout=config.READ_REPLICA_TIMEOUT)
+            except grpc.RpcError:
+                pass
+        try:
+            return getattr(self.stub, method)(request)
+        except grpc.RpcError as e:
+            if not config.READ_STALE_FALLBACK or e.code() != grpc.StatusCode.UNAVAILABLE:
+                raise
+            return self.read_stale(method, request, e)
+
+    def read_stale(self, method, request, error):
+        """
+        Last resort for a read that no leader answered, e.g. while a majority of servers is down:
+        send it to every server we know with no staleness bound. A server still refuses it if it has not
+        applied what we have already seen, so we never read older data than before.
+        Return: response (raises error if no server answers)
+        """
+        print(f"[CLIENT] No leader answered {method}; reading from any server.")
+        stale_request = type(request)()
+        stale_request.CopyFrom(request)
+        stale_request.max_staleness = 0
+        for stub in self.replica_stubs + [self.stub]:
+            try:
+                return getattr(stub, method)(stale_request, timeout=config.READ_REPLICA_TIMEOUT)
+            except grpc.RpcError:
+                continue
+        raise error
+
+    def read_stream(self, method, request):
+        """
+        Like read, for a server-streaming read: a replica that refuses it does so before the first
+        response, and the stream is then read from the leader.
+        Return: iterator over the responses
+        """
+        if self.replica_stubs:
+            stub = self.replica_stubs[self.next_replica % len(self.replica_stubs)]
+            self.next_replica += 1
+            responses = getattr(stub, method)(request)
+            try:
+                first = next(responses)
+            except StopIteration:
+                return
+            except grpc.RpcError:
+                pass
+            else:
+                yield first
+                yield from responses
+                return
+        yield from getattr(self.stub, method)(request)
+
+    def observe_seq(self, seq):
+        """
+        Remember the newest replication log seq seen in any response.
+        """
+        self.last_seq = max(self.last_seq, seq)
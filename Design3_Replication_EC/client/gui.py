@@ -50,6 +50,13 @@ drafts_all_checkmarked  = False     # T/F: do we want to send all the drafts?
 login_username          = None
 login_pwd               = None
 
+# Login only returns the first page of each list; these are the cursors of the next pages (0 = all loaded)
+next_old_cursor         = 0
+next_inbox_cursor       = 0
+next_draft_cursor       = 0
+# Replication log seq our copy of the mailbox is up to date with; after a failover we only fetch what changed since
+mailbox_seq             = 0
+
 # Initialize gRPC Client
 client = chat_client.ChatClient()
 
@@ -120,14 +127,16 @@ def login(new_user, pwd_hash):
     If returning user, verify correct username/password.
     Determine if good login, and if so, load main frame. """
     global login_username, login_pwd, db_user_data, db_accounts
+    global next_old_cursor, next_inbox_cursor, next_draft_cursor, mailbox_seq
     user = login_username.get()
     pwd = login_pwd.get()
 
+    entered_pwd_hashed = server_security.hash_password(pwd)
+    stored_pwd_hash = entered_pwd_hashed if new_user else pwd_hash
     listener_thread = threading.Thread(target=client.receive_messages, 
-                                       args=(user, update_inbox_callback,),
+                                       args=(user, update_inbox_callback, lambda: resync_mailbox(user, stored_pwd_hash),),
                                        daemon=True)
     listener_thread.start()
-    entered_pwd_hashed = server_security.hash_password(pwd)
     
     # If new user, create a new account
     if new_user:
@@ -136,22 +145,29 @@ def login(new_user, pwd_hash):
            messagebox.showerror("Error", "Unable to create new user.  Try again")
            return
         db_user_data = [0,[],[],[]]
+        next_old_cursor, next_inbox_cursor, next_draft_cursor = 0, 0, 0
+        mailbox_seq = client.last_seq
     # If existing user, verify password lines up
     elif not server_security.verify_password(pwd, pwd_hash):
         messagebox.showerror("Error", "Invalid Username or Password")
         return
     # If existing user and password lines up, login/load information
     else:
-        result = client.login(user, pwd_hash)
-        db_user_data[0] = result[0] 
-        db_user_data[1] = result[1] 
-        db_user_data[2] = result[2] 
-        db_user_data[3] = result[3] 
+        load_login_result(client.login(user, pwd_hash))
     # Load main GUI frame
     login_frame.pack_forget()
     load_main_frame(db_user_data)
     main_frame.pack(fill='both', expand=True)
 
+def load_login_result(result):
+    """ Keep the first pages of the user's mailbox returned by login, and where the next pages start. """
+    global db_user_data, next_old_cursor, next_inbox_cursor, next_draft_cursor, mailbox_seq
+    db_user_data[0] = result[0] 
+    db_user_data[1] = list(result[1])
+    db_user_data[2] = list(result[2])
+    db_user_data[3] = list(result[3])
+    next_old_cursor, next_inbox_cursor, next_draft_cursor, mailbox_seq = result[4], result[5], result[6], result[7]
+
 
 
 # +++++++++++++ Helper Functions: Event Listener +++++++++++++ #
@@ -159,12 +175,54 @@ def login(new_user, pwd_hash):
 def update_inbox_callback(incoming_msg):
     """ Updates the GUI inbox dynamically when a new message arrives. """
     global db_user_data
+    # A resync after failover may already have brought this message in
+    if any(msg.msg_id == incoming_msg.msg_id for msg in db_user_data[2]):
+        return
     db_user_data[2].insert(0, incoming_msg)  # Insert into inbox
     db_user_data[0] += 1  # Update inbox count
     # Update inbox count
     update_inbox_count(db_user_data[0])
     gui.after(100, load_main_frame, db_user_data)
 
+def resync_mailbox(user, pwd_hash):
+    """ After a failover, fetch only what changed in the mailbox while we were disconnected.
+    If the server no longer knows (or too much changed), load the first pages again as on login. """
+    global db_user_data, mailbox_seq
+    response = client.sync_since(user, mailbox_seq)
+    if not response.success:
+        return
+    if response.full_sync_required:
+        load_login_result(client.login(user, pwd_hash))
+    else:
+        apply_mailbox_changes(response)
+        mailbox_seq = response.seq
+    gui.after(100, load_main_frame, db_user_data)
+
+def apply_mailbox_changes(changes):
+    """ Merge changed and deleted messages/drafts into the loaded pages.
+    Items that fall in pages we have not loaded yet are left for when those pages are fetched. """
+    global db_user_data
+    # Messages: drop deleted ones, and re-file changed ones in the inbox or old list
+    changed_msgs = {msg.msg_id: msg for msg in changes.messages}
+    dropped_msgs = set(changes.deleted_msg_ids) | set(changed_msgs)
+    db_user_data[1] = [msg for msg in db_user_data[1] if msg.msg_id not in dropped_msgs]
+    db_user_data[2] = [msg for msg in db_user_data[2] if msg.msg_id not in dropped_msgs]
+    for msg in changed_msgs.values():
+        idx, cursor = (2, next_inbox_cursor) if msg.inbox else (1, next_old_cursor)
+        if not cursor or msg.msg_id >= cursor:
+            db_user_data[idx].append(msg)
+    db_user_data[1].sort(key=lambda msg: msg.msg_id, reverse=True)
+    db_user_data[2].sort(key=lambda msg: msg.msg_id, reverse=True)
+    db_user_data[0] = changes.inbox_count
+    # Drafts: drop deleted ones and add new ones; drafts we already have may hold unsaved edits, so keep ours
+    deleted_drafts = set(changes.deleted_draft_ids)
+    db_user_data[3] = [draft for draft in db_user_data[3] if draft.draft_id not in deleted_drafts]
+    loaded_drafts = {draft.draft_id for draft in db_user_data[3]}
+    for draft in changes.drafts:
+        if draft.draft_id not in loaded_drafts and (not next_draft_cursor or draft.draft_id <= next_draft_cursor):
+            db_user_data[3].append(draft)
+    db_user_data[3].sort(key=lambda draft: draft.draft_id)
+
 def update_inbox_count(count):
     """ Update the GUI inbox count dynamically when a new message arrives. """
     for widget in main_frame.grid_slaves():
@@ -185,7 +243,8 @@ def logout():
     if not status:
        messagebox.showerror("Error", "Unable to log out.")
        return
-    # Save all drafts to db
+    # Save all drafts to db; this replaces the stored ones, so fetch any pages we never loaded first
+    load_remaining_drafts()
     client.save_drafts(login_username.get(), db_user_data[3])
     load_main_frame()
     main_frame.pack_forget()
@@ -194,9 +253,10 @@ def logout():
 def delete_account():
     """ Delete account and send request to DB to update this. """
     # Reset all data
-    global db_accounts, db_user_data
+    global db_accounts, db_user_data, next_old_cursor, next_inbox_cursor, next_draft_cursor
     db_accounts = []
     db_user_data = [0, [], [], []]
+    next_old_cursor, next_inbox_cursor, next_draft_cursor = 0, 0, 0
     status = client.delete_account(login_username.get())
     if not status:
        messagebox.showerror("Error", "Unable to delete user.")
@@ -249,16 +309,18 @@ def clicked_send():
 def clicked_open_inbox(num):
     """ When we click 'Open Inbox', we select 'num' of msgs in queue. """
     # Get all messages in inbox (if the inbox is marked as True)
-    global db_user_data
-    inbox_msgs = db_user_data[2]
-    inboxCount = len(inbox_msgs)
+    global db_user_data, next_inbox_cursor
     # Go through 'num' messages, create a new unread msg, and remove from inbox db
     for i in range(num):
+        # Once the loaded inbox page is used up, fetch the next one
+        if not db_user_data[2] and next_inbox_cursor:
+            page, next_inbox_cursor = client.list_messages(login_username.get(), True, next_inbox_cursor)
+            db_user_data[2].extend(page)
         # Edge case: user asks for too many
-        if i >= inboxCount:
+        if not db_user_data[2]:
             break
         create_new_msg(db_user_data[2][0])
-        status = client.download_message(login_username.get(), inbox_msgs[i].msg_id)
+        status = client.download_message(login_username.get(), db_user_data[2][0].msg_id)
         if not status:
             messagebox.showerror("Error", "Unable to download some messages.")
             return
@@ -274,6 +336,37 @@ def clicked_open_inbox(num):
     lbl_incoming = tk.Label(main_frame, text=f"Incoming: {db_user_data[0]} Items", font=("Arial", 12, "bold"), width=30)
     lbl_incoming.grid(row=2, column=col_incoming_message, padx=5, pady=5)
 
+def clicked_older_msgs(btn):
+    """ When we click 'Older Messages', fetch the next page of old messages. """
+    global db_user_data, next_old_cursor
+    if not next_old_cursor:
+        return
+    page, next_old_cursor = client.list_messages(login_username.get(), False, next_old_cursor)
+    for msg in page:
+        create_new_msg(msg)
+    db_user_data[1].extend(page)
+    if not next_old_cursor:
+        btn.config(state=tk.DISABLED)
+
+def clicked_more_drafts(btn):
+    """ When we click 'More Drafts', fetch the next page of drafts. """
+    global db_user_data, next_draft_cursor
+    if not next_draft_cursor:
+        return
+    page, next_draft_cursor = client.list_drafts(login_username.get(), next_draft_cursor)
+    for draft in page:
+        create_existing_draft(len(db_user_data[3]), draft.recipient, draft.msg, draft.checked)
+        db_user_data[3].append(draft)
+    if not next_draft_cursor:
+        btn.config(state=tk.DISABLED)
+
+def load_remaining_drafts():
+    """ Fetch every page of drafts not loaded yet (without showing them). """
+    global db_user_data, next_draft_cursor
+    while next_draft_cursor:
+        page, next_draft_cursor = client.list_drafts(login_username.get(), next_draft_cursor)
+        db_user_data[3].extend(page)
+
 def clicked_msg_checkbox(check_var, btn, user, msgId):
     """ When we click 'Read/Unread' checkbox, update database and config."""
     client.check_message(user, msgId)
@@ -494,6 +587,9 @@ def load_main_frame(db_user_data=[0,[],[],[]]):
     selected_val = tk.IntVar(value=1)
     tk.OptionMenu(inbox_control_frame, selected_val, *view_options, command=lambda value: selected_val.set(value)).pack(side="right")
     tk.Button(inbox_control_frame, text="Open Inbox Items", command=lambda:clicked_open_inbox(selected_val.get())).pack(side="right")
+    older_btn = tk.Button(inbox_control_frame, text="Older Messages", state=tk.NORMAL if next_old_cursor else tk.DISABLED)
+    older_btn.config(command=lambda: clicked_older_msgs(older_btn))
+    older_btn.pack(side="left")
     # Part 3: Column and Sub-Column Titles for Sending Messages
     tk.Label(main_frame, text="Sending Messages", font=("Arial", 12, "bold"), width=30).grid(row=1, column=col_sending_message, padx=5, pady=5)
     tk.Label(main_frame, text="Content", font=("Arial", 12, "bold"), width=20).grid(row=2, column=col_sending_message, padx=5, pady=5)
@@ -502,6 +598,9 @@ def load_main_frame(db_user_data=[0,[],[],[]]):
     tk.Button(main_frame, text="Select All", command=clicked_select_all).grid(row=4, column=col_sending_checkbox, pady=10)
     tk.Button(main_frame, text="Send", command=clicked_send).grid(row=3, column=col_sending_checkbox, pady=10)
     tk.Button(main_frame, text="New", command=clicked_new_button).grid(row=3, column=col_sending_edit, pady=10)
+    more_drafts_btn = tk.Button(main_frame, text="More Drafts", state=tk.NORMAL if next_draft_cursor else tk.DISABLED)
+    more_drafts_btn.config(command=lambda: clicked_more_drafts(more_drafts_btn))
+    more_drafts_btn.grid(row=4, column=col_sending_edit, pady=10)
 
     # blank out any unsaved changes to our drafts, as we're reloading this screen
     global drafts_checkmarks, drafts_msgs, drafts_recipients
@@ -0,0 +1,128 @@
+# retry_interceptor.py
+
+
+
+# +++++++++++++ Imports and Installs +++++++++++++ #
+import grpc
+import os
+import random
+import sys
+import time
+import uuid
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import config
+
+
+
+# ++++++++++++++  Class Definitions  ++++++++++++++ #
+class LeaderChannel(grpc.Channel):
+    """
+    A channel that forwards every call to the current leader's channel.
+    Stubs built on it stay valid across failovers: switching leader only swaps the channel underneath.
+    """
+    def __init__(self, address):
+        self.connect(address)
+
+    def connect(self, address):
+        """
+        Send all later calls to a new address, and close the channel to the old one.
+        Calls still running on the old channel are cancelled; RetryInterceptor retries them on the new one.
+        """
+        previous = getattr(self, "channel", None)
+        self.address = address
+        self.channel = grpc.insecure_channel(address)
+        if previous is not None:
+            previous.close()
+
+    def subscribe(self, callback, try_to_connect=False):
+        self.channel.subscribe(callback, try_to_connect=try_to_connect)
+
+    def unsubscribe(self, callback):
+        self.channel.unsubscribe(callback)
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, _registered_method=False):
+        return ForwardingMultiCallable(lambda: self.channel.unary_unary(method, request_serializer, response_deserializer, _registered_method))
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, _registered_method=False):
+        return ForwardingMultiCallable(lambda: self.channel.unary_stream(method, request_serializer, response_deserializer, _registered_method))
+
+    def stream_unary(self, method, request_serializer=None, response_deserializer=None, _registered_method=False):
+        return ForwardingMultiCallable(lambda: self.channel.stream_unary(method, request_serializer, response_deserializer, _registered_method))
+
+    def stream_stream(self, method, request_serializer=None, response_deserializer=None, _registered_method=False):
+        return ForwardingMultiCallable(lambda: self.channel.stream_stream(method, request_serializer, response_deserializer, _registered_method))
+
+    def close(self):
+        self.channel.close()
+
+
+class ForwardingMultiCallable:
+    """
+    Resolves the method on the leader's current channel each time it is called.
+    """
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # with_call, future, ...
+        return getattr(self.resolve(), name)
+
+
+class RetryInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """
+    Retries unary calls that failed because the server was unreachable, lost its lease, or is not the leader
+    (or that were cancelled because the client switched to a new leader meanwhile).
+    - Each write gets one idempotency token (its request_id field), reused by all of its retries,
+      so the server applies it at most once.
+    - Between attempts we back off exponentially with full jitter, so clients that lose the
+      same leader do not all reconnect in the same instant.
+    - All attempts (and finding the new leader) share one deadline, CLIENT_CALL_DEADLINE.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        deadline = time.time() + config.CLIENT_CALL_DEADLINE
+        if client_call_details.timeout is not None:
+            deadline = min(deadline, time.time() + client_call_details.timeout)
+        if "request_id" in request.DESCRIPTOR.fields_by_name and not request.request_id:
+            request.request_id = uuid.uuid4().hex
+
+        attempt = 0
+        while True:
+            leader_address = self.client.leader_address
+            details = client_call_details._replace(timeout=max(deadline - time.time(), 0))
+            call = continuation(details, request)
+            try:
+                call.result()
+                return call
+            except grpc.RpcError as e:
+                hint = self.redirect_hint(e)
+                if hint is None and e.code() == grpc.StatusCode.CANCELLED and self.client.leader_address != leader_address:
+                    # Another call switched leader and closed the channel this one was running on
+                    hint = self.client.leader_address
+                if hint is None or time.time() >= deadline:
+                    return call
+
+            # Back off, then follow the hint (or look for the leader) unless another call already moved on
+            time.sleep(min(random.uniform(0, config.CLIENT_RETRY_BASE * 2 ** attempt), config.CLIENT_RETRY_MAX_BACKOFF,
+                           max(deadline - time.time(), 0)))
+            attempt += 1
+            print(f"[CLIENT] {client_call_details.method} failed on {leader_address}; retry {attempt}.")
+            if not self.client.reconnect(failed_address=leader_address, hint=hint, deadline=deadline):
+                return call
+
+    @staticmethod
+    def redirect_hint(error):
+        """
+        Decide whether a failed call should be retried on the (new) leader.
+        Return: leader address suggested by the server ("" if none), or None if the error is not retryable
+        """
+        if error.code() == grpc.StatusCode.UNAVAILABLE:
+            return ""
+        if error.code() == grpc.StatusCode.FAILED_PRECONDITION and error.details() == "Not the leader":
+            return dict(error.trailing_metadata() or ()).get("leader-address", "")
+        return None
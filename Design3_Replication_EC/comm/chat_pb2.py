@@ -24,71 +24,109 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04\x63hat\"5\n\x12ReplicationRequest\x12\x0e\n\x06method\x18\x01 \x01(\t\x12\x0f\n\x07payload\x18\x02 \x01(\x0c\"\x12\n\x10HeartbeatRequest\"\"\n\x11HeartbeatResponse\x12\r\n\x05\x61live\x18\x01 \x01(\x08\"\x12\n\x10GetLeaderRequest\"<\n\x11GetLeaderResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x16\n\x0eleader_address\x18\x02 \x01(\t\"?\n\x14\x43reateAccountRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x15\n\rpassword_hash\x18\x02 \x01(\t\"7\n\x0cLoginRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x15\n\rpassword_hash\x18\x02 \x01(\t\"\xaf\x01\n\rLoginResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x13\n\x0binbox_count\x18\x03 \x01(\x05\x12#\n\x0cold_messages\x18\x04 \x03(\x0b\x32\r.chat.Message\x12%\n\x0einbox_messages\x18\x05 \x03(\x0b\x32\r.chat.Message\x12\x1b\n\x06\x64rafts\x18\x06 \x03(\x0b\x32\x0b.chat.Draft\"&\n\x12GetPasswordRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"N\n\x13GetPasswordResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x15\n\rpassword_hash\x18\x03 \x01(\t\"\x15\n\x13ListAccountsRequest\"K\n\x14ListAccountsResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\tusernames\x18\x03 \x03(\t\"Z\n\x12SendMessageRequest\x12\x10\n\x08\x64raft_id\x18\x01 \x01(\x05\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x04 \x01(\t\"G\n\x13SendMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0e\n\x06msg_id\x18\x03 \x01(\x05\"X\n\x0f\x41\x64\x64\x44raftRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x04 \x01(\x08\"F\n\x10\x41\x64\x64\x44raftResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x10\n\x08\x64raft_id\x18\x03 \x01(\x05\"B\n\x11SaveDraftsRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x1b\n\x06\x64rafts\x18\x02 \x03(\x0b\x32\x0b.chat.Draft\"7\n\x13\x43heckMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\":\n\x16\x44ownloadMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\"8\n\x14\x44\x65leteMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\"(\n\x14\x44\x65leteAccountRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"!\n\rLogoutRequest\x12\x10\n\x08username\x18\x01 \x01(\t\")\n\x15ReceiveMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"l\n\x16ReceiveMessageResponse\x12\x0e\n\x06msg_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x13\n\x0binbox_count\x18\x05 \x01(\x05\"h\n\x07Message\x12\x0e\n\x06msg_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x05 \x01(\x08\x12\r\n\x05inbox\x18\x06 \x01(\x08\"\\\n\x05\x44raft\x12\x10\n\x08\x64raft_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x11\n\trecipient\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x05 \x01(\x08\"3\n\x0fGenericResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"E\n\x15UpdateRegistryRequest\x12\x0b\n\x03pid\x18\x01 \x01(\x05\x12\x11\n\ttimestamp\x18\x02 \x01(\x02\x12\x0c\n\x04\x61\x64\x64r\x18\x03 \x01(\t\"E\n\x1cUpdateRegistryFullSQLRequest\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x14\n\x0csql_registry\x18\x02 \x01(\t2\xc9\t\n\x0b\x43hatService\x12\x42\n\rCreateAccount\x12\x1a.chat.CreateAccountRequest\x1a\x15.chat.GenericResponse\x12\x30\n\x05Login\x12\x12.chat.LoginRequest\x1a\x13.chat.LoginResponse\x12\x42\n\x0bGetPassword\x12\x18.chat.GetPasswordRequest\x1a\x19.chat.GetPasswordResponse\x12\x45\n\x0cListAccounts\x12\x19.chat.ListAccountsRequest\x1a\x1a.chat.ListAccountsResponse\x12\x42\n\x0bSendMessage\x12\x18.chat.SendMessageRequest\x1a\x19.chat.SendMessageResponse\x12\x39\n\x08\x41\x64\x64\x44raft\x12\x15.chat.AddDraftRequest\x1a\x16.chat.AddDraftResponse\x12<\n\nSaveDrafts\x12\x17.chat.SaveDraftsRequest\x1a\x15.chat.GenericResponse\x12@\n\x0c\x43heckMessage\x12\x19.chat.CheckMessageRequest\x1a\x15.chat.GenericResponse\x12\x46\n\x0f\x44ownloadMessage\x12\x1c.chat.DownloadMessageRequest\x1a\x15.chat.GenericResponse\x12\x42\n\rDeleteMessage\x12\x1a.chat.DeleteMessageRequest\x1a\x15.chat.GenericResponse\x12\x42\n\rDeleteAccount\x12\x1a.chat.DeleteAccountRequest\x1a\x15.chat.GenericResponse\x12\x34\n\x06Logout\x12\x13.chat.LogoutRequest\x1a\x15.chat.GenericResponse\x12S\n\x14ReceiveMessageStream\x12\x1b.chat.ReceiveMessageRequest\x1a\x1c.chat.ReceiveMessageResponse0\x01\x12<\n\tReplicate\x12\x18.chat.ReplicationRequest\x1a\x15.chat.GenericResponse\x12<\n\tHeartbeat\x12\x16.chat.HeartbeatRequest\x1a\x17.chat.HeartbeatResponse\x12<\n\tGetLeader\x12\x16.chat.GetLeaderRequest\x1a\x17.chat.GetLeaderResponse\x12Q\n\x0eUpdateRegistry\x12\x1b.chat.UpdateRegistryRequest\x1a\".chat.UpdateRegistryFullSQLRequest\x12R\n\x15UpdateRegistryReplica\x12\".chat.UpdateRegistryFullSQLRequest\x1a\x15.chat.GenericResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04\x63hat\"P\n\x12ReplicationRequest\x12\x0e\n\x06method\x18\x01 \x01(\t\x12\x0f\n\x07payload\x18\x02 \x01(\x0c\x12\x0b\n\x03seq\x18\x03 \x01(\x03\x12\x0c\n\x04term\x18\x04 \x01(\x03\"\x99\x01\n\x10ReplicationBatch\x12)\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\x18.chat.ReplicationRequest\x12\x0c\n\x04term\x18\x02 \x01(\x03\x12\x12\n\nleader_pid\x18\x03 \x01(\x05\x12\x13\n\x0bleader_addr\x18\x04 \x01(\t\x12\x10\n\x08prev_seq\x18\x05 \x01(\x03\x12\x11\n\tprev_term\x18\x06 \x01(\x03\"n\n\x18ReplicationBatchResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x10\n\x08last_seq\x18\x03 \x01(\x03\x12\x0c\n\x04term\x18\x04 \x01(\x03\x12\x10\n\x08\x63onflict\x18\x05 \x01(\x08\"b\n\x10HeartbeatRequest\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x0b\n\x03pid\x18\x02 \x01(\x05\x12\x0c\n\x04\x61\x64\x64r\x18\x03 \x01(\t\x12\x11\n\tis_leader\x18\x04 \x01(\x08\x12\x12\n\ncommit_seq\x18\x05 \x01(\x03\"0\n\x11HeartbeatResponse\x12\r\n\x05\x61live\x18\x01 \x01(\x08\x12\x0c\n\x04term\x18\x02 \x01(\x03\"\x81\x01\n\x0bVoteRequest\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x15\n\rcandidate_pid\x18\x02 \x01(\x05\x12\x16\n\x0e\x63\x61ndidate_addr\x18\x03 \x01(\t\x12\x10\n\x08last_seq\x18\x04 \x01(\x03\x12\x11\n\tlast_term\x18\x05 \x01(\x03\x12\x10\n\x08pre_vote\x18\x06 \x01(\x08\"[\n\x0cVoteResponse\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x14\n\x0cvote_granted\x18\x02 \x01(\x08\x12\x12\n\nleader_pid\x18\x03 \x01(\x05\x12\x13\n\x0bleader_addr\x18\x04 \x01(\t\"\x12\n\x10GetLeaderRequest\"y\n\x11GetLeaderResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x16\n\x0eleader_address\x18\x02 \x01(\t\x12\x19\n\x11replica_addresses\x18\x03 \x03(\t\x12\x12\n\nleader_pid\x18\x04 \x01(\x05\x12\x0c\n\x04term\x18\x05 \x01(\x03\"\x14\n\x12WatchLeaderRequest\"S\n\x14\x43reateAccountRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x15\n\rpassword_hash\x18\x02 \x01(\t\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"^\n\x0cLoginRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x15\n\rpassword_hash\x18\x02 \x01(\t\x12\x12\n\nrequest_id\x18\x03 \x01(\t\x12\x11\n\tpage_size\x18\x04 \x01(\x05\"\x8b\x02\n\rLoginResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x13\n\x0binbox_count\x18\x03 \x01(\x05\x12#\n\x0cold_messages\x18\x04 \x03(\x0b\x32\r.chat.Message\x12%\n\x0einbox_messages\x18\x05 \x03(\x0b\x32\r.chat.Message\x12\x1b\n\x06\x64rafts\x18\x06 \x03(\x0b\x32\x0b.chat.Draft\x12\x0b\n\x03seq\x18\x07 \x01(\x03\x12\x17\n\x0fnext_old_cursor\x18\x08 \x01(\x05\x12\x19\n\x11next_inbox_cursor\x18\t \x01(\x05\x12\x19\n\x11next_draft_cursor\x18\n \x01(\x05\"N\n\x12GetPasswordRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0f\n\x07min_seq\x18\x02 \x01(\x03\x12\x15\n\rmax_staleness\x18\x03 \x01(\x01\"[\n\x13GetPasswordResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x15\n\rpassword_hash\x18\x03 \x01(\t\x12\x0b\n\x03seq\x18\x04 \x01(\x03\"=\n\x13ListAccountsRequest\x12\x0f\n\x07min_seq\x18\x01 \x01(\x03\x12\x15\n\rmax_staleness\x18\x02 \x01(\x01\"X\n\x14ListAccountsResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\tusernames\x18\x03 \x03(\t\x12\x0b\n\x03seq\x18\x04 \x01(\x03\"\x81\x01\n\x13ListMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\r\n\x05inbox\x18\x02 \x01(\x08\x12\x0e\n\x06\x63ursor\x18\x03 \x01(\x05\x12\x11\n\tpage_size\x18\x04 \x01(\x05\x12\x0f\n\x07min_seq\x18\x05 \x01(\x03\x12\x15\n\rmax_staleness\x18\x06 \x01(\x01\"{\n\x14ListMessagesResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1f\n\x08messages\x18\x03 \x03(\x0b\x32\r.chat.Message\x12\x13\n\x0bnext_cursor\x18\x04 \x01(\x05\x12\x0b\n\x03seq\x18\x05 \x01(\x03\"p\n\x11ListDraftsRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06\x63ursor\x18\x02 \x01(\x05\x12\x11\n\tpage_size\x18\x03 \x01(\x05\x12\x0f\n\x07min_seq\x18\x04 \x01(\x03\x12\x15\n\rmax_staleness\x18\x05 \x01(\x01\"u\n\x12ListDraftsResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1b\n\x06\x64rafts\x18\x03 \x03(\x0b\x32\x0b.chat.Draft\x12\x13\n\x0bnext_cursor\x18\x04 \x01(\x05\x12\x0b\n\x03seq\x18\x05 \x01(\x03\"N\n\x12SyncMailboxRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0f\n\x07min_seq\x18\x02 \x01(\x03\x12\x15\n\rmax_staleness\x18\x03 \x01(\x01\"Y\n\x0cMailboxChunk\x12\x1f\n\x08messages\x18\x01 \x03(\x0b\x32\r.chat.Message\x12\x1b\n\x06\x64rafts\x18\x02 \x03(\x0b\x32\x0b.chat.Draft\x12\x0b\n\x03seq\x18\x03 \x01(\x03\"_\n\x10SyncSinceRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x11\n\tsince_seq\x18\x02 \x01(\x03\x12\x0f\n\x07min_seq\x18\x03 \x01(\x03\x12\x15\n\rmax_staleness\x18\x04 \x01(\x01\"\xe5\x01\n\x11SyncSinceResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1f\n\x08messages\x18\x03 \x03(\x0b\x32\r.chat.Message\x12\x1b\n\x06\x64rafts\x18\x04 \x03(\x0b\x32\x0b.chat.Draft\x12\x17\n\x0f\x64\x65leted_msg_ids\x18\x05 \x03(\x05\x12\x19\n\x11\x64\x65leted_draft_ids\x18\x06 \x03(\x05\x12\x13\n\x0binbox_count\x18\x07 \x01(\x05\x12\x1a\n\x12\x66ull_sync_required\x18\x08 \x01(\x08\x12\x0b\n\x03seq\x18\t \x01(\x03\"n\n\x12SendMessageRequest\x12\x10\n\x08\x64raft_id\x18\x01 \x01(\x05\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x04 \x01(\t\x12\x12\n\nrequest_id\x18\x05 \x01(\t\"T\n\x13SendMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0e\n\x06msg_id\x18\x03 \x01(\x05\x12\x0b\n\x03seq\x18\x04 \x01(\x03\"l\n\x0f\x41\x64\x64\x44raftRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x11\n\trecipient\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x04 \x01(\x08\x12\x12\n\nrequest_id\x18\x05 \x01(\t\"S\n\x10\x41\x64\x64\x44raftResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x10\n\x08\x64raft_id\x18\x03 \x01(\x05\x12\x0b\n\x03seq\x18\x04 \x01(\x03\"V\n\x11SaveDraftsRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x1b\n\x06\x64rafts\x18\x02 \x03(\x0b\x32\x0b.chat.Draft\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"K\n\x13\x43heckMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"N\n\x16\x44ownloadMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"L\n\x14\x44\x65leteMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\x05\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"<\n\x14\x44\x65leteAccountRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x12\n\nrequest_id\x18\x02 \x01(\t\"5\n\rLogoutRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x12\n\nrequest_id\x18\x02 \x01(\t\")\n\x15ReceiveMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"l\n\x16ReceiveMessageResponse\x12\x0e\n\x06msg_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x13\n\x0binbox_count\x18\x05 \x01(\x05\"h\n\x07Message\x12\x0e\n\x06msg_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x0e\n\x06sender\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x05 \x01(\x08\x12\r\n\x05inbox\x18\x06 \x01(\x08\"\\\n\x05\x44raft\x12\x10\n\x08\x64raft_id\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x11\n\trecipient\x18\x03 \x01(\t\x12\x0b\n\x03msg\x18\x04 \x01(\t\x12\x0f\n\x07\x63hecked\x18\x05 \x01(\x08\"@\n\x0fGenericResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0b\n\x03seq\x18\x03 \x01(\x03\"j\n\x15UpdateRegistryRequest\x12\x0b\n\x03pid\x18\x01 \x01(\x05\x12\x11\n\ttimestamp\x18\x02 \x01(\x02\x12\x0c\n\x04\x61\x64\x64r\x18\x03 \x01(\t\x12\x10\n\x08last_seq\x18\x04 \x01(\x03\x12\x11\n\tlast_term\x18\x05 \x01(\x03\"\x89\x01\n\x1cUpdateRegistryFullSQLRequest\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x14\n\x0csql_registry\x18\x02 \x01(\t\x12\x13\n\x0bincremental\x18\x03 \x01(\x08\x12-\n\x0blog_entries\x18\x04 \x03(\x0b\x32\x18.chat.ReplicationRequest\"\x1e\n\x0fSnapshotRequest\x12\x0b\n\x03pid\x18\x01 \x01(\x05\"I\n\x07\x41\x63\x63ount\x12\x0c\n\x04uuid\x18\x01 \x01(\x05\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x0b\n\x03pwd\x18\x03 \x01(\t\x12\x11\n\tlogged_in\x18\x04 \x01(\x08\"\x8a\x02\n\rSnapshotChunk\x12\x1f\n\x08\x61\x63\x63ounts\x18\x01 \x03(\x0b\x32\r.chat.Account\x12\x1f\n\x08messages\x18\x02 \x03(\x0b\x32\r.chat.Message\x12\x1b\n\x06\x64rafts\x18\x03 \x03(\x0b\x32\x0b.chat.Draft\x12\x0c\n\x04\x64one\x18\x04 \x01(\x08\x12\x10\n\x08last_seq\x18\x05 \x01(\x03\x12\x11\n\tlast_term\x18\x06 \x01(\x03\x12\x35\n\tsequences\x18\x07 \x03(\x0b\x32\".chat.SnapshotChunk.SequencesEntry\x1a\x30\n\x0eSequencesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\"!\n\x11SnapshotFileChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x32\x9a\x0e\n\x0b\x43hatService\x12\x42\n\rCreateAccount\x12\x1a.chat.CreateAccountRequest\x1a\x15.chat.GenericResponse\x12\x30\n\x05Login\x12\x12.chat.LoginRequest\x1a\x13.chat.LoginResponse\x12\x42\n\x0bGetPassword\x12\x18.chat.GetPasswordRequest\x1a\x19.chat.GetPasswordResponse\x12\x45\n\x0cListAccounts\x12\x19.chat.ListAccountsRequest\x1a\x1a.chat.ListAccountsResponse\x12\x45\n\x0cListMessages\x12\x19.chat.ListMessagesRequest\x1a\x1a.chat.ListMessagesResponse\x12?\n\nListDrafts\x12\x17.chat.ListDraftsRequest\x1a\x18.chat.ListDraftsResponse\x12=\n\x0bSyncMailbox\x12\x18.chat.SyncMailboxRequest\x1a\x12.chat.MailboxChunk0\x01\x12<\n\tSyncSince\x12\x16.chat.SyncSinceRequest\x1a\x17.chat.SyncSinceResponse\x12\x42\n\x0bSendMessage\x12\x18.chat.SendMessageRequest\x1a\x19.chat.SendMessageResponse\x12\x39\n\x08\x41\x64\x64\x44raft\x12\x15.chat.AddDraftRequest\x1a\x16.chat.AddDraftResponse\x12<\n\nSaveDrafts\x12\x17.chat.SaveDraftsRequest\x1a\x15.chat.GenericResponse\x12@\n\x0c\x43heckMessage\x12\x19.chat.CheckMessageRequest\x1a\x15.chat.GenericResponse\x12\x46\n\x0f\x44ownloadMessage\x12\x1c.chat.DownloadMessageRequest\x1a\x15.chat.GenericResponse\x12\x42\n\rDeleteMessage\x12\x1a.chat.DeleteMessageRequest\x1a\x15.chat.GenericResponse\x12\x42\n\rDeleteAccount\x12\x1a.chat.DeleteAccountRequest\x1a\x15.chat.GenericResponse\x12\x34\n\x06Logout\x12\x13.chat.LogoutRequest\x1a\x15.chat.GenericResponse\x12S\n\x14ReceiveMessageStream\x12\x1b.chat.ReceiveMessageRequest\x1a\x1c.chat.ReceiveMessageResponse0\x01\x12<\n\tReplicate\x12\x18.chat.ReplicationRequest\x1a\x15.chat.GenericResponse\x12H\n\x0eReplicateBatch\x12\x16.chat.ReplicationBatch\x1a\x1e.chat.ReplicationBatchResponse\x12<\n\tHeartbeat\x12\x16.chat.HeartbeatRequest\x1a\x17.chat.HeartbeatResponse\x12\x34\n\x0bRequestVote\x12\x11.chat.VoteRequest\x1a\x12.chat.VoteResponse\x12<\n\tGetLeader\x12\x16.chat.GetLeaderRequest\x1a\x17.chat.GetLeaderResponse\x12\x42\n\x0bWatchLeader\x12\x18.chat.WatchLeaderRequest\x1a\x17.chat.GetLeaderResponse0\x01\x12Q\n\x0eUpdateRegistry\x12\x1b.chat.UpdateRegistryRequest\x1a\".chat.UpdateRegistryFullSQLRequest\x12R\n\x15UpdateRegistryReplica\x12\".chat.UpdateRegistryFullSQLRequest\x1a\x15.chat.GenericResponse\x12>\n\x0eStreamSnapshot\x12\x15.chat.SnapshotRequest\x1a\x13.chat.SnapshotChunk0\x01\x12\x46\n\x12StreamSnapshotFile\x12\x15.chat.SnapshotRequest\x1a\x17.chat.SnapshotFileChunk0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'chat_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_SNAPSHOTCHUNK_SEQUENCESENTRY']._loaded_options = None
+  _globals['_SNAPSHOTCHUNK_SEQUENCESENTRY']._serialized_options = b'8\001'
   _globals['_REPLICATIONREQUEST']._serialized_start=20
-  _globals['_REPLICATIONREQUEST']._serialized_end=73
-  _globals['_HEARTBEATREQUEST']._serialized_start=75
-  _globals['_HEARTBEATREQUEST']._serialized_end=93
-  _globals['_HEARTBEATRESPONSE']._serialized_start=95
-  _globals['_HEARTBEATRESPONSE']._serialized_end=129
-  _globals['_GETLEADERREQUEST']._serialized_start=131
-  _globals['_GETLEADERREQUEST']._serialized_end=149
-  _globals['_GETLEADERRESPONSE']._serialized_start=151
-  _globals['_GETLEADERRESPONSE']._serialized_end=211
-  _globals['_CREATEACCOUNTREQUEST']._serialized_start=213
-  _globals['_CREATEACCOUNTREQUEST']._serialized_end=276
-  _globals['_LOGINREQUEST']._serialized_start=278
-  _globals['_LOGINREQUEST']._serialized_end=333
-  _globals['_LOGINRESPONSE']._serialized_start=336
-  _globals['_LOGINRESPONSE']._serialized_end=511
-  _globals['_GETPASSWORDREQUEST']._serialized_start=513
-  _globals['_GETPASSWORDREQUEST']._serialized_end=551
-  _globals['_GETPASSWORDRESPONSE']._serialized_start=553
-  _globals['_GETPASSWORDRESPONSE']._serialized_end=631
-  _globals['_LISTACCOUNTSREQUEST']._serialized_start=633
-  _globals['_LISTACCOUNTSREQUEST']._serialized_end=654
-  _globals['_LISTACCOUNTSRESPONSE']._serialized_start=656
-  _globals['_LISTACCOUNTSRESPONSE']._serialized_end=731
-  _globals['_SENDMESSAGEREQUEST']._serialized_start=733
-  _globals['_SENDMESSAGEREQUEST']._serialized_end=823
-  _globals['_SENDMESSAGERESPONSE']._serialized_start=825
-  _globals['_SENDMESSAGERESPONSE']._serialized_end=896
-  _globals['_ADDDRAFTREQUEST']._serialized_start=898
-  _globals['_ADDDRAFTREQUEST']._serialized_end=986
-  _globals['_ADDDRAFTRESPONSE']._serialized_start=988
-  _globals['_ADDDRAFTRESPONSE']._serialized_end=1058
-  _globals['_SAVEDRAFTSREQUEST']._serialized_start=1060
-  _globals['_SAVEDRAFTSREQUEST']._serialized_end=1126
-  _globals['_CHECKMESSAGEREQUEST']._serialized_start=1128
-  _globals['_CHECKMESSAGEREQUEST']._serialized_end=1183
-  _globals['_DOWNLOADMESSAGEREQUEST']._serialized_start=1185
-  _globals['_DOWNLOADMESSAGEREQUEST']._serialized_end=1243
-  _globals['_DELETEMESSAGEREQUEST']._serialized_start=1245
-  _globals['_DELETEMESSAGEREQUEST']._serialized_end=1301
-  _globals['_DELETEACCOUNTREQUEST']._serialized_start=1303
-  _globals['_DELETEACCOUNTREQUEST']._serialized_end=1343
-  _globals['_LOGOUTREQUEST']._serialized_start=1345
-  _globals['_LOGOUTREQUEST']._serialized_end=1378
-  _globals['_RECEIVEMESSAGEREQUEST']._serialized_start=1380
-  _globals['_RECEIVEMESSAGEREQUEST']._serialized_end=1421
-  _globals['_RECEIVEMESSAGERESPONSE']._serialized_start=1423
-  _globals['_RECEIVEMESSAGERESPONSE']._serialized_end=1531
-  _globals['_MESSAGE']._serialized_start=1533
-  _globals['_MESSAGE']._serialized_end=1637
-  _globals['_DRAFT']._serialized_start=1639
-  _globals['_DRAFT']._serialized_end=1731
-  _globals['_GENERICRESPONSE']._serialized_start=1733
-  _globals['_GENERICRESPONSE']._serialized_end=1784
-  _globals['_UPDATEREGISTRYREQUEST']._serialized_start=1786
-  _globals['_UPDATEREGISTRYREQUEST']._serialized_end=1855
-  _globals['_UPDATEREGISTRYFULLSQLREQUEST']._serialized_start=1857
-  _globals['_UPDATEREGISTRYFULLSQLREQUEST']._serialized_end=1926
-  _globals['_CHATSERVICE']._serialized_start=1929
-  _globals['_CHATSERVICE']._serialized_end=3154
+  _globals['_REPLICATIONREQUEST']._serialized_end=100
+  _globals['_REPLICATIONBATCH']._serialized_start=103
+  _globals['_REPLICATIONBATCH']._serialized_end=256
+  _globals['_REPLICATIONBATCHRESPONSE']._serialized_start=258
+  _globals['_REPLICATIONBATCHRESPONSE']._serialized_end=368
+  _globals['_HEARTBEATREQUEST']._serialized_start=370
+  _globals['_HEARTBEATREQUEST']._serialized_end=468
+  _globals['_HEARTBEATRESPONSE']._serialized_start=470
+  _globals['_HEARTBEATRESPONSE']._serialized_end=518
+  _globals['_VOTEREQUEST']._serialized_start=521
+  _globals['_VOTEREQUEST']._serialized_end=650
+  _globals['_VOTERESPONSE']._serialized_start=652
+  _globals['_VOTERESPONSE']._serialized_end=743
+  _globals['_GETLEADERREQUEST']._serialized_start=745
+  _globals['_GETLEADERREQUEST']._serialized_end=763
+  _globals['_GETLEADERRESPONSE']._serialized_start=765
+  _globals['_GETLEADERRESPONSE']._serialized_end=886
+  _globals['_WATCHLEADERREQUEST']._serialized_start=888
+  _globals['_WATCHLEADERREQUEST']._serialized_end=908
+  _globals['_CREATEACCOUNTREQUEST']._serialized_start=910
+  _globals['_CREATEACCOUNTREQUEST']._serialized_end=993
+  _globals['_LOGINREQUEST']._serialized_start=995
+  _globals['_LOGINREQUEST']._serialized_end=1089
+  _globals['_LOGINRESPONSE']._serialized_start=1092
+  _globals['_LOGINRESPONSE']._serialized_end=1359
+  _globals['_GETPASSWORDREQUEST']._serialized_start=1361
+  _globals['_GETPASSWORDREQUEST']._serialized_end=1439
+  _globals['_GETPASSWORDRESPONSE']._serialized_start=1441
+  _globals['_GETPASSWORDRESPONSE']._serialized_end=1532
+  _globals['_LISTACCOUNTSREQUEST']._serialized_start=1534
+  _globals['_LISTACCOUNTSREQUEST']._serialized_end=1595
+  _globals['_LISTACCOUNTSRESPONSE']._serialized_start=1597
+  _globals['_LISTACCOUNTSRESPONSE']._serialized_end=1685
+  _globals['_LISTMESSAGESREQUEST']._serialized_start=1688
+  _globals['_LISTMESSAGESREQUEST']._serialized_end=1817
+  _globals['_LISTMESSAGESRESPONSE']._serialized_start=1819
+  _globals['_LISTMESSAGESRESPONSE']._serialized_end=1942
+  _globals['_LISTDRAFTSREQUEST']._serialized_start=1944
+  _globals['_LISTDRAFTSREQUEST']._serialized_end=2056
+  _globals['_LISTDRAFTSRESPONSE']._serialized_start=2058
+  _globals['_LISTDRAFTSRESPONSE']._serialized_end=2175
+  _globals['_SYNCMAILBOXREQUEST']._serialized_start=2177
+  _globals['_SYNCMAILBOXREQUEST']._serialized_end=2255
+  _globals['_MAILBOXCHUNK']._serialized_start=2257
+  _globals['_MAILBOXCHUNK']._serialized_end=2346
+  _globals['_SYNCSINCEREQUEST']._serialized_start=2348
+  _globals['_SYNCSINCEREQUEST']._serialized_end=2443
+  _globals['_SYNCSINCERESPONSE']._serialized_start=2446
+  _globals['_SYNCSINCERESPONSE']._serialized_end=2675
+  _globals['_SENDMESSAGEREQUEST']._serialized_start=2677
+  _globals['_SENDMESSAGEREQUEST']._serialized_end=2787
+  _globals['_SENDMESSAGERESPONSE']._serialized_start=2789
+  _globals['_SENDMESSAGERESPONSE']._serialized_end=2873
+  _globals['_ADDDRAFTREQUEST']._serialized_start=2875
+  _globals['_ADDDRAFTREQUEST']._serialized_end=2983
+  _globals['_ADDDRAFTRESPONSE']._serialized_start=2985
+  _globals['_ADDDRAFTRESPONSE']._serialized_end=3068
+  _globals['_SAVEDRAFTSREQUEST']._serialized_start=3070
+  _globals['_SAVEDRAFTSREQUEST']._serialized_end=3156
+  _globals['_CHECKMESSAGEREQUEST']._serialized_start=3158
+  _globals['_CHECKMESSAGEREQUEST']._serialized_end=3233
+  _globals['_DOWNLOADMESSAGEREQUEST']._serialized_start=3235
+  _globals['_DOWNLOADMESSAGEREQUEST']._serialized_end=3313
+  _globals['_DELETEMESSAGEREQUEST']._serialized_start=3315
+  _globals['_DELETEMESSAGEREQUEST']._serialized_end=3391
+  _globals['_DELETEACCOUNTREQUEST']._serialized_start=3393
+  _globals['_DELETEACCOUNTREQUEST']._serialized_end=3453
+  _globals['_LOGOUTREQUEST']._serialized_start=3455
+  _globals['_LOGOUTREQUEST']._serialized_end=3508
+  _globals['_RECEIVEMESSAGEREQUEST']._serialized_start=3510
+  _globals['_RECEIVEMESSAGEREQUEST']._serialized_end=3551
+  _globals['_RECEIVEMESSAGERESPONSE']._serialized_start=3553
+  _globals['_RECEIVEMESSAGERESPONSE']._serialized_end=3661
+  _globals['_MESSAGE']._serialized_start=3663
+  _globals['_MESSAGE']._serialized_end=3767
+  _globals['_DRAFT']._serialized_start=3769
+  _globals['_DRAFT']._serialized_end=3861
+  _globals['_GENERICRESPONSE']._serialized_start=3863
+  _globals['_GENERICRESPONSE']._serialized_end=3927
+  _globals['_UPDATEREGISTRYREQUEST']._serialized_start=3929
+  _globals['_UPDATEREGISTRYREQUEST']._serialized_end=4035
+  _globals['_UPDATEREGISTRYFULLSQLREQUEST']._serialized_start=4038
+  _globals['_UPDATEREGISTRYFULLSQLREQUEST']._serialized_end=4175
+  _globals['_SNAPSHOTREQUEST']._serialized_start=4177
+  _globals['_SNAPSHOTREQUEST']._serialized_end=4207
+  _globals['_ACCOUNT']._serialized_start=4209
+  _globals['_ACCOUNT']._serialized_end=4282
+  _globals['_SNAPSHOTCHUNK']._serialized_start=4285
+  _globals['_SNAPSHOTCHUNK']._serialized_end=4551
+  _globals['_SNAPSHOTCHUNK_SEQUENCESENTRY']._serialized_start=4503
+  _globals['_SNAPSHOTCHUNK_SEQUENCESENTRY']._serialized_end=4551
+  _globals['_SNAPSHOTFILECHUNK']._serialized_start=4553
+  _globals['_SNAPSHOTFILECHUNK']._serialized_end=4586
+  _globals['_CHATSERVICE']._serialized_start=4589
+  _globals['_CHATSERVICE']._serialized_end=6407
 # @@protoc_insertion_point(module_scope)
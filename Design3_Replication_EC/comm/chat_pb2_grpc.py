@@ -54,6 +54,26 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.ListAccountsRequest.SerializeToString,
                 response_deserializer=chat__pb2.ListAccountsResponse.FromString,
                 _registered_method=True)
+        self.ListMessages = channel.unary_unary(
+                '/chat.ChatService/ListMessages',
+                request_serializer=chat__pb2.ListMessagesRequest.SerializeToString,
+                response_deserializer=chat__pb2.ListMessagesResponse.FromString,
+                _registered_method=True)
+        self.ListDrafts = channel.unary_unary(
+                '/chat.ChatService/ListDrafts',
+                request_serializer=chat__pb2.ListDraftsRequest.SerializeToString,
+                response_deserializer=chat__pb2.ListDraftsResponse.FromString,
+                _registered_method=True)
+        self.SyncMailbox = channel.unary_stream(
+                '/chat.ChatService/SyncMailbox',
+                request_serializer=chat__pb2.SyncMailboxRequest.SerializeToString,
+                response_deserializer=chat__pb2.MailboxChunk.FromString,
+                _registered_method=True)
+        self.SyncSince = channel.unary_unary(
+                '/chat.ChatService/SyncSince',
+                request_serializer=chat__pb2.SyncSinceRequest.SerializeToString,
+                response_deserializer=chat__pb2.SyncSinceResponse.FromString,
+                _registered_method=True)
         self.SendMessage = channel.unary_unary(
                 '/chat.ChatService/SendMessage',
                 request_serializer=chat__pb2.SendMessageRequest.SerializeToString,
@@ -104,16 +124,31 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.ReplicationRequest.SerializeToString,
                 response_deserializer=chat__pb2.GenericResponse.FromString,
                 _registered_method=True)
+        self.ReplicateBatch = channel.unary_unary(
+                '/chat.ChatService/ReplicateBatch',
+                request_serializer=chat__pb2.ReplicationBatch.SerializeToString,
+                response_deserializer=chat__pb2.ReplicationBatchResponse.FromString,
+                _registered_method=True)
         self.Heartbeat = channel.unary_unary(
                 '/chat.ChatService/Heartbeat',
                 request_serializer=chat__pb2.HeartbeatRequest.SerializeToString,
                 response_deserializer=chat__pb2.HeartbeatResponse.FromString,
                 _registered_method=True)
+        self.RequestVote = channel.unary_unary(
+                '/chat.ChatService/RequestVote',
+                request_serializer=chat__pb2.VoteRequest.SerializeToString,
+                response_deserializer=chat__pb2.VoteResponse.FromString,
+                _registered_method=True)
         self.GetLeader = channel.unary_unary(
                 '/chat.ChatService/GetLeader',
                 request_serializer=chat__pb2.GetLeaderRequest.SerializeToString,
                 response_deserializer=chat__pb2.GetLeaderResponse.FromString,
                 _registered_method=True)
+        self.WatchLeader = channel.unary_stream(
+                '/chat.ChatService/WatchLeader',
+                request_serializer=chat__pb2.WatchLeaderRequest.SerializeToString,
+                response_deserializer=chat__pb2.GetLeaderResponse.FromString,
+                _registered_method=True)
         self.UpdateRegistry = channel.unary_unary(
                 '/chat.ChatService/UpdateRegistry',
                 request_serializer=chat__pb2.UpdateRegistryRequest.SerializeToString,
@@ -124,6 +159,16 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.UpdateRegistryFullSQLRequest.SerializeToString,
                 response_deserializer=chat__pb2.GenericResponse.FromString,
                 _registered_method=True)
+        self.StreamSnapshot = channel.unary_stream(
+                '/chat.ChatService/StreamSnapshot',
+                request_serializer=chat__pb2.SnapshotRequest.SerializeToString,
+                response_deserializer=chat__pb2.SnapshotChunk.FromString,
+                _registered_method=True)
+        self.StreamSnapshotFile = channel.unary_stream(
+                '/chat.ChatService/StreamSnapshotFile',
+                request_serializer=chat__pb2.SnapshotRequest.SerializeToString,
+                response_deserializer=chat__pb2.SnapshotFileChunk.FromString,
+                _registered_method=True)
 
 
 class ChatServiceServicer(object):
@@ -153,6 +198,30 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ListMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListDrafts(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SyncMailbox(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SyncSince(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def SendMessage(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -213,18 +282,36 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ReplicateBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Heartbeat(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RequestVote(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GetLeader(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def WatchLeader(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def UpdateRegistry(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -237,6 +324,18 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamSnapshot(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamSnapshotFile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ChatServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -260,6 +359,26 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.ListAccountsRequest.FromString,
                     response_serializer=chat__pb2.ListAccountsResponse.SerializeToString,
             ),
+            'ListMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListMessages,
+                    request_deserializer=chat__pb2.ListMessagesRequest.FromString,
+                    response_serializer=chat__pb2.ListMessagesResponse.SerializeToString,
+            ),
+            'ListDrafts': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListDrafts,
+                    request_deserializer=chat__pb2.ListDraftsRequest.FromString,
+                    response_serializer=chat__pb2.ListDraftsResponse.SerializeToString,
+            ),
+            'SyncMailbox': grpc.unary_stream_rpc_method_handler(
+                    servicer.SyncMailbox,
+                    request_deserializer=chat__pb2.SyncMailboxRequest.FromString,
+                    response_serializer=chat__pb2.MailboxChunk.SerializeToString,
+            ),
+            'SyncSince': grpc.unary_unary_rpc_method_handler(
+                    servicer.SyncSince,
+                    request_deserializer=chat__pb2.SyncSinceRequest.FromString,
+                    response_serializer=chat__pb2.SyncSinceResponse.SerializeToString,
+            ),
             'SendMessage': grpc.unary_unary_rpc_method_handler(
                     servicer.SendMessage,
                     request_deserializer=chat__pb2.SendMessageRequest.FromString,
@@ -310,16 +429,31 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.ReplicationRequest.FromString,
                     response_serializer=chat__pb2.GenericResponse.SerializeToString,
             ),
+            'ReplicateBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.ReplicateBatch,
+                    request_deserializer=chat__pb2.ReplicationBatch.FromString,
+                    response_serializer=chat__pb2.ReplicationBatchResponse.SerializeToString,
+            ),
             'Heartbeat': grpc.unary_unary_rpc_method_handler(
                     servicer.Heartbeat,
                     request_deserializer=chat__pb2.HeartbeatRequest.FromString,
                     response_serializer=chat__pb2.HeartbeatResponse.SerializeToString,
             ),
+            'RequestVote': grpc.unary_unary_rpc_method_handler(
+                    servicer.RequestVote,
+                    request_deserializer=chat__pb2.VoteRequest.FromString,
+                    response_serializer=chat__pb2.VoteResponse.SerializeToString,
+            ),
             'GetLeader': grpc.unary_unary_rpc_method_handler(
                     servicer.GetLeader,
                     request_deserializer=chat__pb2.GetLeaderRequest.FromString,
                     response_serializer=chat__pb2.GetLeaderResponse.SerializeToString,
             ),
+            'WatchLeader': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchLeader,
+                    request_deserializer=chat__pb2.WatchLeaderRequest.FromString,
+                    response_serializer=chat__pb2.GetLeaderResponse.SerializeToString,
+            ),
             'UpdateRegistry': grpc.unary_unary_rpc_method_handler(
                     servicer.UpdateRegistry,
                     request_deserializer=chat__pb2.UpdateRegistryRequest.FromString,
@@ -330,6 +464,16 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.UpdateRegistryFullSQLRequest.FromString,
                     response_serializer=chat__pb2.GenericResponse.SerializeToString,
             ),
+            'StreamSnapshot': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamSnapshot,
+                    request_deserializer=chat__pb2.SnapshotRequest.FromString,
+                    response_serializer=chat__pb2.SnapshotChunk.SerializeToString,
+            ),
+            'StreamSnapshotFile': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamSnapshotFile,
+                    request_deserializer=chat__pb2.SnapshotRequest.FromString,
+                    response_serializer=chat__pb2.SnapshotFileChunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'chat.ChatService', rpc_method_handlers)
@@ -449,6 +593,114 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def ListMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/ListMessages',
+            chat__pb2.ListMessagesRequest.SerializeToString,
+            chat__pb2.ListMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListDrafts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/ListDrafts',
+            chat__pb2.ListDraftsRequest.SerializeToString,
+            chat__pb2.ListDraftsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SyncMailbox(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/chat.ChatService/SyncMailbox',
+            chat__pb2.SyncMailboxRequest.SerializeToString,
+            chat__pb2.MailboxChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SyncSince(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/SyncSince',
+            chat__pb2.SyncSinceRequest.SerializeToString,
+            chat__pb2.SyncSinceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def SendMessage(request,
             target,
@@ -719,6 +971,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def ReplicateBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/ReplicateBatch',
+            chat__pb2.ReplicationBatch.SerializeToString,
+            chat__pb2.ReplicationBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def Heartbeat(request,
             target,
@@ -746,6 +1025,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def RequestVote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/RequestVote',
+            chat__pb2.VoteRequest.SerializeToString,
+            chat__pb2.VoteResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def GetLeader(request,
             target,
@@ -773,6 +1079,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def WatchLeader(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/chat.ChatService/WatchLeader',
+            chat__pb2.WatchLeaderRequest.SerializeToString,
+            chat__pb2.GetLeaderResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def UpdateRegistry(request,
             target,
@@ -826,3 +1159,57 @@ class ChatService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamSnapshot(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/chat.ChatService/StreamSnapshot',
+            chat__pb2.SnapshotRequest.SerializeToString,
+            chat__pb2.SnapshotChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamSnapshotFile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/chat.ChatService/StreamSnapshotFile',
+            chat__pb2.SnapshotRequest.SerializeToString,
+            chat__pb2.SnapshotFileChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -3,15 +3,132 @@ import multiprocessing
 
 # ALL_HOSTS: All globally known hosts upon startup
 # MAX_PID: max_pid that client will try before stopping search
+# JOIN_SCAN_PIDS: A starting server asks the members it remembers, then the servers with pids below this, for the leader
 # For testing, simply set 'ALL_HOSTS' to 127.0.0.1
 ALL_HOSTS    = ["127.0.0.1"]  #  "10.250.239.251", "10.250.62.219",
 BASE_PORT   = 12300            
 BUF_SIZE    = 4096
 MAX_PID     = 1000
+JOIN_SCAN_PIDS = 10
+
+# SERVER_UNARY_WORKERS: Worker threads kept free for unary calls (SendMessage, Login, replication, heartbeats, ...)
+# SERVER_STREAM_WORKERS: Max response streams open at once (ReceiveMessageStream per online user, WatchLeader, snapshots);
+#                        each holds a worker while open, so a server runs SERVER_UNARY_WORKERS + SERVER_STREAM_WORKERS workers
+# SERVER_MAX_CONCURRENT_RPCS: Calls a server accepts at once, running or queued; more are refused with RESOURCE_EXHAUSTED
+SERVER_UNARY_WORKERS       = 32
+SERVER_STREAM_WORKERS      = 300
+SERVER_MAX_CONCURRENT_RPCS = 1000
+
+# SERVER_ASYNC: Run the grpc.aio server (--aio). Message and leader streams are then coroutines, not worker threads,
+#               so SERVER_STREAM_WORKERS does not apply and one server holds tens of thousands of idle subscribers
+# SERVER_ASYNC_MAX_CONCURRENT_RPCS: Calls an async server accepts at once, open streams included
+SERVER_ASYNC                     = False
+SERVER_ASYNC_MAX_CONCURRENT_RPCS = 50000
 
 # HEARTBEAT_INTERVAL: How often to send heartbeat messages
-# HEARTBEAT_TIMEOUT: How long to wait before declaring a peer dead
+# HEARTBEAT_TIMEOUT: Longest we ever wait before declaring a peer dead
+# HEARTBEAT_RPC_TIMEOUT: Deadline for a single heartbeat ping
 # PLOCK: Allows different objects to use the same lock
-HEARTBEAT_INTERVAL = 2              
+HEARTBEAT_INTERVAL = 0.2              
 HEARTBEAT_TIMEOUT  = 10            
+HEARTBEAT_RPC_TIMEOUT = 0.2
 PLOCK = multiprocessing.Lock()      
+
+# ELECTION_TIMEOUT_MIN/MAX: A follower that hears nothing from the leader for a random time in this range
+#                           starts an election (must stay above HEARTBEAT_INTERVAL + HEARTBEAT_RPC_TIMEOUT)
+ELECTION_TIMEOUT_MIN = 0.5
+ELECTION_TIMEOUT_MAX = 1.0
+
+# LEADER_LEASE_DURATION: How long after a heartbeat round acked by a majority the leader may serve reads locally
+#                        (must stay below ELECTION_TIMEOUT_MIN, with room for clock drift)
+LEADER_LEASE_DURATION = 0.4
+
+# READ_FROM_REPLICAS: Whether clients spread ListAccounts/GetPassword across all servers instead of only the leader
+# READ_MAX_STALENESS: A replica only answers such reads if it has applied what the leader had committed this many seconds ago
+# READ_REPLICA_TIMEOUT: Deadline for a read sent to a replica before falling back to the leader
+# READ_STALE_FALLBACK: Whether a read that no leader can answer (e.g. while a majority of servers is down, so none
+#                      can be elected) is sent to any server that has applied what the client saw, with no staleness bound
+READ_FROM_REPLICAS   = True
+READ_MAX_STALENESS   = 1.0
+READ_REPLICA_TIMEOUT = 1
+READ_STALE_FALLBACK  = True
+
+# WATCH_LEADER: Whether clients subscribe to leader changes (WatchLeader) and switch to a new leader as soon as it is pushed
+# LEADER_DISCOVERY_TIMEOUT: How long a client keeps asking its cached servers for the leader (e.g. during an election)
+#                           before scanning every possible address
+# LEADER_DISCOVERY_RPC_TIMEOUT: Deadline for a single GetLeader call while looking for the leader
+WATCH_LEADER                 = True
+LEADER_DISCOVERY_TIMEOUT     = 3
+LEADER_DISCOVERY_RPC_TIMEOUT = 0.5
+
+# CLIENT_CALL_DEADLINE: Total time (s) a client call may take, including retries and finding a new leader
+# CLIENT_RETRY_BASE: Backoff (s) before the first retry; doubled for each later one, with full jitter
+# CLIENT_RETRY_MAX_BACKOFF: Longest backoff (s) between two retries
+CLIENT_CALL_DEADLINE     = 10
+CLIENT_RETRY_BASE        = 0.05
+CLIENT_RETRY_MAX_BACKOFF = 1
+
+# DEDUP_CACHE_SIZE: Number of recent write responses each server keeps by request_id (least recently used dropped first)
+# DEDUP_TTL: Seconds a response is kept; must stay well above CLIENT_CALL_DEADLINE so every retry finds it
+DEDUP_CACHE_SIZE = 10000
+DEDUP_TTL        = 300
+
+# PAGE_SIZE: Messages or drafts per page when the client does not ask for a size (Login, ListMessages, ListDrafts)
+# MAX_PAGE_SIZE: Largest page a server returns, whatever the client asks for
+PAGE_SIZE     = 50
+MAX_PAGE_SIZE = 500
+
+# MAILBOX_CHUNK_ROWS: Messages or drafts per chunk when streaming a whole mailbox (SyncMailbox)
+MAILBOX_CHUNK_ROWS = 100
+
+# TOMBSTONE_RETENTION: Number of writes for which deleted messages and drafts are remembered for SyncSince;
+#                      a client whose watermark is older reloads its whole mailbox
+TOMBSTONE_RETENTION = 100000
+
+# SQLITE_BUSY_TIMEOUT: Seconds a connection waits for another one's write lock before giving up
+# SQLITE_SYNCHRONOUS: "FULL" syncs on every commit, so an acked write survives a power cut (writes share commits, see WRITE_BATCH_SIZE);
+#                     "NORMAL" only syncs the WAL at checkpoints (a power cut may lose the last writes, which replicas still hold)
+# SQLITE_CACHE_KB: Page cache per connection, in KiB
+# SQLITE_POOL_SIZE: Idle connections a server keeps for its transactions; more are opened while needed, then closed
+SQLITE_BUSY_TIMEOUT = 5
+SQLITE_SYNCHRONOUS  = "FULL"
+SQLITE_CACHE_KB     = 2048
+SQLITE_POOL_SIZE    = 16
+
+# WRITE_BATCH_SIZE: Max number of client writes the writer thread commits in one transaction (group commit)
+WRITE_BATCH_SIZE = 500
+
+# FAILURE_DETECTOR: "phi" (phi-accrual, adapts to observed heartbeat timing) or "timeout" (fixed HEARTBEAT_TIMEOUT)
+# PHI_THRESHOLD: Suspicion level at which a peer is declared dead (8 = 1 in 10^8 chance the heartbeat is just late)
+# PHI_WINDOW: Number of recent heartbeat intervals remembered per peer
+# PHI_MIN_STD: Lower bound (s) on the interval deviation, so a very regular LAN does not make detection hair-trigger
+# PHI_ACCEPTABLE_PAUSE: Extra delay (s) tolerated before suspicion rises, e.g. GC or CPU pauses under load
+FAILURE_DETECTOR     = "phi"
+PHI_THRESHOLD        = 8
+PHI_WINDOW           = 100
+PHI_MIN_STD          = 0.05
+PHI_ACCEPTABLE_PAUSE = 0.1
+
+# REPLICATION_QUORUM: Number of replica acks the leader waits for before answering a write (capped at the number of
+#                     alive replicas). A write only succeeds once a majority of all members holds it, however low this is set;
+#                     otherwise it fails with UNAVAILABLE and the client retries
+# REPLICATION_TIMEOUT: Deadline in seconds for a single replication RPC
+REPLICATION_QUORUM  = 2
+REPLICATION_TIMEOUT = 2
+
+
+# REPLICATION_BATCH_SIZE: Max number of writes coalesced into one ReplicateBatch RPC
+# REPLICATION_BATCH_WINDOW: Seconds the leader waits for more writes before flushing a batch
+REPLICATION_BATCH_SIZE   = 100
+REPLICATION_BATCH_WINDOW = 0.005
+
+# REPLICATION_LOG_MAX: Number of recent writes kept in the replication log for replica catch-up
+REPLICATION_LOG_MAX = 100000
+
+# SNAPSHOT_MODE: How a new server pulls a full copy from the leader
+#                "rows": stream table rows (StreamSnapshot), "file": stream the SQLite file (StreamSnapshotFile)
+# SNAPSHOT_CHUNK_ROWS: Rows per chunk when streaming table rows
+# SNAPSHOT_CHUNK_BYTES: Bytes per chunk when streaming the database file
+SNAPSHOT_MODE        = "rows"
+SNAPSHOT_CHUNK_ROWS  = 1000
+SNAPSHOT_CHUNK_BYTES = 1024 * 1024
\ No newline at end of file
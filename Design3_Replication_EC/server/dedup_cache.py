@@ -0,0 +1,70 @@
+# dedup_cache.py
+
+
+
+# +++++++++++++++ Imports/Installs +++++++++++++++ #
+import threading
+import time
+from collections import OrderedDict
+
+
+
+# ++++++++++ Class Definitions: Dedup Cache ++++++++++ #
+class DedupCache:
+    """
+    Responses to recent writes, keyed by the client's request_id.
+    Bounded to `max_size` entries (least recently used evicted first), each kept for `ttl` seconds.
+    A retried write gets the response recorded the first time instead of being applied again;
+    a retry that arrives while the first attempt is still running waits for it.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()    # request_id -> (expiry, response)
+        self.pending = {}               # request_id -> Event set once the running attempt finished
+        self.lock = threading.Lock()
+
+    def begin(self, request_id, timestamp=None):
+        """
+        Claim a request id before running its write.
+        Return: the recorded response if the write already ran, or None if the caller should run it
+        """
+        while True:
+            with self.lock:
+                response = self.lookup(request_id, time.time() if timestamp is None else timestamp)
+                if response is not None:
+                    return response
+                running = self.pending.get(request_id)
+                if running is None:
+                    self.pending[request_id] = threading.Event()
+                    return None
+            running.wait()
+
+    def finish(self, request_id, response, timestamp=None):
+        """
+        Record the response of a write (None if it failed without one), and wake up retries waiting for it.
+        """
+        with self.lock:
+            if response is not None:
+                self.entries[request_id] = ((time.time() if timestamp is None else timestamp) + self.ttl, response)
+                self.entries.move_to_end(request_id)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+            running = self.pending.pop(request_id, None)
+        if running is not None:
+            running.set()
+
+    def lookup(self, request_id, timestamp):
+        """
+        Must be called with the lock held.
+        Return: recorded response for the request id, or None if unknown or expired
+        """
+        entry = self.entries.get(request_id)
+        if entry is None:
+            return None
+        expiry, response = entry
+        if expiry <= timestamp:
+            del self.entries[request_id]
+            return None
+        self.entries.move_to_end(request_id)
+        return response
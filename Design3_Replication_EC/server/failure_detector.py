@@ -0,0 +1,122 @@
+# failure_detector.py
+
+
+
+# +++++++++++++++ Imports/Installs +++++++++++++++ #
+import math
+import threading
+from collections import deque
+
+
+
+# ++++++++++ Class Definitions: Failure Detectors ++++++++++ #
+class FixedTimeoutDetector:
+    """
+    A peer is dead once it has not answered a heartbeat for `timeout` seconds.
+    Suspicion is the fraction of the timeout that has elapsed.
+    """
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.last_heartbeat = {}
+        self.lock = threading.Lock()
+
+    def heartbeat(self, pid, timestamp):
+        """Record a heartbeat from a peer."""
+        with self.lock:
+            self.last_heartbeat[pid] = timestamp
+
+    def suspicion(self, pid, timestamp):
+        """Return how suspicious we are of a peer (>= 1 means dead); 0 if never heard from."""
+        with self.lock:
+            if pid not in self.last_heartbeat:
+                return 0.0
+            return (timestamp - self.last_heartbeat[pid]) / self.timeout
+
+    def is_available(self, pid, timestamp):
+        """Return whether the peer should still be considered alive."""
+        return self.suspicion(pid, timestamp) < 1.0
+
+    def is_suspect(self, pid, timestamp):
+        """Return whether a peer we have heard from should now be considered dead."""
+        return not self.is_available(pid, timestamp)
+
+    def remove(self, pid):
+        """Forget a peer's history."""
+        with self.lock:
+            self.last_heartbeat.pop(pid, None)
+
+
+class PhiAccrualDetector:
+    """
+    Phi-accrual failure detector (Hayashibara et al.).
+    Keeps a window of heartbeat inter-arrival times per peer and reports phi, the
+    -log10 probability that a heartbeat this late would still arrive. A peer is
+    dead once phi reaches `threshold`, so detection adapts to the observed timing.
+    """
+    def __init__(self, threshold, window, min_std, acceptable_pause, first_interval):
+        self.threshold = threshold
+        self.window = window
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.first_interval = first_interval
+        self.last_heartbeat = {}
+        self.intervals = {}
+        self.lock = threading.Lock()
+
+    def heartbeat(self, pid, timestamp):
+        """Record a heartbeat from a peer."""
+        with self.lock:
+            if pid not in self.last_heartbeat:
+                # Seed the history with the expected interval so the first gap is judged sensibly
+                std = self.first_interval / 4
+                self.intervals[pid] = deque([self.first_interval - std, self.first_interval + std], maxlen=self.window)
+            else:
+                self.intervals[pid].append(timestamp - self.last_heartbeat[pid])
+            self.last_heartbeat[pid] = timestamp
+
+    def suspicion(self, pid, timestamp):
+        """Return phi for a peer; 0 if never heard from."""
+        with self.lock:
+            if pid not in self.last_heartbeat:
+                return 0.0
+            intervals = self.intervals[pid]
+            mean = sum(intervals) / len(intervals)
+            variance = sum((i - mean) ** 2 for i in intervals) / len(intervals)
+            std = max(math.sqrt(variance), self.min_std)
+            elapsed = timestamp - self.last_heartbeat[pid]
+        return self.phi(elapsed, mean + self.acceptable_pause, std)
+
+    def is_available(self, pid, timestamp):
+        """Return whether the peer should still be considered alive."""
+        return self.suspicion(pid, timestamp) < self.threshold
+
+    def is_suspect(self, pid, timestamp):
+        """Return whether a peer we have heard from should now be considered dead."""
+        return not self.is_available(pid, timestamp)
+
+    def remove(self, pid):
+        """Forget a peer's history."""
+        with self.lock:
+            self.last_heartbeat.pop(pid, None)
+            self.intervals.pop(pid, None)
+
+    @staticmethod
+    def phi(elapsed, mean, std):
+        """-log10 of the chance a heartbeat arrives after `elapsed`, using a logistic approximation of the normal CDF."""
+        y = (elapsed - mean) / std
+        z = y * (1.5976 + 0.070566 * y * y)
+        # phi = log10(1 + e^z), written so that large |z| neither overflows nor underflows
+        return (max(z, 0.0) + math.log1p(math.exp(-abs(z)))) / math.log(10)
+
+
+# ++++++++++ Helper Functions: Failure Detectors ++++++++++ #
+def create_failure_detector(config):
+    """Build the failure detector selected by config.FAILURE_DETECTOR."""
+    if config.FAILURE_DETECTOR == "phi":
+        return PhiAccrualDetector(
+            threshold=config.PHI_THRESHOLD,
+            window=config.PHI_WINDOW,
+            min_std=config.PHI_MIN_STD,
+            acceptable_pause=config.PHI_ACCEPTABLE_PAUSE,
+            first_interval=config.HEARTBEAT_INTERVAL)
+    return FixedTimeoutDetector(config.HEARTBEAT_TIMEOUT)
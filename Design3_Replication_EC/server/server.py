@@ -8,22 +8,79 @@ import sys
 import json
 import grpc
 import time
+import random
 import sqlite3
 import logging
 import queue
 import threading
+import asyncio
 import argparse
+import contextlib
+import functools
+import collections
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 config_file = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config", "config.py"))
 database_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
 from concurrent import futures
 from comm import chat_pb2
 from comm import chat_pb2_grpc
 from config import config
+from failure_detector import create_failure_detector
+from dedup_cache import DedupCache
+from stream_budget import StreamBudgetInterceptor
 
 
 
 # ++++++++++++++  Class Definition  ++++++++++++++ #
+class LogConflict(Exception):
+    """
+    Raised when a replica's log disagrees with the leader's about the term of an entry.
+    """
+    pass
+
+
+class NotLeader(Exception):
+    """
+    Raised inside a client write when this server stopped being the leader after accepting it; the write is rolled back.
+    """
+    pass
+
+
+def deduplicated(handler):
+    """
+    Wrap a write handler so that a retry (same request_id) is answered with the first response, not applied twice.
+    Replicas record the ids of the writes they apply, so a retry still finds them on a new leader.
+    Either way, a client only gets the response once its write is held by a majority of the members.
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, context):
+        request_id = request.request_id
+        if getattr(self.tx_state, "replicating", False):
+            # The leader already decided to apply this entry; just remember it (with its log position)
+            response = handler(self, request, context)
+            if request_id and response.success:   # a failed entry is rolled back (see Replicate)
+                response.seq = self.tx_state.replicated_seq
+                self.dedup_cache.finish(request_id, response)
+            return response
+        if not request_id:
+            response = handler(self, request, context)
+            self.check_replicated(response, context)
+            return response
+        response = self.dedup_cache.begin(request_id)
+        if response is not None:
+            print(f"[SERVER {self.pid}] Request {request_id} was already applied; returning its response.")
+        else:
+            try:
+                response = handler(self, request, context)
+            finally:
+                self.dedup_cache.finish(request_id, response)
+        # Cached even if it is not on a majority yet, so a retry waits for that instead of applying the write again
+        self.check_replicated(response, context)
+        return response
+    return wrapper
+
+
 class ChatService(chat_pb2_grpc.ChatServiceServicer):
     def __init__(self, pid, host):
         """
@@ -33,6 +90,35 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         self.active_users = {}                  # Dictionary to store active user streams
         self.message_queues = {}                # Store queues for active users
         self.lock = threading.Lock()            # Lock for receive message threads
+        self.peer_channels = {}                 # Pool of long-lived channels/stubs: addr -> (channel, stub)
+        self.peer_executors = {}                # One ordered replication worker per peer: addr -> executor
+        self.peer_lock = threading.Lock()       # Lock for the peer channel pool
+        self.registry = {}                      # In-memory peer registry: pid -> {"addr", "last_seen", "state"}
+        self.departed = {}                      # Peers dropped as dead, still pinged in case they return: pid -> addr
+        self.members = {}                       # Every server that ever joined the cluster: pid -> addr (never shrinks, so quorums are fixed)
+        self.registry_lock = threading.Lock()   # Lock for the in-memory registry
+        self.failure_detector = create_failure_detector(config)   # Decides when a peer is dead
+        self.dedup_cache = DedupCache(config.DEDUP_CACHE_SIZE, config.DEDUP_TTL)   # Responses to recent writes, by request_id
+        self.tx_state = threading.local()       # Per-thread transaction nesting depth
+        self.db_local = threading.local()       # Connection of the transaction this thread has open
+        self.db_pool = queue.LifoQueue()        # Idle database connections, shared by all threads (most recently used first)
+        self.write_lock = threading.Lock()      # One write transaction at a time (SQLite has a single writer); reads do not wait
+        self.write_buffer = []                  # Pending (write, future) client writes for the writer thread's next commit
+        self.write_cond = threading.Condition()
+        self.replication_buffer = []            # Pending (entry, future) writes for the next batch
+        self.commit_seq = 0                     # Leader only: the log up to here is held by a majority of the members
+        self.replication_cond = threading.Condition()
+        self.raft_lock = threading.RLock()      # Guards term, vote and who the leader is
+        self.election_timer = time.time()       # Reset by leader contact, granted votes and our own elections
+        self.resyncing = False                  # True while a diverged replica reloads a full copy
+        self.lease_expiry = 0.0                 # Leader only: reads are served locally until this time
+        self.lease_cond = threading.Condition()
+        self.synced_at = 0.0                    # Replica only: newest time at which the leader's committed log was one we have applied
+        self.leader_positions = collections.deque(maxlen=int(config.HEARTBEAT_TIMEOUT / config.HEARTBEAT_INTERVAL))   # Replica only: (commit_seq, time) from leader heartbeats we have not applied yet
+        self.leader_commit_seq = 0              # Replica only: newest commit_seq heard from a leader; reads report no further
+        self.sync_lock = threading.Lock()       # Guards synced_at, leader_positions and leader_commit_seq
+        self.membership_version = 0             # Bumped when the leader or the registry changes, to wake WatchLeader streams
+        self.membership_cond = threading.Condition()
 
         # ++++ Determine Personal Address ++++ #
         self.pid = pid
@@ -40,31 +126,194 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         self.addr = str(host) + ":" + str(self.port)
 
         # ++++++++ Determine Leader ++++++++ #
-        self.IS_LEADER = (self.pid == 0)
-        self.leader = 0 if self.pid == 0 else self.find_leader()[1]
-        self.leader_addr = f"{host}:{config.BASE_PORT+pid}" if self.pid == 0 else self.find_leader()[0]
-        print("LEADER", self.leader_addr)
+        # Every server starts as a follower that knows no leader; join_cluster finds it (or an election makes one)
+        self.IS_LEADER = False
+        self.leader = -1
+        self.leader_addr = ""
         print(f"[SERVER {self.pid}] Running on port {self.port}")
-        print(f"[SERVER {self.pid}] Identifies leader {self.leader}")
 
         # ++++++++ Create Database ++++++++ #
             # Initialization: make new accounts, msgs, draft DBs if they do not already exist
             # Delete any old registry of databases, and insert leader's registry into theirs
         os.makedirs(database_folder, exist_ok=True)  
         self.db_name = os.path.join(database_folder, f"chat_database_{self.pid}.db")
-        self.db_connection = sqlite3.connect(self.db_name, check_same_thread=False)
         self.initialize_database()
-        if not self.IS_LEADER:
-            self.notify_leader_new_database()
+        self.current_term, self.voted_for = self.load_election_state()
+        self.join_cluster()
+        print(f"[SERVER {self.pid}] Identifies leader {self.leader}")
+        self.election_timer = time.time()
         self.print_SQL()
 
 
     # ++++++++++++++  Functions: Database Syncs  ++++++++++++++ #
+    @contextlib.contextmanager
+    def transaction(self, write=True):
+        """
+        Open a database transaction that commits on success and rolls back on error.
+        Nested calls on the same thread join the outer transaction instead of committing,
+        so a replicated batch of writes (and its log entries) is applied in one commit.
+        A read transaction (write=False) sees one snapshot of the database and runs alongside writes;
+        write transactions take the write lock up front, so they never have to upgrade and retry.
+        """
+        depth = getattr(self.tx_state, "depth", 0)
+        if depth > 0 and write and not self.tx_state.write:
+            raise RuntimeError("Cannot write inside a read transaction")
+        self.tx_state.depth = depth + 1
+        try:
+            if depth > 0:
+                yield self.db_connection
+                return
+            self.tx_state.write = write
+            connection = self.db_local.connection = self.checkout_connection()
+            try:
+                with self.write_lock if write else contextlib.nullcontext():
+                    connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                    try:
+                        yield connection
+                    except BaseException:
+                        connection.rollback()
+                        raise
+                    connection.commit()
+            finally:
+                self.db_local.connection = None
+                self.return_connection(connection)
+        finally:
+            self.tx_state.depth = depth
+
+    @property
+    def db_connection(self):
+        """
+        The connection of the transaction this thread has open (see transaction).
+        """
+        connection = getattr(self.db_local, "connection", None)
+        if connection is None:
+            raise RuntimeError("No transaction open on this thread")
+        return connection
+
+    def checkout_connection(self):
+        """
+        Return: an idle connection from the pool, or a new one if none is idle
+        """
+        try:
+            return self.db_pool.get_nowait()
+        except queue.Empty:
+            return self.connect_database()
+
+    def return_connection(self, connection):
+        """
+        Put a connection back in the pool once its transaction ended, or close it if SQLITE_POOL_SIZE are already idle.
+        Nobody waits for a connection, so a server has at most one per transaction running at once, plus the idle ones.
+        """
+        if connection.in_transaction:
+            connection.rollback()   # its commit failed
+        if self.db_pool.qsize() < config.SQLITE_POOL_SIZE:
+            self.db_pool.put(connection)
+        else:
+            connection.close()
+
+    def run_write(self, write):
+        """
+        Hand a client write to the writer thread, which commits it together with whatever other writes are queued.
+        A replica applying the leader's log is already inside a transaction, so the write runs there instead.
+        Return: what write() returned, once it is committed
+        """
+        if getattr(self.tx_state, "depth", 0) > 0 or getattr(self.tx_state, "replicating", False):
+            with self.transaction():
+                return write()
+        done = futures.Future()
+        with self.write_cond:
+            self.write_buffer.append((write, done))
+            self.write_cond.notify()
+        return done.result()
+
+    def write_loop(self):
+        """
+        The single writer (group commit): apply up to WRITE_BATCH_SIZE queued writes in one transaction,
+        so a burst of writes pays for one commit instead of one each. While a batch commits, the next one queues up.
+        Each write runs under a savepoint, so one that fails is undone without failing the rest of its batch.
+        """
+        while True:
+            with self.write_cond:
+                while not self.write_buffer:
+                    self.write_cond.wait()
+                pending = self.write_buffer[:config.WRITE_BATCH_SIZE]
+                self.write_buffer = self.write_buffer[config.WRITE_BATCH_SIZE:]
+
+            results = []
+            try:
+                with self.transaction() as connection:
+                    for write, done in pending:
+                        connection.execute("SAVEPOINT write")
+                        try:
+                            results.append((done, write(), None))
+                        except Exception as e:
+                            connection.execute("ROLLBACK TO write")
+                            results.append((done, None, e))
+                        connection.execute("RELEASE write")
+            except Exception as e:
+                # The commit itself failed, so nothing in the batch was applied
+                print(f"[SERVER {self.pid}] Write batch of {len(pending)} failed: {e}")
+                for _, done in pending:
+                    done.set_exception(e)
+                continue
+            for done, result, error in results:
+                if error is None:
+                    done.set_result(result)
+                else:
+                    done.set_exception(error)
+
+    def accepts_writes(self):
+        """
+        Return: whether this server may apply a write now (it is the leader, or is applying a replicated one)
+        """
+        return self.IS_LEADER or getattr(self.tx_state, "replicating", False)
+
+    def check_accepts_writes(self, context):
+        """
+        Reject a client write unless we may apply it.
+        """
+        if not self.accepts_writes():
+            self.reject_write(context)
+
+    def reject_write(self, context):
+        """
+        Refuse a client write, telling the client which server we think leads.
+        The client retries there; nothing was applied, so the retry is safe.
+        """
+        context.set_trailing_metadata((("leader-address", self.leader_addr or ""),))
+        context.abort(grpc.StatusCode.FAILED_PRECONDITION, "Not the leader")
+
+    def log_write(self, method_name, request):
+        """
+        Called by a client write inside its transaction to record it in the replication log.
+        The write was accepted on the RPC thread but runs later on the writer thread: if we stopped being
+        the leader in between, raise NotLeader, so it is rolled back rather than applied without a log entry.
+        A replica applying the leader's log records the entry itself.
+        Return: ReplicationRequest entry, or None on a replica
+        """
+        if getattr(self.tx_state, "replicating", False):
+            return None
+        # Read the term first: observe_term clears IS_LEADER before it moves to a newer term
+        term = self.current_term
+        if not self.IS_LEADER:
+            raise NotLeader()
+        return self.append_to_log(method_name, request, term)
+
+    def connect_database(self):
+        """
+        Open a connection to this server's database. Transactions are started explicitly (see transaction).
+        """
+        connection = sqlite3.connect(self.db_name, timeout=config.SQLITE_BUSY_TIMEOUT, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")   # readers do not block writers, nor writers readers
+        connection.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        connection.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+        return connection
+
     def print_SQL(self):
         """
         Print all data in the registry table.
         """
-        with self.db_connection:
+        with self.transaction(write=False):
             cursor = self.db_connection.cursor()
             cursor.execute("SELECT pid, timestamp, addr FROM registry")
             rows = cursor.fetchall()  # Fetch all rows from the table
@@ -80,14 +329,15 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         Creates necessary tables if they do not exist.
         """
-        with self.db_connection:
+        with self.transaction():
             cursor = self.db_connection.cursor()
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS accounts (
                 uuid INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT NOT NULL,
                 pwd TEXT NOT NULL,
-                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1))
+                logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1)),
+                inbox_count INTEGER NOT NULL DEFAULT 0
             )
             ''')
 
@@ -98,7 +348,8 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 sender TEXT NOT NULL,
                 msg TEXT NOT NULL,
                 checked INTEGER NOT NULL CHECK (checked IN (0, 1)),
-                inbox INTEGER NOT NULL CHECK (inbox IN (0, 1))
+                inbox INTEGER NOT NULL CHECK (inbox IN (0, 1)),
+                changed_seq INTEGER NOT NULL DEFAULT 0
             )
             ''')
 
@@ -108,7 +359,18 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                 username TEXT NOT NULL,
                 recipient TEXT NOT NULL,
                 msg TEXT NOT NULL,
-                checked INTEGER NOT NULL CHECK (checked IN (0, 1))
+                checked INTEGER NOT NULL CHECK (checked IN (0, 1)),
+                changed_seq INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+
+            # Deleted messages and drafts, kept for a while so SyncSince can tell clients about them
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tombstones (
+                username TEXT NOT NULL,
+                kind TEXT NOT NULL CHECK (kind IN ('message', 'draft')),
+                item_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL
             )
             ''')
 
@@ -120,71 +382,160 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             )
             ''')
 
-            # Clear only the registry table
-            # Insert leader into DB
-            cursor.execute("DELETE FROM registry")
-            cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", (self.leader, time.time(), self.leader_addr))
+            # Every server that ever joined; majorities (votes, leases, write acks) are counted against all of them
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS members (
+                pid INTEGER PRIMARY KEY,
+                addr TEXT NOT NULL
+            )
+            ''')
+
+            # Replication log: every write the leader applied, in sequence order, with the term it was logged in
+            # Replication state: last sequence number (and its term) applied by this server,
+            # plus the election term and vote, which must survive restarts
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS replication_log (
+                seq INTEGER PRIMARY KEY,
+                term INTEGER NOT NULL DEFAULT 0,
+                method TEXT NOT NULL,
+                payload BLOB NOT NULL
+            )
+            ''')
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS replication_state (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                last_seq INTEGER NOT NULL,
+                last_term INTEGER NOT NULL DEFAULT 0,
+                term INTEGER NOT NULL DEFAULT 0,
+                voted_for INTEGER,
+                tombstone_horizon INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            # Databases created before leader terms existed lack the term columns
+            self.add_missing_columns(cursor, "replication_log", {"term": "INTEGER NOT NULL DEFAULT 0"})
+            self.add_missing_columns(cursor, "replication_state", {
+                "last_term": "INTEGER NOT NULL DEFAULT 0",
+                "term": "INTEGER NOT NULL DEFAULT 0",
+                "voted_for": "INTEGER",
+                "tombstone_horizon": "INTEGER NOT NULL DEFAULT 0"})
+            cursor.execute("INSERT OR IGNORE INTO replication_state (id, last_seq) VALUES (0, 0)")
+            # Databases created before inbox counters existed start from their current inbox sizes
+            if "inbox_count" in self.add_missing_columns(cursor, "accounts", {"inbox_count": "INTEGER NOT NULL DEFAULT 0"}):
+                self.recount_inboxes(cursor)
+            # Databases created before change tracking existed cannot tell what changed before now
+            added = self.add_missing_columns(cursor, "messages", {"changed_seq": "INTEGER NOT NULL DEFAULT 0"})
+            added += self.add_missing_columns(cursor, "drafts", {"changed_seq": "INTEGER NOT NULL DEFAULT 0"})
+            if added:
+                cursor.execute("UPDATE replication_state SET tombstone_horizon = last_seq")
+            self.create_indexes(cursor)
+
+            # Reset the registry to just ourselves until we join the leader; the membership is kept
+            cursor.execute("SELECT pid, addr FROM members")
+            self.members = dict(cursor.fetchall())
+            self.members_add([(self.pid, self.addr)])
+            self.registry_replace([(self.pid, time.time(), self.addr)])
+
+    def create_indexes(self, cursor):
+        """
+        Index the columns the per-user queries filter on, so they do not scan whole tables.
+        Usernames become UNIQUE, unless a database from before that already holds duplicates: those are reported and
+        left for the operator to merge, with a plain index on the column meanwhile. No account is deleted here.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_accounts_username'")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT username FROM accounts GROUP BY username HAVING COUNT(*) > 1 ORDER BY username")
+            duplicates = [row[0] for row in cursor.fetchall()]
+            if duplicates:
+                print(f"[SERVER {self.pid}] Usernames held by more than one account, not indexed as UNIQUE: {', '.join(duplicates)}")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_accounts_username_nonunique ON accounts (username)")
+            else:
+                cursor.execute("CREATE UNIQUE INDEX idx_accounts_username ON accounts (username)")
+                cursor.execute("DROP INDEX IF EXISTS idx_accounts_username_nonunique")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_username_inbox ON messages (username, inbox)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_drafts_username ON drafts (username)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_username_changed ON messages (username, changed_seq)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_drafts_username_changed ON drafts (username, changed_seq)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_username_seq ON tombstones (username, seq)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON tombstones (seq)")
+
+    def add_missing_columns(self, cursor, table, columns):
+        """
+        Add the columns (name -> SQL definition) that an existing table does not have yet.
+        Return: names of the columns that were added
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = [name for name in columns if name not in existing]
+        for name in added:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+        return added
+
+    def recount_inboxes(self, cursor):
+        """
+        Set every account's inbox_count from its messages; writes keep it up to date afterwards.
+        The counter lives only in SQLite, with no copy in memory: the write updating it can still be rolled back
+        (its savepoint, a replica's batch, a snapshot swapped in), and reading one indexed row costs as little.
+        """
+        cursor.execute("""
+            UPDATE accounts SET inbox_count = (
+                SELECT COUNT(*) FROM messages WHERE messages.username = accounts.username AND messages.inbox = 1)
+        """)
 
     def UpdateRegistry(self, request, context):
         """
         Called by the leader when notified of a new server.
         Leader tells all replicas to update their registries.
-        Return a full historical dump of the database (accounts, messages, drafts, registry).
+        If the new server's last applied seq is still covered by the replication log, return only the missing entries.
+        Otherwise, return just the registry; the new server then pulls a full copy with StreamSnapshot.
         """
         try:
-            with self.db_connection:
-                # Insert new server into database
-                cursor = self.db_connection.cursor()
-                print(f"[SERVER {self.pid}] Received request new server: PID={request.pid}, Timestamp={request.timestamp}, Addr={request.addr}")
-                cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", 
-                            (request.pid, time.time(), request.addr))
-                
-                # Get full state from leader's database:
-                cursor.execute("SELECT * FROM accounts")
-                accounts = cursor.fetchall()
-                cursor.execute("SELECT * FROM messages")
-                messages = cursor.fetchall()
-                cursor.execute("SELECT * FROM drafts")
-                drafts = cursor.fetchall()
-                cursor.execute("SELECT * FROM registry")
-                registry_rows = cursor.fetchall()
-                
-                # Prepare a full state dictionary and serialize.
-                full_state = {
-                    "accounts": accounts,
-                    "messages": messages,
-                    "drafts": drafts,
-                    "registry": registry_rows
-                }
-                sql_state = json.dumps(full_state)
-
-                # Replicate updated registry to all replicas
-                sql_registry = json.dumps([{"pid": row[0], "timestamp": row[1], "addr": row[2]} for row in registry_rows])
-                replica_request = chat_pb2.UpdateRegistryFullSQLRequest(
-                    success=True,
-                    sql_registry=sql_registry)
-                
-                # Send the updated registry to all replicas asynchronously
-                with self.db_connection:
-                    cursor = self.db_connection.cursor()
-                    cursor.execute("SELECT pid, addr FROM registry")
-                    for replica_id, addr in cursor.fetchall():
-                        # do NOT do the request.pid, they'll update themselves later
-                        if replica_id == self.leader or replica_id == request.pid:
-                            continue
-                        # For each addres, send them the update
-                        with grpc.insecure_channel(addr) as channel:
-                            stub = chat_pb2_grpc.ChatServiceStub(channel)
-                            response = stub.UpdateRegistryReplica(replica_request)
-                            if not response.success:
-                                print(f"[SERVER {self.pid}] Replication to replica {replica_id} failed: {response.message}")
-                
-                # Build the response message and send full state.
-                replica_response = chat_pb2.UpdateRegistryFullSQLRequest(
-                    success=True,
-                    sql_registry=sql_state)
-                
-                return replica_response
+            # Insert new server into the registry
+            print(f"[SERVER {self.pid}] Received request new server: PID={request.pid}, Timestamp={request.timestamp}, Addr={request.addr}, Last seq={request.last_seq}")
+            self.registry_add(request.pid, request.addr)
+            registry_rows = self.registry_rows()
+
+            members = self.members_rows()
+
+            # Replicate updated registry (and the membership) to all replicas
+            sql_registry = json.dumps({"registry": [{"pid": row[0], "timestamp": row[1], "addr": row[2]} for row in registry_rows],
+                                       "members": members})
+            replica_request = chat_pb2.UpdateRegistryFullSQLRequest(
+                success=True,
+                sql_registry=sql_registry)
+            
+            # Send the updated registry to all replicas
+            for replica_id, _, addr in registry_rows:
+                # do NOT do the request.pid, they'll update themselves later
+                if replica_id == self.leader or replica_id == request.pid:
+                    continue
+                # For each addres, send them the update
+                # A replica that is down (or still starting) must not fail the new server's join
+                try:
+                    stub = self.get_peer_stub(addr)
+                    response = stub.UpdateRegistryReplica(replica_request, timeout=config.REPLICATION_TIMEOUT)
+                    if not response.success:
+                        print(f"[SERVER {self.pid}] Replication to replica {replica_id} failed: {response.message}")
+                except grpc.RpcError:
+                    print(f"[SERVER {self.pid}] Could not send the registry to replica {replica_id}.")
+            self.refresh_peer_channels()
+
+            # Incremental catch-up: send only the log entries the new server is missing
+            if request.last_seq > 0:
+                missing = self.read_log_since(request.last_seq, request.last_term)
+                if missing is not None:
+                    print(f"[SERVER {self.pid}] Sending {len(missing.entries)} missing log entries to server {request.pid}")
+                    return chat_pb2.UpdateRegistryFullSQLRequest(
+                        success=True,
+                        sql_registry=json.dumps({"registry": registry_rows, "members": members}),
+                        incremental=True,
+                        log_entries=missing.entries)
+            
+            # Too far behind (or new): the new server pulls a full copy with StreamSnapshot
+            return chat_pb2.UpdateRegistryFullSQLRequest(
+                success=True,
+                sql_registry=json.dumps({"registry": registry_rows, "members": members}),
+                incremental=False)
         
         except Exception as e:
             print(f"Error in UpdateRegistry: {e}")
@@ -197,28 +548,33 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         print(f"[SERVER {self.pid}] Replicating registry from leader")
         try:
-            with self.db_connection: 
-                # Delete old registry and replace it with new data
-                # To replace data, deserialize JSON from the leader's response
-                cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM registry")  
-                registry_data = json.loads(request.sql_registry)
-                for entry in registry_data:
-                    cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", 
-                                (entry["pid"], entry["timestamp"], entry["addr"]))
-                self.db_connection.commit()
+            # Replace old registry with new data
+            # To replace data, deserialize JSON from the leader's response
+            registry_data = json.loads(request.sql_registry)
+            self.registry_replace([(entry["pid"], entry["timestamp"], entry["addr"]) for entry in registry_data["registry"]],
+                                  registry_data["members"])
+            self.refresh_peer_channels()
             return chat_pb2.GenericResponse(success=True, message="success")
         except Exception as e:
             print(f"Error in UpdateRegistryReplica: {e}")
             return chat_pb2.GenericResponse(success=False, message=f"UpdateRegistryReplica {e}")
 
-    def notify_leader_new_database(self):
+    def notify_leader_new_database(self, leader_addr=None, full_copy=False):
         """
         Notify the leader about the new database creation.
-        Receive a full historical dump from the leader and update local tables.
+        Receive the log entries we missed (or stream a full snapshot) from the leader and update local tables.
+        With full_copy, always reload a full snapshot (used when our log diverged from the leader's).
+        Return: success (T/F)
         """
         # Get the leader's address
-        leader_addr = self.find_leader()[0]
+        if leader_addr is None:
+            leader_addr = self.find_leader()[0]
+        if not leader_addr:
+            return False
+        with self.transaction(write=False):
+            last_seq, last_term = self.get_last_log_position(self.db_connection.cursor())
+        if full_copy:
+            last_seq, last_term = 0, 0
         
         # Send a message to the leader
         with grpc.insecure_channel(leader_addr) as channel:
@@ -227,44 +583,174 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             request = chat_pb2.UpdateRegistryRequest(
                 pid=self.pid,
                 timestamp=time.time(),
-                addr=self.addr)
+                addr=self.addr,
+                last_seq=last_seq,
+                last_term=last_term)
             
             # Send the request without waiting for a response
             try:
                 response = stub.UpdateRegistry(request)
                 if response.success:
-                    full_state = json.loads(response.sql_registry)
-                    with self.db_connection:
-                        cursor = self.db_connection.cursor()
-                        # Clear local tables.
-                        cursor.execute("DELETE FROM accounts")
-                        cursor.execute("DELETE FROM messages")
-                        cursor.execute("DELETE FROM drafts")
-                        cursor.execute("DELETE FROM registry")
-                        
-                        # Insert historical accounts, messages, drafts, registry.
-                        for row in full_state.get("accounts", []):
-                            cursor.execute("INSERT INTO accounts (uuid, username, pwd, logged_in) VALUES (?, ?, ?, ?)", row)
-                        for row in full_state.get("messages", []):
-                            cursor.execute("INSERT INTO messages (msg_id, username, sender, msg, checked, inbox) VALUES (?, ?, ?, ?, ?, ?)", row)
-                        for row in full_state.get("drafts", []):
-                            cursor.execute("INSERT INTO drafts (draft_id, username, recipient, msg, checked) VALUES (?, ?, ?, ?, ?)", row)
-                        for row in full_state.get("registry", []):
-                            cursor.execute("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", row)
-                        self.db_connection.commit()
-                    print(f"[SERVER {self.pid}] Full historical state replicated successfully from leader.")
+                    # A file snapshot replaces the whole database, so swap it in first
+                    use_file = not response.incremental and config.SNAPSHOT_MODE == "file"
+                    if use_file:
+                        self.load_snapshot_file(stub)
+                    registry_data = json.loads(response.sql_registry)
+                    with self.transaction():
+                        self.registry_replace(registry_data.get("registry", []), registry_data.get("members", []))
+                        if response.incremental:
+                            caught_up, last_seq = self.apply_log_entries(response.log_entries, None)
+                        elif not use_file:
+                            self.load_snapshot(stub)
+                    self.refresh_peer_channels()
+                    if response.incremental and not caught_up:
+                        # The leader's next batch finds us behind and resends from last_seq
+                        print(f"[SERVER {self.pid}] Caught up to seq {last_seq} only; an entry failed to apply.")
+                    elif response.incremental:
+                        print(f"[SERVER {self.pid}] Caught up on {len(response.log_entries)} log entries from leader.")
+                    else:
+                        print(f"[SERVER {self.pid}] Full historical state replicated successfully from leader.")
+                    return True
                 else:
                     print(f"[SERVER {self.pid}] Leader notified but response unsuccessful: {response.sql_registry}")
             except grpc.RpcError as e:
                 print(f"[SERVER {self.pid}] Error notifying leader: {e}")
+        return False
+
+    def StreamSnapshot(self, request, context):
+        """
+        Stream a consistent copy of accounts, messages and drafts to a new server.
+        Rows are read from a cursor in chunks of SNAPSHOT_CHUNK_ROWS, so memory stays bounded.
+        The final chunk carries the replication log seq the snapshot reflects and the tables' id counters.
+        """
+        print(f"[SERVER {self.pid}] Streaming snapshot to server {request.pid}")
+        # Use a separate connection so the read transaction sees one consistent snapshot
+        connection = sqlite3.connect(self.db_name)
+        try:
+            connection.execute("BEGIN")
+            cursor = connection.cursor()
+            last_seq, last_term = self.get_last_log_position(cursor)
+
+            cursor.execute("SELECT uuid, username, pwd, logged_in FROM accounts")
+            while rows := cursor.fetchmany(config.SNAPSHOT_CHUNK_ROWS):
+                yield chat_pb2.SnapshotChunk(accounts=[
+                    {"uuid": row[0], "username": row[1], "pwd": row[2], "logged_in": row[3]}
+                    for row in rows
+                ])
+
+            cursor.execute("SELECT msg_id, username, sender, msg, checked, inbox FROM messages")
+            while rows := cursor.fetchmany(config.SNAPSHOT_CHUNK_ROWS):
+                yield chat_pb2.SnapshotChunk(messages=[
+                    {"msg_id": row[0], "username": row[1], "sender": row[2],
+                    "msg": row[3], "checked": row[4], "inbox": row[5]}
+                    for row in rows
+                ])
+
+            cursor.execute("SELECT draft_id, username, recipient, msg, checked FROM drafts")
+            while rows := cursor.fetchmany(config.SNAPSHOT_CHUNK_ROWS):
+                yield chat_pb2.SnapshotChunk(drafts=[
+                    {"draft_id": row[0], "username": row[1], "recipient": row[2], "msg": row[3], "checked": row[4]}
+                    for row in rows
+                ])
+
+            # Ids of deleted rows are never reused, so the counters can be ahead of the rows we sent
+            cursor.execute("SELECT name, seq FROM sqlite_sequence")
+            yield chat_pb2.SnapshotChunk(done=True, last_seq=last_seq, last_term=last_term, sequences=dict(cursor.fetchall()))
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def load_snapshot(self, stub):
+        """
+        Replace local accounts, messages and drafts (and their id counters) with a snapshot streamed from the leader.
+        Each chunk is bulk-loaded with executemany; must be called inside a transaction.
+        """
+        cursor = self.db_connection.cursor()
+        # Clear local tables.
+        cursor.execute("DELETE FROM accounts")
+        cursor.execute("DELETE FROM messages")
+        cursor.execute("DELETE FROM drafts")
+        cursor.execute("DELETE FROM replication_log")
+
+        for chunk in stub.StreamSnapshot(chat_pb2.SnapshotRequest(pid=self.pid)):
+            if chunk.accounts:
+                cursor.executemany("INSERT INTO accounts (uuid, username, pwd, logged_in) VALUES (?, ?, ?, ?)",
+                                   [(a.uuid, a.username, a.pwd, a.logged_in) for a in chunk.accounts])
+            if chunk.messages:
+                cursor.executemany("INSERT INTO messages (msg_id, username, sender, msg, checked, inbox) VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(m.msg_id, m.username, m.sender, m.msg, m.checked, m.inbox) for m in chunk.messages])
+            if chunk.drafts:
+                cursor.executemany("INSERT INTO drafts (draft_id, username, recipient, msg, checked) VALUES (?, ?, ?, ?, ?)",
+                                   [(d.draft_id, d.username, d.recipient, d.msg, d.checked) for d in chunk.drafts])
+            if chunk.done:
+                cursor.execute("UPDATE replication_state SET last_seq = ?, last_term = ?", (chunk.last_seq, chunk.last_term))
+                # Take over the leader's counters, so we assign the same ids as it does if we become leader
+                cursor.execute("DELETE FROM sqlite_sequence")
+                cursor.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", chunk.sequences.items())
+        # Snapshots carry messages, not counters or tombstones: changes before the snapshot can no longer be listed
+        self.recount_inboxes(cursor)
+        cursor.execute("DELETE FROM tombstones")
+        cursor.execute("UPDATE replication_state SET tombstone_horizon = last_seq")
+
+
+    def StreamSnapshotFile(self, request, context):
+        """
+        Stream a consistent copy of the whole database file to a new server.
+        The copy is made with the SQLite backup API, then sent in chunks of SNAPSHOT_CHUNK_BYTES.
+        """
+        print(f"[SERVER {self.pid}] Streaming database file to server {request.pid}")
+        snapshot_name = os.path.join(database_folder, f"snapshot_{self.pid}_to_{request.pid}.db")
+        source = sqlite3.connect(self.db_name)
+        target = sqlite3.connect(snapshot_name)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        try:
+            with open(snapshot_name, "rb") as f:
+                while data := f.read(config.SNAPSHOT_CHUNK_BYTES):
+                    yield chat_pb2.SnapshotFileChunk(data=data)
+        finally:
+            os.remove(snapshot_name)
+
+    def load_snapshot_file(self, stub):
+        """
+        Download the leader's database file and atomically swap it in for ours.
+        """
+        download_name = self.db_name + ".download"
+        with open(download_name, "wb") as f:
+            for chunk in stub.StreamSnapshotFile(chat_pb2.SnapshotRequest(pid=self.pid)):
+                f.write(chunk.data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Other threads keep their connections open, so copy the new file into our database rather than replacing it
+        source = sqlite3.connect(download_name)
+        target = self.connect_database()
+        try:
+            with self.write_lock:
+                source.backup(target)
+        finally:
+            target.close()
+            source.close()
+            os.remove(download_name)
+        # The copied file carries the leader's term, vote and membership; keep our own
+        with self.raft_lock:
+            self.persist_election_state()
+        self.persist_members()
 
 
     # ++++++++++++++  Functions: Replication Sub-Functions  ++++++++++++++ #
+    @deduplicated
     def CreateAccount(self, request, context):
         """
         Creates account for new username.
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
         password_hash = request.password_hash
 
@@ -273,98 +759,81 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         else:
             self.active_users[username] = ""
         if username not in self.message_queues:
-            self.message_queues[username] = queue.Queue()
+            self.message_queues[username] = self.new_message_queue()
         
         try:
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
                 cursor.execute("SELECT 1 FROM accounts WHERE username = ?", (username,))
                 if cursor.fetchone() is not None:
-                    return chat_pb2.GenericResponse(success=False, message="Username already exists")
+                    return chat_pb2.GenericResponse(success=False, message="Username already exists"), None
                 cursor.execute("INSERT INTO accounts (username, pwd, logged_in) VALUES (?, ?, 1)", (username, password_hash))
                 response = chat_pb2.GenericResponse(success=True, message="Account created successfully")
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("CreateAccount", request)
+                return response, entry
+            response, entry = self.run_write(write)
             
             # if this server is leader, replicate the operation
-            if self.IS_LEADER:
-                self.replicate_to_replicas("CreateAccount", request)
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
             return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] CreateAccount Exception:, {e}")
             return chat_pb2.GenericResponse(success=False, message="Create account error")
     
+    @deduplicated
     def Login(self, request, context):
         """
         Marks username as logged in, fetches account information.
         Return: LoginResponse (success, message, inbox count, old messages, new messages, drafts)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
+        self.check_read_lease(context)
         username = request.username
         password_hash = request.password_hash
 
         self.active_users[username] = context
         if username not in self.message_queues:
-            self.message_queues[username] = queue.Queue()
+            self.message_queues[username] = self.new_message_queue()
         
         try:
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
-                cursor.execute("SELECT uuid FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
+                cursor.execute("SELECT uuid, inbox_count FROM accounts WHERE username = ? AND pwd = ?", (username, password_hash))
                 account = cursor.fetchone()
                 if account is not None:
                     cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
 
-                    # Populate data of username
-                    # Not newly received messages
-                    cursor.execute("""
-                        SELECT msg_id, username, sender, msg, checked, inbox
-                        FROM messages WHERE username = ? AND inbox = 0
-                        ORDER BY msg_id DESC
-                    """, (username,))
-                    old_messages = cursor.fetchall()
-
-                    old_message_list = [
-                        {"msg_id": row[0], "username": row[1], "sender": row[2],
-                        "msg": row[3], "checked": row[4], "inbox": row[5]}
-                        for row in old_messages
-                    ]
-
-                    # Newly received messages in inbox
-                    cursor.execute("""
-                        SELECT msg_id, username, sender, msg, checked, inbox
-                        FROM messages WHERE username = ? AND inbox = 1
-                        ORDER BY msg_id DESC
-                    """, (username,))
-                    new_messages = cursor.fetchall()
-
-                    new_message_list = [
-                        {"msg_id": row[0], "username": row[1], "sender": row[2],
-                        "msg": row[3], "checked": row[4], "inbox": row[5]}
-                        for row in new_messages
-                    ]
+                    # First page of old messages, inbox messages and drafts; the client pages through the rest
+                    page_size = self.page_size(request.page_size)
+                    old_messages, next_old_cursor = self.fetch_messages_page(cursor, username, 0, 0, page_size)
+                    inbox_messages, next_inbox_cursor = self.fetch_messages_page(cursor, username, 1, 0, page_size)
+                    drafts, next_draft_cursor = self.fetch_drafts_page(cursor, username, 0, page_size)
 
-                    # Saved drafts
-                    cursor.execute("""
-                        SELECT draft_id, username, recipient, msg, checked
-                        FROM drafts
-                        WHERE username = ?
-                        ORDER BY draft_id
-                    """, (username,))
-                    drafts = cursor.fetchall()
-
-                    draft_list = [
-                        {"draft_id": row[0], "username": row[1], "recipient": row[2], "msg": row[3], "checked": row[4]}
-                        for row in drafts
-                    ]
-                                     
-                    cursor.execute("UPDATE accounts SET logged_in = 1 WHERE username = ?", (username,))
-                    response = chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=len(new_message_list), old_messages=old_message_list, inbox_messages=new_message_list, drafts=draft_list)
-                    
-                    # if this server is leader, replicate the operation
-                    if self.IS_LEADER:
-                        self.replicate_to_replicas("Login", request)
-                    return response
+                    response = chat_pb2.LoginResponse(success=True, message="Login successful", inbox_count=account[1],
+                                                      old_messages=old_messages, inbox_messages=inbox_messages, drafts=drafts,
+                                                      next_old_cursor=next_old_cursor, next_inbox_cursor=next_inbox_cursor,
+                                                      next_draft_cursor=next_draft_cursor)
+                    # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                    entry = self.log_write("Login", request)
                 else:
                     print(f"[SERVER {self.pid}] Login Invalid Credentials!")
-                    return chat_pb2.LoginResponse(success=False, message="Invalid credentials")
+                    return chat_pb2.LoginResponse(success=False, message="Invalid credentials"), None
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] Login Exception: {e}")
             return chat_pb2.LoginResponse(success=False, message="Login error")
@@ -374,17 +843,19 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         Checks if user exists, and if so, returns password hash.
         Return: GetPasswordResponse (success, message, pwd_hash)
         """
+        self.check_read_freshness(request, context)
         username = request.username
 
         try:
-            with self.db_connection: # ensures commit or rollback
+            with self.transaction(write=False): # one consistent snapshot
                 cursor = self.db_connection.cursor()
+                seq = self.read_seq(cursor)
                 cursor.execute("SELECT pwd FROM accounts WHERE username = ?", (username,))
                 pwd_hash = cursor.fetchone()
                 if pwd_hash is None:
-                    return chat_pb2.GetPasswordResponse(success=False, message="User does not exist")
+                    return chat_pb2.GetPasswordResponse(success=False, message="User does not exist", seq=seq)
                 else:
-                    response = chat_pb2.GetPasswordResponse(success=True, message="Password found", password_hash=pwd_hash[0])
+                    response = chat_pb2.GetPasswordResponse(success=True, message="Password found", password_hash=pwd_hash[0], seq=seq)
                     return response
         except Exception as e:
             print(f"[SERVER {self.pid}] GetPassword Exception: {e}")
@@ -395,29 +866,216 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         Fetches all existing usernames.
         Return: list of account usernames
         """
+        self.check_read_freshness(request, context)
         try:
-            with self.db_connection: # ensures commit or rollback
+            with self.transaction(write=False): # one consistent snapshot
                 cursor = self.db_connection.cursor()
+                seq = self.read_seq(cursor)
                 cursor.execute("SELECT username FROM accounts ORDER BY uuid")
                 usernames = [row[0] for row in cursor.fetchall()]
-                response = chat_pb2.ListAccountsResponse(success=True, message="Accounts fetched", usernames=usernames)
+                response = chat_pb2.ListAccountsResponse(success=True, message="Accounts fetched", usernames=usernames, seq=seq)
                 return response
         except Exception as e:
             print(f"[SERVER {self.pid}] ListAccounts Exception: {e}")
             return chat_pb2.ListAccountsResponse(success=False, message="Could not fetch accounts")
+
+    def ListMessages(self, request, context):
+        """
+        Fetches one page of a user's inbox or old messages, newest first.
+        Return: ListMessagesResponse (success, message, messages, next cursor)
+        """
+        self.check_read_freshness(request, context)
+        try:
+            with self.transaction(write=False): # one consistent snapshot
+                cursor = self.db_connection.cursor()
+                seq = self.read_seq(cursor)
+                messages, next_cursor = self.fetch_messages_page(cursor, request.username, int(request.inbox),
+                                                                 request.cursor, self.page_size(request.page_size))
+                return chat_pb2.ListMessagesResponse(success=True, message="Messages fetched", messages=messages,
+                                                     next_cursor=next_cursor, seq=seq)
+        except Exception as e:
+            print(f"[SERVER {self.pid}] ListMessages Exception: {e}")
+            return chat_pb2.ListMessagesResponse(success=False, message="Could not fetch messages")
+
+    def ListDrafts(self, request, context):
+        """
+        Fetches one page of a user's drafts, oldest first.
+        Return: ListDraftsResponse (success, message, drafts, next cursor)
+        """
+        self.check_read_freshness(request, context)
+        try:
+            with self.transaction(write=False): # one consistent snapshot
+                cursor = self.db_connection.cursor()
+                seq = self.read_seq(cursor)
+                drafts, next_cursor = self.fetch_drafts_page(cursor, request.username, request.cursor,
+                                                             self.page_size(request.page_size))
+                return chat_pb2.ListDraftsResponse(success=True, message="Drafts fetched", drafts=drafts,
+                                                   next_cursor=next_cursor, seq=seq)
+        except Exception as e:
+            print(f"[SERVER {self.pid}] ListDrafts Exception: {e}")
+            return chat_pb2.ListDraftsResponse(success=False, message="Could not fetch drafts")
+
+    def SyncMailbox(self, request, context):
+        """
+        Streams a user's whole mailbox: inbox messages, then old messages (both newest first), then drafts.
+        Rows are read from a cursor in chunks of MAILBOX_CHUNK_ROWS, so memory stays bounded however large the mailbox is.
+        Return: stream of MailboxChunk (messages, drafts, seq)
+        """
+        self.check_read_freshness(request, context)
+        # Use a separate connection so the read transaction sees one consistent mailbox
+        connection = sqlite3.connect(self.db_name)
+        try:
+            connection.execute("BEGIN")
+            cursor = connection.cursor()
+            seq = self.read_seq(cursor)
+
+            for inbox in (1, 0):
+                cursor.execute("""
+                    SELECT msg_id, username, sender, msg, checked, inbox
+                    FROM messages WHERE username = ? AND inbox = ?
+                    ORDER BY msg_id DESC
+                """, (request.username, inbox))
+                while rows := cursor.fetchmany(config.MAILBOX_CHUNK_ROWS):
+                    yield chat_pb2.MailboxChunk(messages=[
+                        {"msg_id": row[0], "username": row[1], "sender": row[2],
+                        "msg": row[3], "checked": row[4], "inbox": row[5]}
+                        for row in rows
+                    ], seq=seq)
+
+            cursor.execute("SELECT draft_id, username, recipient, msg, checked FROM drafts WHERE username = ? ORDER BY draft_id",
+                           (request.username,))
+            while rows := cursor.fetchmany(config.MAILBOX_CHUNK_ROWS):
+                yield chat_pb2.MailboxChunk(drafts=[
+                    {"draft_id": row[0], "username": row[1], "recipient": row[2], "msg": row[3], "checked": row[4]}
+                    for row in rows
+                ], seq=seq)
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def SyncSince(self, request, context):
+        """
+        Fetches what changed in a user's mailbox after replication log seq `since_seq`: new or changed messages
+        and drafts, and the ids of deleted ones. Every server stamps a change with the same seq, so a client can
+        keep its watermark across a failover. If the tombstones it would need were dropped, or more than
+        MAX_PAGE_SIZE items changed, the client is told to reload the mailbox instead.
+        Return: SyncSinceResponse (changes, inbox count, full sync required, seq the changes go up to)
+        """
+        self.check_read_freshness(request, context)
+        username = request.username
+        since_seq = request.since_seq
+        limit = config.MAX_PAGE_SIZE
+
+        try:
+            with self.transaction(write=False): # one consistent snapshot
+                cursor = self.db_connection.cursor()
+                cursor.execute("SELECT tombstone_horizon FROM replication_state")
+                horizon = cursor.fetchone()[0]
+                seq = self.read_seq(cursor)
+                if since_seq < horizon:
+                    return chat_pb2.SyncSinceResponse(success=True, message="Changes no longer known", full_sync_required=True, seq=seq)
+
+                cursor.execute("""
+                    SELECT msg_id, username, sender, msg, checked, inbox
+                    FROM messages WHERE username = ? AND changed_seq > ?
+                    ORDER BY msg_id DESC LIMIT ?
+                """, (username, since_seq, limit + 1))
+                messages = cursor.fetchall()
+                cursor.execute("""
+                    SELECT draft_id, username, recipient, msg, checked
+                    FROM drafts WHERE username = ? AND changed_seq > ?
+                    ORDER BY draft_id LIMIT ?
+                """, (username, since_seq, limit + 1))
+                drafts = cursor.fetchall()
+                cursor.execute("SELECT kind, item_id FROM tombstones WHERE username = ? AND seq > ? LIMIT ?", (username, since_seq, limit + 1))
+                tombstones = cursor.fetchall()
+                if len(messages) + len(drafts) + len(tombstones) > limit:
+                    return chat_pb2.SyncSinceResponse(success=True, message="Too many changes", full_sync_required=True, seq=seq)
+
+                cursor.execute("SELECT inbox_count FROM accounts WHERE username = ?", (username,))
+                account = cursor.fetchone()
+                return chat_pb2.SyncSinceResponse(
+                    success=True, message="Changes fetched",
+                    messages=[
+                        {"msg_id": row[0], "username": row[1], "sender": row[2],
+                        "msg": row[3], "checked": row[4], "inbox": row[5]}
+                        for row in messages
+                    ],
+                    drafts=[
+                        {"draft_id": row[0], "username": row[1], "recipient": row[2], "msg": row[3], "checked": row[4]}
+                        for row in drafts
+                    ],
+                    deleted_msg_ids=[item_id for kind, item_id in tombstones if kind == "message"],
+                    deleted_draft_ids=[item_id for kind, item_id in tombstones if kind == "draft"],
+                    inbox_count=account[0] if account else 0,
+                    seq=seq)
+        except Exception as e:
+            print(f"[SERVER {self.pid}] SyncSince Exception: {e}")
+            return chat_pb2.SyncSinceResponse(success=False, message="Could not fetch changes")
+
+    def page_size(self, requested):
+        """
+        Return: page size to serve for a client's requested size (0 = default)
+        """
+        return min(requested, config.MAX_PAGE_SIZE) if requested > 0 else config.PAGE_SIZE
+
+    def fetch_messages_page(self, cursor, username, inbox, before_msg_id, page_size):
+        """
+        One page of a user's inbox (inbox = 1) or old messages (inbox = 0), newest first, below msg_id `before_msg_id` (0 = from the newest).
+        The page starts at the cursor in the (username, inbox) index, so a deep page costs no more than the first.
+        Return: list of messages, cursor of the next page (0 if this is the last one)
+        """
+        query = "SELECT msg_id, username, sender, msg, checked, inbox FROM messages WHERE username = ? AND inbox = ?"
+        params = [username, inbox]
+        if before_msg_id:
+            query += " AND msg_id < ?"
+            params.append(before_msg_id)
+        # One extra row tells whether there is a next page
+        cursor.execute(query + " ORDER BY msg_id DESC LIMIT ?", params + [page_size + 1])
+        rows = cursor.fetchall()
+        messages = [
+            {"msg_id": row[0], "username": row[1], "sender": row[2],
+            "msg": row[3], "checked": row[4], "inbox": row[5]}
+            for row in rows[:page_size]
+        ]
+        return messages, (rows[page_size - 1][0] if len(rows) > page_size else 0)
+
+    def fetch_drafts_page(self, cursor, username, after_draft_id, page_size):
+        """
+        One page of a user's drafts, oldest first, after draft_id `after_draft_id` (0 = from the first).
+        Return: list of drafts, cursor of the next page (0 if this is the last one)
+        """
+        cursor.execute("""
+            SELECT draft_id, username, recipient, msg, checked
+            FROM drafts
+            WHERE username = ? AND draft_id > ?
+            ORDER BY draft_id
+            LIMIT ?
+        """, (username, after_draft_id, page_size + 1))
+        rows = cursor.fetchall()
+        drafts = [
+            {"draft_id": row[0], "username": row[1], "recipient": row[2], "msg": row[3], "checked": row[4]}
+            for row in rows[:page_size]
+        ]
+        return drafts, (rows[page_size - 1][0] if len(rows) > page_size else 0)
     
+    @deduplicated
     def SaveDrafts(self, request, context):
         """
         Saves drafts of username to updated status.
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
         drafts = request.drafts
         try:
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
                 # Reset drafts
-                cursor.execute("DELETE FROM drafts WHERE username = ?", (username,))
+                seq = self.write_seq(cursor)
+                cursor.execute("DELETE FROM drafts WHERE username = ? RETURNING username, draft_id", (username,))
+                self.add_tombstones(cursor, "draft", cursor.fetchall(), seq)
                 
                 # Add draft to drafts table
                 # Note: `username` is the sender
@@ -426,24 +1084,34 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
                     recipient = draft.recipient if draft.recipient else "."
                     msg = draft.msg if draft.msg else "."
                     cursor.execute("""
-                        INSERT INTO drafts (username, recipient, msg, checked)
-                        VALUES (?, ?, ?, ?)
-                    """, (username, recipient, msg, 0,))
+                        INSERT INTO drafts (username, recipient, msg, checked, changed_seq)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (username, recipient, msg, 0, seq,))
                 response = chat_pb2.GenericResponse(success=True, message="Draft saved")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("SaveDrafts", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("SaveDrafts", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] SaveDrafts Exception: {e}")
             return chat_pb2.GenericResponse(success=False, message="Cannot save draft")
 
+    @deduplicated
     def AddDraft(self, request, context):
         """
         Adds new draft to drafts database.
         Return: AddDraftResponse (success, message, draft ID of new draft)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
         recipient = request.recipient
         msg = request.message
@@ -452,185 +1120,263 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         try:
             # Add draft to drafts table
             # Note: `username` is the sender
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
                 cursor.execute("""
-                    INSERT INTO drafts (username, recipient, msg, checked)
-                    VALUES (?, ?, ?, ?) RETURNING draft_id
-                """, (username, recipient, msg, checked,))
+                    INSERT INTO drafts (username, recipient, msg, checked, changed_seq)
+                    VALUES (?, ?, ?, ?, ?) RETURNING draft_id
+                """, (username, recipient, msg, checked, self.write_seq(cursor)))
                 response = chat_pb2.AddDraftResponse(success=True, message="Draft added", draft_id=cursor.fetchone()[0])
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("AddDraft", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("AddDraft", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] AddDraft Exception: {e}")
             return chat_pb2.AddDraftResponse(success=False, message="Cannot add draft")
     
+    @deduplicated
     def CheckMessage(self, request, context):
         """
         Set message as checked
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
         msg_id = request.msg_id
 
         try:
             # Update checked status
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
-                cursor.execute("UPDATE messages SET checked = 1 WHERE username = ? AND msg_id = ?", (username, msg_id,))
+                cursor.execute("UPDATE messages SET checked = 1, changed_seq = ? WHERE username = ? AND msg_id = ?",
+                               (self.write_seq(cursor), username, msg_id,))
                 response = chat_pb2.GenericResponse(success=True, message="Message checked as read")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("CheckMessage", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("CheckMessage", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Message unable to check as read")
     
+    @deduplicated
     def DownloadMessage(self, request, context):
         """
         Mark message as downloaded from inbox
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
         msg_id = request.msg_id
 
         try:
             # Update inbox status
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
-                cursor.execute("UPDATE messages SET inbox = 0 WHERE username = ? AND msg_id = ?", (username, msg_id,))
+                cursor.execute("UPDATE messages SET inbox = 0, changed_seq = ? WHERE username = ? AND msg_id = ? AND inbox = 1",
+                               (self.write_seq(cursor), username, msg_id,))
+                if cursor.rowcount > 0:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (username,))
                 response = chat_pb2.GenericResponse(success=True, message="Message downloaded from inbox")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("DownloadMessage", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("DownloadMessage", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Message unable to download from inbox")
     
+    @deduplicated
     def DeleteMessage(self, request, context):
         """
         Delete message from database
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         msg_id = request.msg_id
 
         try:
             # Remove message from messages table
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM messages WHERE msg_id = ?", (msg_id,))
+                cursor.execute("DELETE FROM messages WHERE msg_id = ? RETURNING username, msg_id, inbox", (msg_id,))
+                deleted = cursor.fetchall()
+                if deleted and deleted[0][2] == 1:
+                    cursor.execute("UPDATE accounts SET inbox_count = inbox_count - 1 WHERE username = ?", (deleted[0][0],))
+                self.add_tombstones(cursor, "message", [row[:2] for row in deleted], self.write_seq(cursor))
                 response = chat_pb2.GenericResponse(success=True, message="Message deleted")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("DeleteMessage", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("DeleteMessage", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Message unable to delete")
     
+    @deduplicated
     def DeleteAccount(self, request, context):
         """
         Delete account from database
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
             # Remove messages sent to the username, username's drafts, and user's account information
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
                 cursor.execute("DELETE FROM messages WHERE username = ?", (username,))
                 cursor.execute("DELETE FROM drafts WHERE username = ?", (username,))
+                cursor.execute("DELETE FROM tombstones WHERE username = ?", (username,))
                 cursor.execute("DELETE FROM accounts WHERE username = ?", (username,))
                 response = chat_pb2.GenericResponse(success=True, message="Account and all messages deleted")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("DeleteAccount", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("DeleteAccount", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             return chat_pb2.GenericResponse(success=False, message="Unable to delete account")
     
+    @deduplicated
     def Logout(self, request, context):
         """
         Set username as logged out
         Return: GenericResponse (success, message)
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         username = request.username
 
-        self.active_users.pop(username)
-        self.message_queues.pop(username)
+        self.drop_message_queue(username)
 
         try:
-            with self.db_connection: # ensures commit or rollback
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
                 cursor.execute("UPDATE accounts SET logged_in = 0 WHERE username = ?", (username,))
                 response = chat_pb2.GenericResponse(success=True, message="Logged out successfully")
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("Logout", request)
-                return response
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("Logout", request)
+                return response, entry
+            response, entry = self.run_write(write)
+
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] Logout Exception: {e}")
             return chat_pb2.GenericResponse(success=False, message="Unable to log out")
         
+    @deduplicated
     def SendMessage(self, request, context):
         """
         Check if recipient exists, delete draft, add message, and notify if online.
         """
+        # Only the leader takes writes from clients; a replica or deposed leader would lose them
+        self.check_accepts_writes(context)
         draft_id = request.draft_id
         recipient = request.recipient
         sender = request.sender
         content = request.content
         
         try:
-            with self.db_connection:
+            def write(): # committed by the writer thread, batched with other writes
                 cursor = self.db_connection.cursor()
 
                 # Check if recipient exists
                 cursor.execute("SELECT 1 FROM accounts WHERE username = ?", (recipient,))
                 if cursor.fetchone() is None:
-                    return chat_pb2.SendMessageResponse(success=False, message="Recipient does not exist")
+                    return chat_pb2.SendMessageResponse(success=False, message="Recipient does not exist"), None, None
                 
                 # Delete draft
-                cursor.execute("DELETE FROM drafts WHERE draft_id = ?", (draft_id,))
+                seq = self.write_seq(cursor)
+                cursor.execute("DELETE FROM drafts WHERE draft_id = ? RETURNING username, draft_id", (draft_id,))
+                self.add_tombstones(cursor, "draft", cursor.fetchall(), seq)
 
                 # Store the message
                 cursor.execute("""
-                    INSERT INTO messages (username, sender, msg, checked, inbox)
-                    VALUES (?, ?, ?, ?, ?) RETURNING msg_id
-                """, (recipient, sender, content, 0, 1))
+                    INSERT INTO messages (username, sender, msg, checked, inbox, changed_seq)
+                    VALUES (?, ?, ?, ?, ?, ?) RETURNING msg_id
+                """, (recipient, sender, content, 0, 1, seq))
                 msg_id = cursor.fetchone()[0]
 
-                # Get the recipient's new inbox count
-                cursor.execute("SELECT COUNT(*) FROM messages WHERE username = ? AND inbox = 1", (recipient,))
+                # Bump the recipient's inbox counter; its new value goes out with the push
+                cursor.execute("UPDATE accounts SET inbox_count = inbox_count + 1 WHERE username = ? RETURNING inbox_count", (recipient,))
                 new_inbox_count = cursor.fetchone()[0]
-                # If recipient is online, push message to their queue
+
+                response = chat_pb2.SendMessageResponse(success=True, message="Message sent", msg_id=msg_id)
+                # if this server is leader, record the operation in the replication log (rolled back if it no longer is)
+                entry = self.log_write("SendMessage", request)
+                return response, entry, new_inbox_count
+            response, entry, new_inbox_count = self.run_write(write)
+
+            # If recipient is online, push message to their queue (once the message is committed)
+            if response.success:
                 with self.lock:
                     if recipient in self.active_users:
                         self.message_queues[recipient].put(chat_pb2.ReceiveMessageResponse(
-                            msg_id=msg_id,
+                            msg_id=response.msg_id,
                             username=recipient,
                             sender=sender,
                             msg=content,
                             inbox_count=new_inbox_count
                         ))
 
-                response = chat_pb2.SendMessageResponse(success=True, message="Message sent", msg_id=msg_id)
-                
-                # if this server is leader, replicate the operation
-                if self.IS_LEADER:
-                    self.replicate_to_replicas("SendMessage", request)
-                return response
+            # if this server is leader, replicate the operation
+            if entry is not None:
+                self.replicate_to_replicas(entry)
+                response.seq = entry.seq
+            return response
+        except NotLeader:
+            self.reject_write(context)
         except Exception as e:
             print(f"[SERVER {self.pid}] SendMessage Exception: {e}")
             return chat_pb2.SendMessageResponse(success=False, message="Send message error")
@@ -642,31 +1388,69 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         username = request.username
         print(f"[SERVER {self.pid}] {username} connected to message stream.")
         
-        # Ensure the user has a queue
-        with self.lock:
-            if username not in self.message_queues:
-                self.message_queues[username] = queue.Queue()
-            self.active_users[username] = True
+        # Wake the stream up with None once the client goes away, rather than polling context.is_active()
+        message_queue = self.attach_message_queue(username)
+        if not context.add_callback(lambda: message_queue.put(None)):
+            message_queue.put(None)  # the client is already gone
 
         try:
-            while context.is_active():
-                try:
-                    # Block until a message is available, then send it
-                    message = self.message_queues[username].get(timeout=5)  # 5s timeout to check if still active
-                    yield message
-                except queue.Empty:
-                    continue  # No message yet, keep waiting
-        except Exception as e:
-            # If they just logged out, then self.message_queue[username] will throw {e}, ignore
-            # Otherwise, it's a real exception we care about
-            print(f"[SERVER {self.pid}] ReceiveMessageStream Exception: {e} (Note a logout/delete occurred if Exception=username)")
+            # Block until a message is available, then send it; None ends the stream (disconnect, logout, newer stream)
+            while (message := message_queue.get()) is not None:
+                yield message
         finally:
             with self.lock:
-                self.active_users.pop(username, None)    # Mark user as offline when they disconnect
-                self.message_queues.pop(username, None)  # Clean up queue
+                if self.message_queues.get(username) is message_queue:
+                    self.active_users.pop(username, None)    # Mark user as offline when they disconnect
+                    self.message_queues.pop(username, None)  # Clean up queue
             print(f"[SERVER {self.pid}] {username} disconnected from message stream.")
 
 
+    def attach_message_queue(self, username):
+        """
+        Give a new message stream its own queue, taking over the messages already waiting for the user (e.g. since Login).
+        An older stream of the same user is ended, so the two never split the user's messages.
+        Return: the stream's queue
+        """
+        message_queue = self.new_message_queue()
+        with self.lock:
+            previous = self.message_queues.get(username)
+            self.message_queues[username] = message_queue
+            self.active_users[username] = True
+            if previous is not None:
+                self.hand_off_messages(previous, message_queue)
+        return message_queue
+
+    def hand_off_messages(self, previous, message_queue):
+        """
+        Move the messages waiting in a replaced stream's queue to the new one, then end the replaced stream.
+        Called with self.lock held, so no message is put in between.
+        """
+        while True:
+            try:
+                message = previous.get_nowait()
+            except queue.Empty:
+                break
+            if message is not None:
+                message_queue.put(message)
+        previous.put(None)
+
+    def new_message_queue(self):
+        """
+        Return: an empty queue of messages to push to a user
+        """
+        return queue.Queue()
+
+    def drop_message_queue(self, username):
+        """
+        Forget a user who logged out or was deleted, and end their open message stream.
+        """
+        with self.lock:
+            self.active_users.pop(username, None)
+            message_queue = self.message_queues.pop(username, None)
+        if message_queue is not None:
+            message_queue.put(None)
+
+
     # ++++++++++++++  Functions: Replication  ++++++++++++++ #
     def Replicate(self, request, context):
         """
@@ -675,207 +1459,1121 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """
         method = request.method
         print(f"[SERVER {self.pid}] Received replication request for method {method}")
-        
-        # Deserialize request.payload and call appropriate local update
+        self.tx_state.replicating = True
+        self.tx_state.replicated_seq = request.seq
+        try:
+            response = self.apply_replicated(request, context)
+        finally:
+            self.tx_state.replicating = False
+        # The leader only logs writes that succeeded, and handlers report errors in their response instead of raising:
+        # raise, so apply_log_entries rolls back whatever the write did and does not log it
+        if response is not None and not response.success:
+            raise RuntimeError(f"{method} failed on this replica: {response.message}")
+        return chat_pb2.GenericResponse(success=True, message="Replication applied")
+
+    def apply_replicated(self, request, context):
+        """
+        Deserialize request.payload and call the appropriate local update.
+        Return: the handler's response (None for an entry that changes nothing)
+        """
+        method = request.method
         if method == "CreateAccount":
             local_request = chat_pb2.CreateAccountRequest()
             local_request.ParseFromString(request.payload)
-            self.CreateAccount(local_request, context)
+            return self.CreateAccount(local_request, context)
         elif method == "Login":
             local_request = chat_pb2.LoginRequest()
             local_request.ParseFromString(request.payload)
-            self.Login(local_request, context)
+            return self.Login(local_request, context)
         elif method == "SaveDrafts":
             local_request = chat_pb2.SaveDraftsRequest()
             local_request.ParseFromString(request.payload)
-            self.SaveDrafts(local_request, context)
+            return self.SaveDrafts(local_request, context)
         elif method == "AddDraft":
             local_request = chat_pb2.AddDraftRequest()
             local_request.ParseFromString(request.payload)
-            self.AddDraft(local_request, context)
+            return self.AddDraft(local_request, context)
         elif method == "CheckMessage":
             local_request = chat_pb2.CheckMessageRequest()
             local_request.ParseFromString(request.payload)
-            self.CheckMessage(local_request, context)
+            return self.CheckMessage(local_request, context)
         elif method == "DownloadMessage":
             local_request = chat_pb2.DownloadMessageRequest()
             local_request.ParseFromString(request.payload)
-            self.DownloadMessage(local_request, context)
+            return self.DownloadMessage(local_request, context)
         elif method == "DeleteMessage":
             local_request = chat_pb2.DeleteMessageRequest()
             local_request.ParseFromString(request.payload)
-            self.DeleteMessage(local_request, context)
+            return self.DeleteMessage(local_request, context)
         elif method == "DeleteAccount":
             local_request = chat_pb2.DeleteAccountRequest()
             local_request.ParseFromString(request.payload)
-            self.DeleteAccount(local_request, context)
+            return self.DeleteAccount(local_request, context)
         elif method == "Logout":
             local_request = chat_pb2.LogoutRequest()
             local_request.ParseFromString(request.payload)
-            self.Logout(local_request, context)
+            return self.Logout(local_request, context)
         elif method == "SendMessage":
             local_request = chat_pb2.SendMessageRequest()
             local_request.ParseFromString(request.payload)
-            self.SendMessage(local_request, context)
+            return self.SendMessage(local_request, context)
+        elif method == "NewTerm":
+            return None  # empty entry a new leader logs (see commit_new_term)
         elif method == "UpdateRegistry":
             local_request = chat_pb2.UpdateRegistryRequest()
             local_request.ParseFromString(request.payload)
-            self.UpdateRegistryReplica(local_request, context)
-        
-        return chat_pb2.GenericResponse(success=True, message="Replication applied")   
+            return self.UpdateRegistryReplica(local_request, context)
     
-    def replicate_to_replicas(self, method_name, request):
+    def ReplicateBatch(self, request, context):
+        """
+        Called by the leader on a replica to apply a batch of write operations (AppendEntries).
+        Batches from a leader of an older term are rejected; a current one resets our election timer.
+        All entries are applied in sequence order inside a single transaction.
+        If our log diverged from the leader's, we reload a full copy in the background.
+        Return: ReplicationBatchResponse (success, message, last applied seq, our term, conflict)
+        """
+        term = self.observe_term(request.term)
+        if request.term < term:
+            return chat_pb2.ReplicationBatchResponse(success=False, message="Stale leader term", term=term)
+        self.follow_leader(request.leader_pid, request.leader_addr)
+
+        print(f"[SERVER {self.pid}] Received replication batch of {len(request.entries)} writes")
+        try:
+            with self.transaction():
+                success, last_seq = self.apply_log_entries(request.entries, context, request.prev_seq, request.prev_term)
+            self.note_applied(last_seq)
+            if not success:
+                return chat_pb2.ReplicationBatchResponse(success=False, message="Missing or failed log entries", last_seq=last_seq, term=term)
+            return chat_pb2.ReplicationBatchResponse(success=True, message="Replication batch applied", last_seq=last_seq, term=term)
+        except LogConflict as e:
+            print(f"[SERVER {self.pid}] {e}; reloading a full copy from leader {request.leader_pid}")
+            self.start_resync(request.leader_addr)
+            return chat_pb2.ReplicationBatchResponse(success=False, message="Replica log diverged", term=term, conflict=True)
+        except Exception as e:
+            print(f"[SERVER {self.pid}] ReplicateBatch Exception: {e}")
+            return chat_pb2.ReplicationBatchResponse(success=False, message=f"ReplicateBatch {e}")
+
+    def apply_log_entries(self, entries, context, prev_seq=None, prev_term=0):
+        """
+        Apply replication log entries in order, skipping ones that were already applied.
+        Stops at the first gap in the sequence, or at the first entry that fails to apply (it is rolled back and not
+        logged), so the leader can resend from there.
+        Raises LogConflict if an entry we already hold (or prev_seq, when given) has a different term than the leader's.
+        Must be called inside a transaction.
+        Return: success (T/F), last applied seq
+        """
+        cursor = self.db_connection.cursor()
+        last_seq, last_term = self.get_last_log_position(cursor)
+        if prev_seq and prev_seq == last_seq and prev_term != last_term:
+            raise LogConflict(f"Log diverged at seq {prev_seq}: have term {last_term}, leader has term {prev_term}")
+        if not entries and prev_seq is not None:
+            # An empty batch marks the end of the leader's log: we must have exactly that much
+            if prev_seq > last_seq:
+                return False, last_seq
+            if prev_seq < last_seq:
+                raise LogConflict(f"Log has entries after seq {prev_seq} that the leader does not")
+        for entry in sorted(entries, key=lambda e: e.seq):
+            if entry.seq <= last_seq:
+                if self.get_log_term(cursor, entry.seq) not in (None, entry.term):
+                    raise LogConflict(f"Log diverged at seq {entry.seq}: leader has term {entry.term}")
+                continue
+            if entry.seq != last_seq + 1:
+                print(f"[SERVER {self.pid}] Replication log gap: have {last_seq}, got {entry.seq}")
+                return False, last_seq
+            # An entry that fails is undone on its own and not logged; the leader resends it with its next batch
+            cursor.execute("SAVEPOINT entry")
+            try:
+                self.Replicate(entry, context)
+            except Exception as e:
+                print(f"[SERVER {self.pid}] Error applying log entry {entry.seq} ({entry.method}): {e}")
+                cursor.execute("ROLLBACK TO entry")
+                cursor.execute("RELEASE entry")
+                success = False
+                break
+            cursor.execute("INSERT OR REPLACE INTO replication_log (seq, term, method, payload) VALUES (?, ?, ?, ?)",
+                           (entry.seq, entry.term, entry.method, entry.payload))
+            cursor.execute("RELEASE entry")
+            last_seq, last_term = entry.seq, entry.term
+        else:
+            success = True
+        cursor.execute("UPDATE replication_state SET last_seq = ?, last_term = ?", (last_seq, last_term))
+        return success, last_seq
+
+    def append_to_log(self, method_name, request, term):
         """
-        Called by the leader to replicate a write operation to all alive replicas.
+        Called by the leader inside a write's transaction to record it in the replication log, in the given term.
+        The seq is taken from replication_state in the same transaction, so a rollback leaves no gap.
+        Return: ReplicationRequest entry
         """
         payload = request.SerializeToString()
-        replication_request = chat_pb2.ReplicationRequest(method=method_name, payload=payload)
-        
-        with self.db_connection:
+        cursor = self.db_connection.cursor()
+        cursor.execute("UPDATE replication_state SET last_seq = last_seq + 1, last_term = ? RETURNING last_seq", (term,))
+        seq = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO replication_log (seq, term, method, payload) VALUES (?, ?, ?, ?)", (seq, term, method_name, payload))
+
+        # Trim the oldest entries once in a while; servers further behind get a full copy
+        if seq % 1000 == 0:
+            cursor.execute("DELETE FROM replication_log WHERE seq <= ?", (seq - config.REPLICATION_LOG_MAX,))
+        return chat_pb2.ReplicationRequest(method=method_name, payload=payload, seq=seq, term=term)
+
+    def get_last_seq(self, cursor):
+        """
+        Return: last replication log seq applied by this server
+        """
+        cursor.execute("SELECT last_seq FROM replication_state")
+        return cursor.fetchone()[0]
+
+    def read_seq(self, cursor):
+        """
+        A replica may have applied entries the leader has not committed yet. It still answers from them, but does
+        not hand out their seq: clients pass the seqs they saw as min_seq, and an entry that is never committed
+        would leave other servers unable to reach it.
+        Return: seq a read reports, i.e. the last seq applied, on a replica at most the leader's commit_seq
+        """
+        applied = self.get_last_seq(cursor)
+        if self.IS_LEADER:
+            return applied
+        return min(applied, self.leader_commit_seq)
+
+    def get_last_log_position(self, cursor):
+        """
+        Return: last replication log seq applied by this server, and the term of that entry
+        """
+        cursor.execute("SELECT last_seq, last_term FROM replication_state")
+        return cursor.fetchone()
+
+    def write_seq(self, cursor):
+        """
+        Must be called inside a write's transaction, before the leader logs it.
+        Return: replication log seq of the write being applied, which is the same on every server
+        """
+        if getattr(self.tx_state, "replicating", False):
+            return self.tx_state.replicated_seq
+        return self.get_last_seq(cursor) + 1
+
+    def add_tombstones(self, cursor, kind, rows, seq):
+        """
+        Record deleted messages or drafts (rows of username, id) at the write's seq, for SyncSince.
+        Tombstones older than TOMBSTONE_RETENTION writes are dropped; clients behind that must reload everything.
+        """
+        if not rows:
+            return
+        cursor.executemany("INSERT INTO tombstones (username, kind, item_id, seq) VALUES (?, ?, ?, ?)",
+                           [(username, kind, item_id, seq) for username, item_id in rows])
+        horizon = seq - config.TOMBSTONE_RETENTION
+        cursor.execute("DELETE FROM tombstones WHERE seq <= ?", (horizon,))
+        if cursor.rowcount > 0:
+            cursor.execute("UPDATE replication_state SET tombstone_horizon = MAX(tombstone_horizon, ?)", (horizon,))
+
+    def get_log_term(self, cursor, seq):
+        """
+        Return: term of the log entry at seq, or None if the log does not hold it
+        """
+        cursor.execute("SELECT term FROM replication_log WHERE seq = ?", (seq,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def read_log_since(self, last_seq, last_term=None):
+        """
+        Read every log entry after last_seq.
+        If last_term is given, our entry at last_seq must have that term, otherwise the caller's log diverged.
+        Return: ReplicationBatch (with prev_seq/prev_term set), or None if the log no longer covers that range
+        """
+        with self.transaction(write=False):
             cursor = self.db_connection.cursor()
-            cursor.execute("SELECT pid, addr FROM registry")
-            for replica_id, addr in cursor.fetchall():
-                # Don't need to replicate to leader
-                if replica_id == self.leader:
-                    continue
-                
-                # Check heartbeat timestamp (if missing or too old, skip this replica)
-                cursor.execute("SELECT timestamp FROM registry WHERE pid = ? AND addr = ?", (replica_id, addr))
-                last_hb = cursor.fetchone()[0]  # Fetch the result (single row)
-                if time.time() - last_hb > config.HEARTBEAT_TIMEOUT:
-                    print(f"[SERVER {self.pid}] Replica {replica_id} heartbeat timed out; removing from alive list.")
-                    continue
-                
-                # Send replication request to all active servers
-                try:
-                    print("REPLICATING...", addr)
-                    with grpc.insecure_channel(addr) as channel:
-                        stub = chat_pb2_grpc.ChatServiceStub(channel)
-                        rep_response = stub.Replicate(replication_request)
-                        if not rep_response.success:
-                            print(f"[SERVER {self.pid}] Replication to replica {replica_id} failed: {rep_response.message}")
-                except Exception as e:
-                    print(f"[SERVER {self.pid}] Error replicating to replica {replica_id}.")
+            if last_seq > self.get_last_seq(cursor):
+                return None
+            prev_term = self.get_log_term(cursor, last_seq)
+            if last_term is not None and prev_term not in (None, last_term):
+                return None
+            cursor.execute("SELECT MIN(seq) FROM replication_log")
+            first_seq = cursor.fetchone()[0]
+            cursor.execute("SELECT seq, term, method, payload FROM replication_log WHERE seq > ? ORDER BY seq", (last_seq,))
+            rows = cursor.fetchall()
+        if rows and first_seq > last_seq + 1:
+            return None
+        return chat_pb2.ReplicationBatch(
+            entries=[
+                chat_pb2.ReplicationRequest(seq=seq, term=term, method=method, payload=payload)
+                for seq, term, method, payload in rows
+            ],
+            prev_seq=last_seq if prev_term is not None else 0,
+            prev_term=prev_term or 0)
+
+    def replicate_to_replicas(self, entry):
+        """
+        Called by the leader to replicate a logged write operation to all alive replicas.
+        The entry is queued for the next batch; we return once that batch reaches quorum (or fails to).
+        Return: whether the batch reached a majority of the members (see fan_out_batch)
+        """
+        done = futures.Future()
+        with self.replication_cond:
+            self.replication_buffer.append((entry, done))
+            self.replication_cond.notify()
+        try:
+            return done.result(timeout=config.REPLICATION_BATCH_WINDOW + config.REPLICATION_TIMEOUT)
+        except futures.TimeoutError:
+            print(f"[SERVER {self.pid}] Replication of {entry.method} (seq {entry.seq}) still pending after timeout")
+            return False
+
+    def replication_flush_loop(self):
+        """
+        Flush queued writes to the replicas as one ReplicateBatch RPC.
+        A batch is sent once it holds REPLICATION_BATCH_SIZE writes or its window has passed.
+        """
+        while True:
+            with self.replication_cond:
+                while not self.replication_buffer:
+                    self.replication_cond.wait()
+                deadline = time.time() + config.REPLICATION_BATCH_WINDOW
+                while len(self.replication_buffer) < config.REPLICATION_BATCH_SIZE:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.replication_cond.wait(remaining)
+                self.replication_buffer.sort(key=lambda item: item[0].seq)
+                pending = self.replication_buffer[:config.REPLICATION_BATCH_SIZE]
+                self.replication_buffer = self.replication_buffer[config.REPLICATION_BATCH_SIZE:]
+
+            # A leader that stepped down sends nothing; the new leader's log decides what survives
+            committed = False
+            if self.IS_LEADER:
+                batch = self.make_batch([entry for entry, _ in pending])
+                committed = self.fan_out_batch(batch)
+                if committed:
+                    self.mark_committed(batch.entries[-1].seq, batch.entries[-1].term)
+            for _, done in pending:
+                done.set_result(committed)
+
+    def make_batch(self, entries):
+        """
+        Wrap log entries in a ReplicationBatch stamped with our term, our address,
+        and the position of the entry just before them, for the replicas' consistency check.
+        Return: ReplicationBatch
+        """
+        batch = chat_pb2.ReplicationBatch(entries=entries, term=entries[-1].term, leader_pid=self.pid, leader_addr=self.addr)
+        prev_seq = entries[0].seq - 1
+        with self.transaction(write=False):
+            prev_term = self.get_log_term(self.db_connection.cursor(), prev_seq)
+        if prev_term is not None:
+            batch.prev_seq, batch.prev_term = prev_seq, prev_term
+        return batch
+
+    def fan_out_batch(self, batch):
+        """
+        Send a batch to all alive replicas in parallel, and wait for REPLICATION_QUORUM of them to ack it
+        (every alive replica, if fewer), and in any case for enough acks to make a majority of all members.
+        Return: whether a majority of the members (ourselves included) holds the batch
+        """
+        pending = []
+        for replica_id, last_hb, addr in self.registry_rows():
+            # Don't need to replicate to leader
+            if replica_id == self.leader:
+                continue
+            
+            # Check heartbeat history (if suspected dead, skip this replica)
+            if not self.is_peer_alive(replica_id, last_hb, time.time()):
+                print(f"[SERVER {self.pid}] Replica {replica_id} heartbeat timed out; removing from alive list.")
+                continue
+            
+            # Queue on the replica's own worker so it applies batches in order
+            print("REPLICATING...", addr)
+            executor = self.get_peer_executor(addr)
+            pending.append(executor.submit(self.send_replication_batch, replica_id, addr, batch))
+
+        # Wait for the quorum of acks; stragglers finish in the background
+        # Replicas the failure detector gave up on still count towards the majority, so a cut-off leader commits nothing
+        majority = self.quorum() - 1
+        needed = max(min(config.REPLICATION_QUORUM, len(pending)), majority)
+        acks = 0
+        if needed == 0:
+            return True
+        try:
+            for future in futures.as_completed(pending, timeout=config.REPLICATION_TIMEOUT):
+                if future.result():
+                    acks += 1
+                if acks >= needed:
+                    break
+        except futures.TimeoutError:
+            pass
+        if acks < majority:
+            print(f"[SERVER {self.pid}] Replication quorum not reached: {acks}/{majority} acks")
+        return acks >= majority
+
+    def mark_committed(self, seq, term):
+        """
+        Record that a majority holds the log up to seq, whose entry was logged in term.
+        As in Raft, only an entry of our current term counts: an older one could still be replaced by another leader.
+        """
+        with self.replication_cond:
+            if term == self.current_term:
+                self.commit_seq = max(self.commit_seq, seq)
+
+    def confirm_replicated(self, seq):
+        """
+        Make sure the log up to seq is held by a majority. If we do not know it yet, the leader sends
+        an empty batch at the end of its log, which replicas that miss entries fill in first.
+        Return: whether a majority holds the log up to seq
+        """
+        if seq <= self.commit_seq:
+            return True
+        if not self.IS_LEADER:
+            return False
+        with self.transaction(write=False):
+            last_seq, last_term = self.get_last_log_position(self.db_connection.cursor())
+        batch = chat_pb2.ReplicationBatch(term=self.current_term, leader_pid=self.pid, leader_addr=self.addr,
+                                          prev_seq=last_seq, prev_term=last_term)
+        if self.fan_out_batch(batch):
+            self.mark_committed(last_seq, last_term)
+        return seq <= self.commit_seq
+
+    def check_replicated(self, response, context):
+        """
+        Answer a client write only once it is held by a majority of the members (response.seq 0: nothing was logged).
+        Otherwise the write fails with UNAVAILABLE (or "Not the leader" if we stepped down) and the client retries;
+        the retry finds the response in the dedup cache, so the write is never applied twice.
+        """
+        if self.confirm_replicated(response.seq):
+            return
+        if not self.IS_LEADER:
+            self.reject_write(context)
+        print(f"[SERVER {self.pid}] Write at seq {response.seq} is not held by a majority; failing it.")
+        context.abort(grpc.StatusCode.UNAVAILABLE, "Write not replicated to a majority")
+
+    def send_replication_batch(self, replica_id, addr, batch):
+        """
+        Send one replication batch to one replica.
+        Return: success (T/F)
+        """
+        try:
+            stub = self.get_peer_stub(addr)
+            rep_response = stub.ReplicateBatch(batch, timeout=config.REPLICATION_TIMEOUT)
+
+            # Replica is missing earlier entries: resend everything after its last seq from the log
+            first_seq = batch.entries[0].seq if batch.entries else batch.prev_seq + 1
+            if not rep_response.success and not rep_response.conflict and rep_response.term <= batch.term \
+                    and rep_response.last_seq < first_seq - 1:
+                missing = self.read_log_since(rep_response.last_seq)
+                if missing is None:
+                    print(f"[SERVER {self.pid}] Replica {replica_id} is too far behind the log; it needs a full copy.")
+                    return False
+                print(f"[SERVER {self.pid}] Resending {len(missing.entries)} log entries to replica {replica_id}")
+                missing.term, missing.leader_pid, missing.leader_addr = batch.term, batch.leader_pid, batch.leader_addr
+                rep_response = stub.ReplicateBatch(missing, timeout=config.REPLICATION_TIMEOUT)
+
+            # Replica is in a newer term: a new leader was elected, so step down
+            if rep_response.term > batch.term:
+                self.observe_term(rep_response.term)
+            if not rep_response.success:
+                print(f"[SERVER {self.pid}] Replication to replica {replica_id} failed: {rep_response.message}")
+            return rep_response.success
+        except Exception as e:
+            print(f"[SERVER {self.pid}] Error replicating to replica {replica_id}.")
+            return False
+
+    def catch_up_peer(self, replica_id, addr):
+        """
+        Send a returning replica an empty batch positioned at the end of our log.
+        If it is behind, it answers with its last seq and send_replication_batch fills the gap;
+        if its log diverged, it reloads a full copy.
+        """
+        with self.transaction(write=False):
+            last_seq, last_term = self.get_last_log_position(self.db_connection.cursor())
+        batch = chat_pb2.ReplicationBatch(term=self.current_term, leader_pid=self.pid, leader_addr=self.addr,
+                                          prev_seq=last_seq, prev_term=last_term)
+        self.get_peer_executor(addr).submit(self.send_replication_batch, replica_id, addr, batch)
+
+    def start_writer(self):
+        """
+        Start the writer thread that commits client writes.
+        """
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def start_replication(self):
+        """
+        Start the replication batch flusher.
+        """
+        threading.Thread(target=self.replication_flush_loop, daemon=True).start()
     
 
+    # ++++++++++++++  Functions: Peer Channel Pool  ++++++++++++++ #
+    def get_peer_stub(self, addr):
+        """
+        Return a stub for a peer, reusing its long-lived channel if one is open.
+        A new channel is only created the first time we talk to an address.
+        """
+        with self.peer_lock:
+            if addr not in self.peer_channels:
+                # Keep reconnect backoff short so a (re)starting peer gets heartbeats before its election timeout
+                channel = grpc.insecure_channel(addr, options=[
+                    ("grpc.initial_reconnect_backoff_ms", 100),
+                    ("grpc.min_reconnect_backoff_ms", 100),
+                    ("grpc.max_reconnect_backoff_ms", 1000)])
+                self.peer_channels[addr] = (channel, chat_pb2_grpc.ChatServiceStub(channel))
+            return self.peer_channels[addr][1]
+
+    def get_peer_executor(self, addr):
+        """
+        Return the single-threaded executor that sends replication requests to a peer.
+        One worker per peer keeps each replica's writes in order while peers run in parallel.
+        """
+        with self.peer_lock:
+            if addr not in self.peer_executors:
+                self.peer_executors[addr] = futures.ThreadPoolExecutor(max_workers=1)
+            return self.peer_executors[addr]
+
+    def refresh_peer_channels(self):
+        """
+        Sync the channel pool with the registry.
+        Close channels of peers that are no longer registered (or departed).
+        """
+        registered = {addr for _, _, addr in self.registry_rows()} | {addr for _, addr in self.registry_departed()}
+        with self.peer_lock:
+            for addr in list(self.peer_channels):
+                if addr not in registered:
+                    channel, _ = self.peer_channels.pop(addr)
+                    channel.close()
+            for addr in list(self.peer_executors):
+                if addr not in registered:
+                    self.peer_executors.pop(addr).shutdown(wait=False)
+
+
+    # ++++++++++++++  Functions: Peer Registry  ++++++++++++++ #
+    def registry_rows(self):
+        """
+        Return: list of (pid, last_seen, addr) for all registered peers, ordered by pid
+        """
+        with self.registry_lock:
+            return [(pid, peer["last_seen"], peer["addr"]) for pid, peer in sorted(self.registry.items())]
+
+    def registry_addr(self, pid):
+        """
+        Return: address of a registered peer, or None if it is not registered
+        """
+        with self.registry_lock:
+            peer = self.registry.get(pid)
+            return peer["addr"] if peer else None
+
+    def registry_replace(self, rows, members=()):
+        """
+        Replace the whole registry with rows of (pid, timestamp, addr), and persist it.
+        Its servers, and the (pid, addr) rows in members (the leader's membership), join our membership.
+        """
+        self.members_add([(pid, addr) for pid, _, addr in rows] + [tuple(member) for member in members])
+        with self.registry_lock:
+            self.registry = {pid: {"addr": addr, "last_seen": timestamp, "state": "alive"} for pid, timestamp, addr in rows}
+            for pid in self.registry:
+                self.departed.pop(pid, None)
+        self.persist_registry()
+        self.notify_membership_change()
+
+    def registry_add(self, pid, addr):
+        """
+        Add (or re-add) a peer to the registry, and persist it.
+        """
+        self.members_add([(pid, addr)])
+        with self.registry_lock:
+            self.registry[pid] = {"addr": addr, "last_seen": time.time(), "state": "alive"}
+            self.departed.pop(pid, None)
+        self.persist_registry()
+        self.notify_membership_change()
+
+    def registry_remove(self, pids):
+        """
+        Remove peers from the registry, and persist it.
+        They are remembered as departed, so heartbeats notice if they come back.
+        """
+        with self.registry_lock:
+            for pid in pids:
+                peer = self.registry.pop(pid, None)
+                if peer is not None and pid != self.pid:
+                    self.departed[pid] = peer["addr"]
+        self.persist_registry()
+        self.notify_membership_change()
+
+    def registry_departed(self):
+        """
+        Return: list of (pid, addr) for peers that were dropped as dead
+        """
+        with self.registry_lock:
+            return sorted(self.departed.items())
+
+    def registry_heard_from(self, pids, timestamp):
+        """
+        Record a successful heartbeat. Kept in memory only; not a membership change.
+        """
+        with self.registry_lock:
+            for pid in pids:
+                if pid in self.registry:
+                    if self.registry[pid]["state"] != "alive":
+                        print(f"[SERVER {self.pid}] Replica {pid} is alive!")
+                    self.registry[pid]["last_seen"] = timestamp
+                    self.registry[pid]["state"] = "alive"
+
+    def registry_mark_suspect(self, pids):
+        """
+        Record a failed heartbeat. Kept in memory only; not a membership change.
+        """
+        with self.registry_lock:
+            for pid in pids:
+                if pid in self.registry:
+                    self.registry[pid]["state"] = "suspect"
+
+    def members_add(self, rows):
+        """
+        Add (pid, addr) rows to the cluster membership, and persist it if it changed.
+        Servers are never removed from it when they fail: a server that is down still counts towards every majority.
+        """
+        with self.registry_lock:
+            new = [(pid, addr) for pid, addr in rows if pid >= 0 and addr and self.members.get(pid) != addr]
+            self.members.update(new)
+        if new:
+            self.persist_members()
+
+    def members_rows(self):
+        """
+        Return: list of (pid, addr) for every member of the cluster, ourselves included, ordered by pid
+        """
+        with self.registry_lock:
+            return sorted(self.members.items())
+
+    def quorum(self):
+        """
+        Return: number of servers (ourselves included) that make a majority of the whole membership
+        """
+        with self.registry_lock:
+            return len(self.members) // 2 + 1
+
+    def persist_members(self):
+        """
+        Write the in-memory membership to the members table.
+        """
+        with self.transaction():
+            rows = self.members_rows()
+            cursor = self.db_connection.cursor()
+            cursor.execute("DELETE FROM members")
+            cursor.executemany("INSERT INTO members (pid, addr) VALUES (?, ?)", rows)
+
+    def persist_registry(self):
+        """
+        Write the in-memory registry to the registry table.
+        Only called on membership changes; heartbeats stay in memory.
+        """
+        with self.transaction():
+            with self.registry_lock:
+                rows = [(pid, peer["last_seen"], peer["addr"]) for pid, peer in self.registry.items()]
+            cursor = self.db_connection.cursor()
+            cursor.execute("DELETE FROM registry")
+            cursor.executemany("INSERT INTO registry (pid, timestamp, addr) VALUES (?, ?, ?)", rows)
+
+
     # ++++++++++++++  Functions: Leader  ++++++++++++++ #        
     def GetLeader(self, request, context):
         """
-        Returns the current leader's address.
-        Assumes a global variable CURRENT_LEADER that is maintained via heartbeats and election.
+        Returns the current leader's address and term, and every registered server's address.
+        Any server can answer, so a client that cached the membership finds the leader in one hop.
         """
-        # Look up the current leader's address
-        with self.db_connection:
-            cursor = self.db_connection.cursor()
-            cursor.execute("SELECT addr FROM registry WHERE pid = ?", (self.leader,))
-            addr = cursor.fetchone()[0]
-        return chat_pb2.GetLeaderResponse(success=True, leader_address=addr)
+        # A leader whose lease ran out may have been replaced; let the client ask someone else
+        if self.IS_LEADER and not self.wait_for_lease():
+            response = self.leader_info()
+            response.success = False
+            return response
+        return self.leader_info()
+
+    def WatchLeader(self, request, context):
+        """
+        Stream the leader and membership to a client: once right away, then on every change.
+        Lets clients switch to a new leader as soon as we learn of it, without polling.
+        """
+        # Wake the stream up once the client goes away, rather than polling context.is_active()
+        closed = threading.Event()
+        def close():
+            closed.set()
+            with self.membership_cond:
+                self.membership_cond.notify_all()
+        if not context.add_callback(close):
+            return  # the client is already gone
+
+        version = -1
+        while True:
+            with self.membership_cond:
+                self.membership_cond.wait_for(lambda: self.membership_version != version or closed.is_set())
+                if closed.is_set():
+                    return
+                version = self.membership_version
+            yield self.leader_info()
+
+    def leader_info(self):
+        """
+        Return: GetLeaderResponse with our view of the leader (success=False if we know none) and the membership
+        """
+        with self.raft_lock:
+            leader, leader_addr, term = self.leader, self.leader_addr, self.current_term
+        addr = (self.registry_addr(leader) or leader_addr) if leader >= 0 else ""
+        replicas = [replica_addr for _, _, replica_addr in self.registry_rows()]
+        return chat_pb2.GetLeaderResponse(success=bool(addr), leader_address=addr, leader_pid=leader,
+                                          term=term, replica_addresses=replicas)
+
+    def notify_membership_change(self):
+        """
+        Wake every WatchLeader stream after the leader or the registry changed.
+        """
+        with self.membership_cond:
+            self.membership_version += 1
+            self.membership_cond.notify_all()
     
     def find_leader(self):
-        # Try all possible combinations of machines
-        for host in config.ALL_HOSTS:
-            for p in range(self.pid-1, -1, -1):
-                addr = f"{host}:{config.BASE_PORT+p}"
-                print("Trying...", addr)
-                try:
-                    # Query host for leader
-                    with grpc.insecure_channel(addr) as channel:
-                        stub = chat_pb2_grpc.ChatServiceStub(channel)
-                        request = chat_pb2.GetLeaderRequest()
-                        response = stub.GetLeader(request)
-                        if response.leader_address:
-                            p = int(response.leader_address[-5:]) - config.BASE_PORT
-                            print(f"Leader found: {response.leader_address} with PID: {p}")
-                            return response.leader_address, p
-                
-                # If channel does not respond, that's not an active machine, continue
-                except grpc.RpcError:
-                    print("Addr does not work, move on...", addr)
-                    continue
-        
-        # If no combination of machine is available, return -1 
-        return "", -1
-    
-    def trigger_leader_election(self):
         """
-        Replica with the lowest process ID becomes the new leader.
+        Ask the members we remember, then every address of the first JOIN_SCAN_PIDS pids, who the leader is.
+        A server that still names us as leader (it has not noticed we restarted) does not count.
+        Return: leader address, leader pid, and whether any server answered at all
         """
-        with self.db_connection:
+        addrs = [addr for p, addr in self.members_rows() if p != self.pid]
+        addrs += [f"{host}:{config.BASE_PORT+p}" for host in config.ALL_HOSTS for p in range(config.JOIN_SCAN_PIDS) if p != self.pid]
+        answered = False
+        for addr in dict.fromkeys(addrs):
+            print("Trying...", addr)
+            try:
+                # Query host for leader
+                with grpc.insecure_channel(addr) as channel:
+                    stub = chat_pb2_grpc.ChatServiceStub(channel)
+                    request = chat_pb2.GetLeaderRequest()
+                    response = stub.GetLeader(request, timeout=config.LEADER_DISCOVERY_RPC_TIMEOUT)
+            # If channel does not respond, that's not an active machine, continue
+            except grpc.RpcError:
+                print("Addr does not work, move on...", addr)
+                continue
+            answered = True
+            if response.leader_address and response.leader_pid != self.pid:
+                print(f"Leader found: {response.leader_address} with PID: {response.leader_pid}")
+                return response.leader_address, response.leader_pid, True
+
+        # If no server names a leader, return -1
+        return "", -1, answered
+
+    def join_cluster(self):
+        """
+        Called at startup, before we serve anything: register with the leader as a follower and catch up from it.
+        If no leader answers, the election timer takes over, and only a majority of the persisted membership can elect one.
+        A server that remembers no other member is new, so it waits until a leader answers. The one exception is
+        pid 0 when no server answers at all: it starts a new cluster, which it leads once it wins its first election alone.
+        """
+        while True:
+            leader_addr, leader, answered = self.find_leader()
+            if leader_addr and self.notify_leader_new_database(leader_addr):
+                self.follow_leader(leader, leader_addr)
+                return
+            if len(self.members_rows()) > 1 or (self.pid == 0 and not answered):
+                print(f"[SERVER {self.pid}] No leader answered; waiting for an election.")
+                return
+            print(f"[SERVER {self.pid}] Waiting for a leader to join...")
+            time.sleep(config.ELECTION_TIMEOUT_MIN)
+
+    def load_election_state(self):
+        """
+        Return: persisted current term and the pid we voted for in it (or None)
+        """
+        with self.transaction(write=False):
             cursor = self.db_connection.cursor()
-            cursor.execute("SELECT pid FROM registry")
-            pids = cursor.fetchall()
-        
-        # Set new leader as minimum PID
-        new_leader = min(pids)[0]
-        self.leader = new_leader
-        print(f"[SERVER {self.pid}] Replica {new_leader} becoming the new leader.")
-        if new_leader == self.pid:
-            self.IS_LEADER = True
+            cursor.execute("SELECT term, voted_for FROM replication_state")
+            return cursor.fetchone()
+
+    def persist_election_state(self):
+        """
+        Write the current term and vote to disk; must be done before answering anyone.
+        Called with raft_lock held.
+        """
+        with self.transaction():
+            cursor = self.db_connection.cursor()
+            cursor.execute("UPDATE replication_state SET term = ?, voted_for = ?", (self.current_term, self.voted_for))
+
+    def observe_term(self, term):
+        """
+        Adopt a newer term seen in any message. We forget the old leader; if we were it, we step down.
+        Return: our current term
+        """
+        with self.raft_lock:
+            if term > self.current_term:
+                if self.IS_LEADER:
+                    print(f"[SERVER {self.pid}] Saw newer term {term}; stepping down as leader.")
+                self.IS_LEADER = False              # before the term moves on (see log_write)
+                self.current_term = term
+                self.voted_for = None
+                self.leader = -1
+                self.leader_addr = ""
+                self.persist_election_state()
+                self.renew_lease(0.0)
+                self.notify_membership_change()
+            return self.current_term
+
+    def follow_leader(self, pid, addr):
+        """
+        Record the leader of the current term, and reset the election timer.
+        """
+        with self.raft_lock:
+            changed = (pid != self.leader)
+            if changed:
+                print(f"[SERVER {self.pid}] Replica {pid} is the leader for term {self.current_term}.")
+            self.leader = pid
+            self.leader_addr = addr
+            self.IS_LEADER = (pid == self.pid)
+            self.election_timer = time.time()
+            if changed:
+                self.notify_membership_change()
+
+    def renew_lease(self, expiry):
+        """
+        Set when the leader's read lease ends (0 to drop it), and wake up reads waiting for it.
+        """
+        with self.lease_cond:
+            self.lease_expiry = expiry
+            self.lease_cond.notify_all()
+
+    def wait_for_lease(self):
+        """
+        Wait up to one heartbeat round for a valid lease, e.g. right after winning an election.
+        Return: whether we are the leader and hold an unexpired lease
+        """
+        deadline = time.time() + config.HEARTBEAT_INTERVAL + config.HEARTBEAT_RPC_TIMEOUT
+        with self.lease_cond:
+            while self.IS_LEADER and time.time() >= self.lease_expiry:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.lease_cond.wait(remaining)
+            return self.IS_LEADER
+
+    def check_read_lease(self, context):
+        """
+        Reject a read on the leader once its lease has expired; a newer leader may have taken writes we lack.
+        Replicas are not affected.
+        """
+        if self.IS_LEADER and not self.wait_for_lease():
+            print(f"[SERVER {self.pid}] Rejecting read: leader lease expired.")
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Leader lease expired")
+
+    def check_read_freshness(self, request, context):
+        """
+        Decide whether this server may answer a read.
+        The leader answers while it holds a valid lease; once it expired, a read with a staleness bound is refused,
+        since a newer leader may have taken writes we lack.
+        A replica must have applied request.min_seq, and must have applied the leader's committed log as of
+        at most request.max_staleness seconds ago; otherwise the client reads elsewhere.
+        A read with no staleness bound (0) is a follower read: any server that applied min_seq answers it,
+        a leader without a lease included, even while no leader can be elected.
+        """
+        if self.IS_LEADER and (request.max_staleness or self.wait_for_lease()):
+            self.check_read_lease(context)
+            return
+        if request.min_seq:
+            with self.transaction(write=False):
+                applied = self.get_last_seq(self.db_connection.cursor())
+            if applied < request.min_seq:
+                context.abort(grpc.StatusCode.UNAVAILABLE, f"Replica has only applied seq {applied}")
+        if request.max_staleness and time.time() - self.synced_at > request.max_staleness:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Replica is too far behind the leader")
+
+    def note_leader_position(self, commit_seq):
+        """
+        Called on a heartbeat from the leader, which says how far a majority held its log.
+        If we have applied that much, we are in sync as of now; otherwise we remember when the leader was there,
+        and are in sync as of that time once we apply it (see note_applied), so a replica that trails the leader
+        by a batch in flight still answers bounded-staleness reads.
+        A commit_seq of 0 only puts a replica with an empty log in sync: a new leader sends 0 until an entry of
+        its own term is committed, which says nothing about the entries we hold.
+        """
+        now = time.time()
+        with self.sync_lock:
+            # Read under the lock, so a batch committed meanwhile finds this position in note_applied
+            with self.transaction(write=False):
+                applied = self.get_last_seq(self.db_connection.cursor())
+            self.leader_commit_seq = max(self.leader_commit_seq, commit_seq)
+            if commit_seq == 0 and applied > 0:
+                return
+            if applied >= commit_seq:
+                self.synced_at = max(self.synced_at, now)
+            else:
+                self.leader_positions.append((commit_seq, now))
+
+    def note_applied(self, applied):
+        """
+        Called once log entries up to applied are committed: we are in sync as of the newest leader position they reach.
+        """
+        with self.sync_lock:
+            while self.leader_positions and self.leader_positions[0][0] <= applied:
+                _, at = self.leader_positions.popleft()
+                self.synced_at = max(self.synced_at, at)
+
+    def RequestVote(self, request, context):
+        """
+        Decide whether to vote for a candidate.
+        We grant one vote per term, and only to a candidate whose log is at least as up to date as ours.
+        Pre-votes change no state and are refused while we still hear from a leader,
+        so a server that was cut off cannot depose a healthy leader by inflating its term.
+        Return: VoteResponse (our term, vote granted, leader we follow)
+        """
+        with self.raft_lock:
+            with self.transaction(write=False):
+                last_seq, last_term = self.get_last_log_position(self.db_connection.cursor())
+            log_ok = (request.last_term, request.last_seq) >= (last_term, last_seq)
+
+            if request.pre_vote:
+                leader_alive = self.IS_LEADER or time.time() - self.election_timer < config.ELECTION_TIMEOUT_MIN
+                granted = request.term > self.current_term and log_ok and not leader_alive
+                leader_addr = self.leader_addr if self.leader >= 0 and leader_alive else ""
+                return chat_pb2.VoteResponse(term=self.current_term, vote_granted=granted,
+                                             leader_pid=self.leader, leader_addr=leader_addr)
+
+            self.observe_term(request.term)
+            granted = request.term == self.current_term and log_ok and self.voted_for in (None, request.candidate_pid)
+            if granted:
+                self.voted_for = request.candidate_pid
+                self.persist_election_state()
+                self.election_timer = time.time()
+                print(f"[SERVER {self.pid}] Voted for replica {request.candidate_pid} in term {request.term}.")
+            return chat_pb2.VoteResponse(term=self.current_term, vote_granted=granted)
+
+    def request_votes(self, peers, request):
+        """
+        Ask all peers for their vote at once, each with a deadline.
+        Return: list of VoteResponses from the peers that answered
+        """
+        calls = [self.get_peer_stub(addr).RequestVote.future(request, timeout=config.HEARTBEAT_RPC_TIMEOUT)
+                 for _, addr in peers]
+        responses = []
+        for call in calls:
+            try:
+                responses.append(call.result())
+            except grpc.RpcError:
+                continue
+        return responses
+
+    def trigger_leader_election(self):
+        """
+        Raft-style election, run once no leader has contacted us for an election timeout.
+        A pre-vote round checks that we could win; then we move to a new term, vote for ourselves,
+        and ask every member of the cluster. Votes from a majority of the whole membership (servers that
+        are down included) make us leader, so a minority cut off from the rest can never elect one.
+        Only a candidate with the most up-to-date log can collect them, so writes acknowledged by a
+        majority survive the failover.
+        """
+        peers = [(replica_id, addr) for replica_id, addr in self.members_rows() if replica_id != self.pid]
+        majority = self.quorum()
+        with self.transaction(write=False):
+            last_seq, last_term = self.get_last_log_position(self.db_connection.cursor())
+
+        # Pre-vote: would a majority vote for us in the next term?
+        request = chat_pb2.VoteRequest(term=self.current_term + 1, candidate_pid=self.pid, candidate_addr=self.addr,
+                                       last_seq=last_seq, last_term=last_term, pre_vote=True)
+        responses = self.request_votes(peers, request)
+        if 1 + sum(response.vote_granted for response in responses) < majority:
+            # A peer still hears from a leader that is not reaching us (e.g. it dropped us): rejoin it
+            leaders = [(response.leader_pid, response.leader_addr) for response in responses
+                       if response.leader_addr and response.leader_pid != self.pid]
+            if leaders:
+                self.rejoin_leader(*leaders[0])
+            return
+
+        # Election: start a new term and vote for ourselves
+        with self.raft_lock:
+            self.current_term += 1
+            self.voted_for = self.pid
+            self.IS_LEADER = False
+            self.leader = -1
+            self.leader_addr = ""
+            self.persist_election_state()
+            self.renew_lease(0.0)
+            self.notify_membership_change()
+            term = self.current_term
+        print(f"[SERVER {self.pid}] Starting election for term {term}.")
+        request.term = term
+        request.pre_vote = False
+        responses = self.request_votes(peers, request)
+        for response in responses:
+            if response.term > term:
+                self.observe_term(response.term)
+                return
+
+        votes = 1 + sum(response.vote_granted for response in responses)
+        with self.raft_lock:
+            # Another leader may have contacted us for this term in the meantime
+            if votes >= majority and self.current_term == term and self.leader < 0:
+                print(f"[SERVER {self.pid}] Replica {self.pid} becoming the new leader.")
+                with self.replication_cond:
+                    self.commit_seq = 0     # until commit_new_term, heartbeats do not vouch for a stale position
+                self.follow_leader(self.pid, self.addr)
+        if self.IS_LEADER and self.current_term == term:
+            threading.Thread(target=self.commit_new_term, daemon=True).start()
+
+    def commit_new_term(self):
+        """
+        Log and replicate an empty entry right after winning an election. Entries of earlier terms only
+        count as committed once one of our own term reaches a majority, e.g. for a retry of a write the
+        old leader logged.
+        """
+        try:
+            entry = self.run_write(lambda: self.log_write("NewTerm", chat_pb2.GenericResponse()))
+        except NotLeader:
+            return
+        self.replicate_to_replicas(entry)
+
+    def rejoin_leader(self, pid, addr):
+        """
+        Re-register with a leader that is alive but not sending us heartbeats, and catch up from it.
+        """
+        print(f"[SERVER {self.pid}] Leader {pid} is alive but not reaching us; rejoining it.")
+        if self.notify_leader_new_database(addr):
+            self.follow_leader(pid, addr)
+
+    def start_resync(self, leader_addr):
+        """
+        Replace our diverged state with a full copy from the leader, in the background.
+        """
+        with self.raft_lock:
+            if self.resyncing:
+                return
+            self.resyncing = True
+
+        def resync():
+            try:
+                self.notify_leader_new_database(leader_addr, full_copy=True)
+            finally:
+                self.resyncing = False
+        threading.Thread(target=resync, daemon=True).start()
+
+    def election_loop(self):
+        """
+        Start an election whenever the election timer runs out.
+        Each round draws a random timeout, so two servers rarely become candidates at once.
+        """
+        while True:
+            timeout = random.uniform(config.ELECTION_TIMEOUT_MIN, config.ELECTION_TIMEOUT_MAX)
+            # wake up regularly, since the heartbeat loop may move the timer forward
+            while (remaining := self.election_timer + timeout - time.time()) > 0:
+                time.sleep(min(remaining, config.HEARTBEAT_INTERVAL))
+            if not self.IS_LEADER:
+                self.trigger_leader_election()
+            self.election_timer = time.time()
+
+    def start_election_timer(self):
+        """
+        Start the election timer.
+        """
+        threading.Thread(target=self.election_loop, daemon=True).start()
 
 
     # ++++++++++++++  Functions: Heartbeat  ++++++++++++++ #
     def Heartbeat(self, request, context):
         """
         Respond to heartbeat pings.
-        For leader: record the heartbeat from the replica.
+        A heartbeat from the leader of our current (or a newer) term resets our election timer.
+        Return: HeartbeatResponse (alive, our term)
         """
-        return chat_pb2.HeartbeatResponse(alive=True)
+        term = self.observe_term(request.term)
+        if request.is_leader and request.term == term:
+            self.follow_leader(request.pid, request.addr)
+            self.note_leader_position(request.commit_seq)
+        return chat_pb2.HeartbeatResponse(alive=True, term=term)
     
     def heartbeat_loop(self):
         """
         Create a loop to send and receive heartbeats.
+        All peers are pinged at once with a deadline, so one hung peer cannot stall the others.
+        Departed peers are pinged too: one that answers is re-added, and its newer term (if any) deposes us.
+        If a majority of the cluster's members acked the leader's round, its read lease is renewed.
         """
-        time.sleep(1)
+        time.sleep(config.HEARTBEAT_INTERVAL)
         while True:
-            # send heartbeat ping to all active replicas
-            with self.db_connection:
-                cursor = self.db_connection.cursor()
-                cursor.execute("SELECT pid, addr FROM registry")
-                for replica_id, addr in cursor.fetchall():
-                    # don't send to yourself
-                    if replica_id == self.pid:
-                        cursor.execute("UPDATE registry SET timestamp = ? WHERE pid = ?", (time.time(), self.pid,))
-                        continue
-                    
-                    # try sending to other channel
-                    try:
-                        with grpc.insecure_channel(addr) as channel:
-                            stub = chat_pb2_grpc.ChatServiceStub(channel)
-                            hb_request = chat_pb2.HeartbeatRequest()
-                            response = stub.Heartbeat(hb_request)
-                            
-                            # if alive, update DB
-                            if response.alive:
-                                with self.db_connection:
-                                    cursor = self.db_connection.cursor()
-                                    cursor.execute("UPDATE registry SET timestamp = ? WHERE pid = ?", (time.time(), replica_id,))
-                                print(f"[SERVER {self.pid}] Replica {replica_id} is alive!")
-                    except Exception as e:
-                        print(f"[SERVER {self.pid}] Heartbeat failed for replica {replica_id}.  Trying again...")
-            
-            # check which peers have not responded
+            # get the peers to ping (don't send to yourself)
+            peers = [(replica_id, addr) for replica_id, _, addr in self.registry_rows() if replica_id != self.pid]
+            departed = self.registry_departed()
+
+            # send heartbeat ping to all peers concurrently over the pooled channels
+            round_start = time.time()
+            hb_request = chat_pb2.HeartbeatRequest(term=self.current_term, pid=self.pid, addr=self.addr, is_leader=self.IS_LEADER)
+            if hb_request.is_leader:
+                hb_request.commit_seq = self.commit_seq
+            calls = [(replica_id, addr, self.get_peer_stub(addr).Heartbeat.future(hb_request, timeout=config.HEARTBEAT_RPC_TIMEOUT))
+                     for replica_id, addr in peers + departed]
+            alive = [self.pid]
+            failed = []
+            returned = []
+            for replica_id, addr, call in calls:
+                try:
+                    response = call.result()
+                    # A peer in a newer term means a new leader was elected
+                    if response.term > self.current_term:
+                        self.observe_term(response.term)
+                    if (replica_id, addr) in departed:
+                        returned.append((replica_id, addr))
+                    elif response.alive:
+                        alive.append(replica_id)
+                        self.failure_detector.heartbeat(replica_id, time.time())
+                except grpc.RpcError:
+                    if (replica_id, addr) not in departed:
+                        failed.append(replica_id)
+                        print(f"[SERVER {self.pid}] Heartbeat failed for replica {replica_id} (suspicion {self.peer_suspicion(replica_id):.1f}).  Trying again...")
+
+            # a majority of the whole membership (not just of the live registry) acked this round in our term:
+            # no other leader can be elected before the lease ends
+            acks = len(alive) + len(returned)
+            if hb_request.is_leader and self.IS_LEADER and self.current_term == hb_request.term and acks >= self.quorum():
+                self.renew_lease(round_start + config.LEADER_LEASE_DURATION)
+
+            # record all results in memory; a suspected leader brings the next election forward
             current_time = time.time()
-            with self.db_connection:
-                cursor = self.db_connection.cursor()
-                cursor.execute("SELECT pid FROM registry")
-                pids = cursor.fetchall()
-                for replica_id in pids:
-                    replica_id = replica_id[0]
-                    if replica_id == self.pid:
-                        continue
-                    cursor.execute("SELECT timestamp FROM registry WHERE pid = ?", (replica_id,))
-                    last_hb = cursor.fetchone()[0]  # Fetch the result (single row)
-                    if current_time - last_hb > config.HEARTBEAT_TIMEOUT:
-                        print(f"[SERVER {self.pid}] Replica {replica_id} is considered dead. {current_time} {last_hb, {current_time-last_hb}}")
-                        # let replicas remove the registry (if already deleted, ignore)
-                        # If dead and in the list, remove it
-                        with self.db_connection:
-                            cursor = self.db_connection.cursor()
-                            cursor.execute("DELETE FROM registry WHERE pid = ?", (replica_id,))
-                        if replica_id == self.leader:
-                            self.trigger_leader_election()
+            self.check_leader(current_time)
+            self.registry_heard_from(alive, current_time)
+            self.registry_mark_suspect(failed)
+            dead = [(replica_id, last_hb) for replica_id, last_hb, _ in self.registry_rows()
+                    if replica_id != self.pid and not self.is_peer_alive(replica_id, last_hb, current_time)]
+
+            for replica_id, last_hb in dead:
+                print(f"[SERVER {self.pid}] Replica {replica_id} is considered dead. {current_time} {last_hb, {current_time-last_hb}}")
+                self.failure_detector.remove(replica_id)
+            if dead:
+                self.registry_remove([replica_id for replica_id, _ in dead])
+                self.refresh_peer_channels()
+            # a leader we never heard from is only dropped by HEARTBEAT_TIMEOUT, without the detector suspecting it
+            if self.leader in [replica_id for replica_id, _ in dead] and not self.IS_LEADER:
+                self.election_timer = min(self.election_timer, current_time - config.ELECTION_TIMEOUT_MIN)
+
+            # departed peers that answer are back: re-add them, and as leader bring them up to date
+            for replica_id, addr in returned:
+                print(f"[SERVER {self.pid}] Replica {replica_id} answered again; re-adding it.")
+                self.registry_add(replica_id, addr)
+                if self.IS_LEADER:
+                    self.catch_up_peer(replica_id, addr)
             time.sleep(config.HEARTBEAT_INTERVAL)
 
+    def check_leader(self, current_time):
+        """
+        As a follower, ask the failure detector about the leader. Once it suspects the leader,
+        move the election timer back so an election starts after just the random part of the timeout.
+        Return: whether the leader is suspected
+        """
+        if self.IS_LEADER or self.leader in (-1, self.pid) or not self.failure_detector.is_suspect(self.leader, current_time):
+            return False
+        if self.election_timer > current_time - config.ELECTION_TIMEOUT_MIN:
+            print(f"[SERVER {self.pid}] Leader {self.leader} is suspected (suspicion {self.peer_suspicion(self.leader):.1f}); starting an election.")
+            self.election_timer = current_time - config.ELECTION_TIMEOUT_MIN
+        return True
+
+    def is_peer_alive(self, replica_id, last_hb, current_time):
+        """
+        Ask the failure detector whether a peer is still alive.
+        HEARTBEAT_TIMEOUT remains a hard limit, e.g. for peers we never heard from.
+        """
+        if current_time - last_hb > config.HEARTBEAT_TIMEOUT:
+            return False
+        return not self.failure_detector.is_suspect(replica_id, current_time)
+
+    def peer_suspicion(self, replica_id):
+        """
+        Return the failure detector's current suspicion level for a peer, reported when its heartbeat fails.
+        """
+        return self.failure_detector.suspicion(replica_id, time.time())
+
     def start_heartbeat(self):
         """
         Start the heartbeat loop.
@@ -883,19 +2581,125 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         threading.Thread(target=self.heartbeat_loop, daemon=True).start()
 
 
+# ++++++++++++++  Class Definition: asyncio Server  ++++++++++++++ #
+class LoopQueue:
+    """
+    Queue of messages for one user that any thread can put into, read by a coroutine on the server's event loop.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        """Add an item; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        """Return: the next item, once there is one"""
+        return await self.queue.get()
+
+    def hand_off(self, other):
+        """Move the waiting items to another LoopQueue, then end this one with None; call on the event loop only."""
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                other.queue.put_nowait(item)
+        self.queue.put_nowait(None)
+
+
+class AsyncChatService(ChatService):
+    """
+    ChatService for a grpc.aio server (--aio).
+    The long-lived streams (ReceiveMessageStream, WatchLeader) are async generators that sleep on an asyncio queue or event,
+    so an idle subscriber costs a suspended coroutine instead of a worker thread, and nothing wakes up to poll.
+    Every other RPC is the threaded implementation, run by the server's thread pool (writes still go through the writer thread).
+    """
+    def __init__(self, pid, host, loop):
+        self.loop = loop
+        self.membership_events = set()   # One event per open WatchLeader stream; only used on the event loop
+        super().__init__(pid, host)
+
+    def new_message_queue(self):
+        """
+        Return: an empty queue of messages to push to a user, read by their ReceiveMessageStream coroutine
+        """
+        return LoopQueue(self.loop)
+
+    def hand_off_messages(self, previous, message_queue):
+        """
+        Like ChatService.hand_off_messages, but on the event loop: puts into the old queue that were scheduled before
+        the swap run first, so none is left behind, and puts into the new queue (scheduled after) land behind the moved ones.
+        """
+        self.loop.call_soon_threadsafe(previous.hand_off, message_queue)
+
+    async def ReceiveMessageStream(self, request, context):
+        """
+        Push messages to a user as they arrive, until they disconnect (which cancels us), log out or open a newer stream.
+        """
+        username = request.username
+        print(f"[SERVER {self.pid}] {username} connected to message stream.")
+        message_queue = self.attach_message_queue(username)
+
+        try:
+            while (message := await message_queue.get()) is not None:
+                yield message
+        finally:
+            with self.lock:
+                if self.message_queues.get(username) is message_queue:
+                    self.active_users.pop(username, None)    # Mark user as offline when they disconnect
+                    self.message_queues.pop(username, None)  # Clean up queue
+            print(f"[SERVER {self.pid}] {username} disconnected from message stream.")
+
+    async def WatchLeader(self, request, context):
+        """
+        Stream the leader and membership to a client: once right away, then on every change.
+        """
+        changed = asyncio.Event()
+        self.membership_events.add(changed)
+        try:
+            while True:
+                changed.clear()
+                yield await asyncio.to_thread(self.leader_info)
+                await changed.wait()
+        finally:
+            self.membership_events.discard(changed)
+
+    def notify_membership_change(self):
+        """
+        Wake every WatchLeader stream after the leader or the registry changed.
+        """
+        super().notify_membership_change()
+        self.loop.call_soon_threadsafe(self.wake_watchers)
+
+    def wake_watchers(self):
+        """
+        Runs on the event loop: wake every WatchLeader coroutine.
+        """
+        for changed in self.membership_events:
+            changed.set()
+
+
+
 # ++++++++++++++  Serve Functions  ++++++++++++++ #
-def serve(pid, host):
+def serve(pid, host, unary_workers=config.SERVER_UNARY_WORKERS, stream_workers=config.SERVER_STREAM_WORKERS,
+          max_concurrent_rpcs=config.SERVER_MAX_CONCURRENT_RPCS):
     """
     Create a communication point for a server for clients to connect to.
+    Open streams may use at most stream_workers of the worker threads, so unary calls always find one of the others.
     """
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=unary_workers + stream_workers),
+                         interceptors=[StreamBudgetInterceptor(stream_workers)],
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
     chat_service = ChatService(pid, host)
     chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
     server_port = config.BASE_PORT + chat_service.pid
     server.add_insecure_port(f'{host}:{server_port}')
     server.start()
     print(f"[SERVER {chat_service.pid}] Started!")
+    chat_service.start_writer()
+    chat_service.start_replication()
     chat_service.start_heartbeat()
+    chat_service.start_election_timer()
     try:
         # Use a long sleep loop to keep the main thread alive
         while True:
@@ -904,6 +2708,31 @@ def serve(pid, host):
         print("KeyboardInterrupt received, stopping server gracefully...")
         server.stop(0)  # Gracefully shutdown the server
 
+async def serve_aio(pid, host, unary_workers=config.SERVER_UNARY_WORKERS,
+                    max_concurrent_rpcs=config.SERVER_ASYNC_MAX_CONCURRENT_RPCS):
+    """
+    Like serve, on a grpc.aio server (see AsyncChatService).
+    Open message and leader streams hold no thread, so the pool only needs unary_workers.
+    """
+    loop = asyncio.get_running_loop()
+    # A burst of new calls (e.g. every client reconnecting after a failover) waits for the event loop instead of being cancelled
+    options = [("grpc.server.max_pending_requests", max_concurrent_rpcs),
+               ("grpc.server.max_pending_requests_hard_limit", max_concurrent_rpcs)]
+    server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=unary_workers),
+                             maximum_concurrent_rpcs=max_concurrent_rpcs, options=options)
+    # Setting up contacts the leader, which blocks: keep the event loop free meanwhile
+    chat_service = await asyncio.to_thread(AsyncChatService, pid, host, loop)
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
+    server_port = config.BASE_PORT + chat_service.pid
+    server.add_insecure_port(f'{host}:{server_port}')
+    await server.start()
+    print(f"[SERVER {chat_service.pid}] Started!")
+    chat_service.start_writer()
+    chat_service.start_replication()
+    chat_service.start_heartbeat()
+    chat_service.start_election_timer()
+    await server.wait_for_termination()
+
 
 
 # ++++++++++++++  Main Functions  ++++++++++++++ #
@@ -912,8 +2741,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the server with a specific PID.")
     parser.add_argument('--pid', type=int, help="The PID of the server to run.  Example: 0", required=True)
     parser.add_argument('--host', type=str, help="4-digit IP host address.  Example: 127.0.0.1", required=True)
+    parser.add_argument('--unary-workers', type=int, default=config.SERVER_UNARY_WORKERS, help="Worker threads kept for unary calls")
+    parser.add_argument('--stream-workers', type=int, default=config.SERVER_STREAM_WORKERS, help="Max streams open at once")
+    parser.add_argument('--max-concurrent-rpcs', type=int, help="Max calls accepted at once")
+    parser.add_argument('--aio', action=argparse.BooleanOptionalAction, default=config.SERVER_ASYNC, help="Run the grpc.aio server")
     args = parser.parse_args()
     pid = args.pid
     host = args.host
-    serve(pid, host)
+    if args.aio:
+        asyncio.run(serve_aio(pid, host, args.unary_workers, args.max_concurrent_rpcs or config.SERVER_ASYNC_MAX_CONCURRENT_RPCS))
+    else:
+        serve(pid, host, args.unary_workers, args.stream_workers, args.max_concurrent_rpcs or config.SERVER_MAX_CONCURRENT_RPCS)
     
\ No newline at end of file
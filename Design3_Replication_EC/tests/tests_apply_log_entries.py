@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from server import server
+from comm import chat_pb2
+
+class TestApplyLogEntries(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Start a lone server 0 (no other server answers, so it joins nobody) on a database of its own.
+        """
+        self.saved_folder = server.database_folder
+        server.database_folder = tempfile.mkdtemp()
+        self.service = server.ChatService(0, "127.0.0.1")
+
+    def tearDown(self):
+        server.database_folder, folder = self.saved_folder, server.database_folder
+        shutil.rmtree(folder)
+
+    def entry(self, seq, method, request):
+        return chat_pb2.ReplicationRequest(method=method, payload=request.SerializeToString(), seq=seq, term=1)
+
+    def query(self, sql):
+        with self.service.transaction(write=False):
+            return self.service.db_connection.execute(sql).fetchall()
+
+    def test_failed_entry_is_rolled_back_and_not_logged(self):
+        """
+        An entry whose handler writes part of its change and then reports failure is undone and not logged;
+        applying stops there, with the entries before it kept.
+        """
+        def failing_create_account(request, context):
+            # Half of a write, then an error reported in the response, as the handlers do
+            self.service.db_connection.execute("INSERT INTO accounts (username, pwd, logged_in) VALUES (?, 'hash', 0)",
+                                               (request.username,))
+            return chat_pb2.GenericResponse(success=False, message="Create account error")
+
+        entries = [self.entry(1, "CreateAccount", chat_pb2.CreateAccountRequest(username="applied", password_hash="hash"))]
+        with self.service.transaction():
+            self.assertEqual(self.service.apply_log_entries(entries, None), (True, 1))
+
+        self.service.CreateAccount = failing_create_account
+        entries = [self.entry(2, "CreateAccount", chat_pb2.CreateAccountRequest(username="half_applied", password_hash="hash")),
+                   self.entry(3, "Logout", chat_pb2.LogoutRequest(username="applied"))]
+        with self.service.transaction():
+            self.assertEqual(self.service.apply_log_entries(entries, None), (False, 1))
+
+        self.assertEqual(self.query("SELECT username, logged_in FROM accounts"), [("applied", 1)])
+        self.assertEqual(self.query("SELECT seq FROM replication_log"), [(1,)])
+        self.assertEqual(self.query("SELECT last_seq FROM replication_state"), [(1,)])
+
+if __name__ == '__main__':
+    unittest.main()
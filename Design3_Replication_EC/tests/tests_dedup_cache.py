@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from server.dedup_cache import DedupCache
+
+class TestDedupCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DedupCache(max_size=2, ttl=10)
+
+    def test_retry_gets_first_response(self):
+        """
+        Once a write finished, its request id returns the recorded response instead of running again.
+        """
+        self.assertIsNone(self.cache.begin("a", 0.0))
+        self.cache.finish("a", "response a", 0.0)
+        self.assertEqual(self.cache.begin("a", 1.0), "response a")
+
+    def test_entries_expire(self):
+        """
+        A response is forgotten after the TTL.
+        """
+        self.cache.begin("a", 0.0)
+        self.cache.finish("a", "response a", 0.0)
+        self.assertIsNone(self.cache.begin("a", 10.5))
+
+    def test_least_recently_used_is_evicted(self):
+        """
+        Beyond max_size, the entry used longest ago is dropped.
+        """
+        for request_id in ("a", "b"):
+            self.cache.begin(request_id, 0.0)
+            self.cache.finish(request_id, f"response {request_id}", 0.0)
+        self.assertEqual(self.cache.begin("a", 1.0), "response a")
+        self.cache.begin("c", 1.0)
+        self.cache.finish("c", "response c", 1.0)
+        self.assertEqual(self.cache.begin("a", 2.0), "response a")
+        self.assertIsNone(self.cache.begin("b", 2.0))
+
+    def test_failed_write_can_be_retried(self):
+        """
+        A write that failed without a response leaves nothing behind, so its retry runs.
+        """
+        self.cache.begin("a", 0.0)
+        self.cache.finish("a", None, 0.0)
+        self.assertIsNone(self.cache.begin("a", 1.0))
+
+    def test_concurrent_retry_waits_for_first_attempt(self):
+        """
+        A retry that arrives while the first attempt is still running gets its response once it finishes.
+        """
+        self.assertIsNone(self.cache.begin("a"))
+        results = []
+        retry = threading.Thread(target=lambda: results.append(self.cache.begin("a")))
+        retry.start()
+        time.sleep(0.1)
+        self.assertEqual(results, [])
+        self.cache.finish("a", "response a")
+        retry.join(timeout=1)
+        self.assertEqual(results, ["response a"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from server.failure_detector import FixedTimeoutDetector, PhiAccrualDetector
+
+INTERVAL = 0.2
+
+def regular_heartbeats(detector, pid, count, interval=INTERVAL):
+    """
+    Feed `count` evenly spaced heartbeats to a detector.
+    Return: timestamp of the last heartbeat
+    """
+    timestamp = 0.0
+    for _ in range(count):
+        detector.heartbeat(pid, timestamp)
+        timestamp += interval
+    return timestamp - interval
+
+class TestFailureDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.phi = PhiAccrualDetector(threshold=8, window=100, min_std=0.05, acceptable_pause=0.1, first_interval=INTERVAL)
+
+    def test_unknown_peer_is_available(self):
+        """
+        A peer we never heard from has no suspicion yet.
+        """
+        self.assertEqual(self.phi.suspicion(1, 100.0), 0.0)
+        self.assertTrue(self.phi.is_available(1, 100.0))
+
+    def test_phi_grows_with_silence(self):
+        """
+        Phi increases the longer a regular peer stays silent.
+        """
+        last = regular_heartbeats(self.phi, 1, 50)
+        levels = [self.phi.suspicion(1, last + gap) for gap in (0.1, 0.3, 0.5, 1.0, 100.0)]
+        self.assertEqual(levels, sorted(levels))
+        self.assertTrue(levels[-1] > 1000)
+
+    def test_phi_detects_crash_within_a_second(self):
+        """
+        With regular heartbeats, a crash is detected well under a second later,
+        but an on-time heartbeat is never suspected.
+        """
+        last = regular_heartbeats(self.phi, 1, 50)
+        self.assertTrue(self.phi.is_available(1, last + INTERVAL))
+        self.assertFalse(self.phi.is_available(1, last + 0.8))
+
+    def test_phi_tolerates_jittery_peer(self):
+        """
+        A peer with irregular heartbeats gets more slack than a regular one.
+        """
+        jittery = PhiAccrualDetector(threshold=8, window=100, min_std=0.05, acceptable_pause=0.1, first_interval=INTERVAL)
+        timestamp = 0.0
+        for i in range(50):
+            jittery.heartbeat(1, timestamp)
+            timestamp += 0.05 if i % 2 else 0.6
+        last = timestamp - 0.6
+        regular_last = regular_heartbeats(self.phi, 1, 50)
+        self.assertTrue(jittery.suspicion(1, last + 0.8) < self.phi.suspicion(1, regular_last + 0.8))
+        self.assertTrue(jittery.is_available(1, last + 0.8))
+
+    def test_remove_forgets_history(self):
+        """
+        Removing a peer resets its suspicion.
+        """
+        last = regular_heartbeats(self.phi, 1, 10)
+        self.phi.remove(1)
+        self.assertEqual(self.phi.suspicion(1, last + 100.0), 0.0)
+
+    def test_stopped_heartbeats_make_peer_suspect(self):
+        """
+        A peer is not suspected while its heartbeats arrive, and is once they stop;
+        a peer we never heard from is not suspected.
+        """
+        last = regular_heartbeats(self.phi, 1, 50)
+        self.assertFalse(self.phi.is_suspect(1, last + INTERVAL))
+        self.assertTrue(self.phi.is_suspect(1, last + 1.0))
+        self.assertFalse(self.phi.is_suspect(2, last + 1.0))
+
+    def test_fixed_timeout(self):
+        """
+        The fixed detector declares a peer dead exactly after its timeout.
+        """
+        detector = FixedTimeoutDetector(timeout=10)
+        detector.heartbeat(1, 0.0)
+        self.assertTrue(detector.is_available(1, 9.9))
+        self.assertFalse(detector.is_available(1, 10.1))
+
+if __name__ == '__main__':
+    unittest.main()
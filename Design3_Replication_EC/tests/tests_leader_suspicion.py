@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from server import server
+from config import config
+
+class TestLeaderSuspicion(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Start a lone server 0 (no other server answers, so it joins nobody) on a database of its own,
+        and make it follow replica 1.
+        """
+        self.saved_folder = server.database_folder
+        server.database_folder = tempfile.mkdtemp()
+        self.service = server.ChatService(0, "127.0.0.1")
+        self.service.leader = 1
+        self.service.IS_LEADER = False
+
+    def tearDown(self):
+        server.database_folder, folder = self.saved_folder, server.database_folder
+        shutil.rmtree(folder)
+
+    def leader_heartbeats(self, count, last):
+        """
+        Feed the failure detector `count` regular heartbeats from the leader, the last one at `last`.
+        """
+        for i in range(count):
+            self.service.failure_detector.heartbeat(1, last - (count - 1 - i) * config.HEARTBEAT_INTERVAL)
+
+    def test_silent_leader_is_suspected_and_triggers_election(self):
+        """
+        While the leader's heartbeats arrive, it is not suspected and the election timer is left alone.
+        Once they stop, the failure detector suspects it, and the election loop starts an election
+        after just the random part of the election timeout.
+        """
+        now = time.time()
+        last = now - 2
+        self.leader_heartbeats(50, last)
+        self.service.election_timer = now
+        self.assertFalse(self.service.check_leader(last + config.HEARTBEAT_INTERVAL))
+        self.assertEqual(self.service.election_timer, now)
+
+        self.assertTrue(self.service.check_leader(now))
+        self.assertLessEqual(self.service.election_timer, now - config.ELECTION_TIMEOUT_MIN)
+
+        election = threading.Event()
+        self.service.trigger_leader_election = election.set
+        self.service.start_election_timer()
+        self.assertTrue(election.wait(config.ELECTION_TIMEOUT_MAX - config.ELECTION_TIMEOUT_MIN + 0.2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import subprocess
+import time
+import os
+import shutil
+import sys
+import grpc
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from client.chat_client import ChatClient
+from comm import chat_pb2
+from comm import chat_pb2_grpc
+from server.server_security import hash_password
+from config import config
+
+BASE_HOST = "127.0.0.1"
+BASE_PORT = config.BASE_PORT  # typically 12300
+SERVER_SCRIPT = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "server", "server.py")
+DATABASE_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "database")
+# Clients are pinned to the one server, so they do not hold a WatchLeader stream against its budget
+LEADER_ADDRESS = f"{BASE_HOST}:{BASE_PORT}"
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Clean up the database folder before each test.
+        """
+        if os.path.exists(DATABASE_DIR):
+            shutil.rmtree(DATABASE_DIR)
+        os.makedirs(DATABASE_DIR, exist_ok=True)
+        self.server = None
+        self.channel = None
+
+    def tearDown(self):
+        """
+        Close the subscribers' channel and stop the server.
+        """
+        if self.channel is not None:
+            self.channel.close()
+        if self.server is not None and self.server.poll() is None:
+            self.server.terminate()
+            try:
+                self.server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+
+    def start_leader(self, *args):
+        """
+        Start server 0 (extra command-line arguments are passed on), and return a stub for opening subscriptions.
+        """
+        self.server = subprocess.Popen(
+            ["python", SERVER_SCRIPT, "--pid", "0", "--host", BASE_HOST, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        time.sleep(2)
+        self.channel = grpc.insecure_channel(LEADER_ADDRESS)
+        return chat_pb2_grpc.ChatServiceStub(self.channel)
+
+    def subscribe(self, stub, username):
+        """
+        Return: an open ReceiveMessageStream call for username
+        """
+        return stub.ReceiveMessageStream(chat_pb2.ReceiveMessageRequest(username=username))
+
+    def test_thousands_of_subscribers_do_not_block_sends(self):
+        """
+        Test load:
+        - Start a server with room for 2100 streams, and open 2001 message streams, one per online user.
+        - Sending 20 messages still takes well under a second each, and the recipient's stream gets them.
+        """
+        stub = self.start_leader("--no-aio", "--stream-workers", "2100", "--max-concurrent-rpcs", "4000")
+        client = ChatClient(LEADER_ADDRESS)
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("load_sender", password_hash_value))
+        self.assertTrue(client.create_account("load_recipient", password_hash_value))
+        subscribers = [self.subscribe(stub, f"load_subscriber_{i}") for i in range(2000)]
+        recipient_stream = self.subscribe(stub, "load_recipient")
+        time.sleep(3)
+
+        start = time.time()
+        msg_ids = [client.send_message(0, "load_recipient", "load_sender", f"message {i}") for i in range(20)]
+        elapsed = time.time() - start
+        self.assertNotIn(0, msg_ids)
+        self.assertLess(elapsed, 5, f"20 sends took {elapsed:.1f}s with 2000 open streams")
+        self.assertEqual(next(recipient_stream).msg, "message 0")
+        for call in subscribers + [recipient_stream]:
+            call.cancel()
+
+    def test_streams_over_budget_are_refused(self):
+        """
+        Test stream budget:
+        - Start a server that allows 5 open streams, and open 5.
+        - A sixth stream is refused with RESOURCE_EXHAUSTED, while sends still go through.
+        """
+        stub = self.start_leader("--no-aio", "--stream-workers", "5", "--unary-workers", "4")
+        client = ChatClient(LEADER_ADDRESS)
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("budget_sender", password_hash_value))
+        self.assertTrue(client.create_account("budget_recipient", password_hash_value))
+        recipient_stream = self.subscribe(stub, "budget_recipient")
+        subscribers = [self.subscribe(stub, f"budget_subscriber_{i}") for i in range(4)]
+        time.sleep(1)
+
+        with self.assertRaises(grpc.RpcError) as refused:
+            next(self.subscribe(stub, "budget_subscriber_extra"))
+        self.assertEqual(refused.exception.code(), grpc.StatusCode.RESOURCE_EXHAUSTED)
+        self.assertNotEqual(client.send_message(0, "budget_recipient", "budget_sender", "hello"), 0)
+        self.assertEqual(next(recipient_stream).msg, "hello")
+        for call in subscribers + [recipient_stream]:
+            call.cancel()
+
+    def test_closed_stream_frees_its_budget_slot_at_once(self):
+        """
+        Test disconnects:
+        - Start a server that allows 5 open streams, open 5 and cancel one of them.
+        - Well within the old 5-second poll, a new stream takes the freed slot and gets its messages.
+        """
+        stub = self.start_leader("--no-aio", "--stream-workers", "5", "--unary-workers", "4")
+        client = ChatClient(LEADER_ADDRESS)
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("slot_sender", password_hash_value))
+        self.assertTrue(client.create_account("slot_recipient", password_hash_value))
+        subscribers = [self.subscribe(stub, f"slot_subscriber_{i}") for i in range(5)]
+        time.sleep(1)
+
+        subscribers.pop().cancel()
+        time.sleep(0.5)
+        recipient_stream = self.subscribe(stub, "slot_recipient")
+        self.assertNotEqual(client.send_message(0, "slot_recipient", "slot_sender", "hello"), 0)
+        self.assertEqual(next(recipient_stream).msg, "hello")
+        for call in subscribers + [recipient_stream]:
+            call.cancel()
+
+    def test_async_server_holds_idle_subscribers(self):
+        """
+        Test the grpc.aio server:
+        - Start it and open 10000 message streams, more than the threaded server's stream budget.
+        - Sends still go through quickly and reach the recipient's stream.
+        - Logging out ends the recipient's stream.
+        """
+        stub = self.start_leader("--aio")
+        client = ChatClient(LEADER_ADDRESS)
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("aio_sender", password_hash_value))
+        self.assertTrue(client.create_account("aio_recipient", password_hash_value))
+        subscribers = [self.subscribe(stub, f"aio_subscriber_{i}") for i in range(10000)]
+        recipient_stream = self.subscribe(stub, "aio_recipient")
+        time.sleep(5)
+
+        start = time.time()
+        msg_ids = [client.send_message(0, "aio_recipient", "aio_sender", f"message {i}") for i in range(20)]
+        elapsed = time.time() - start
+        self.assertNotIn(0, msg_ids)
+        self.assertLess(elapsed, 5, f"20 sends took {elapsed:.1f}s with 10000 open streams")
+        self.assertEqual([next(recipient_stream).msg for _ in range(20)], [f"message {i}" for i in range(20)])
+        self.assertTrue(client.logout("aio_recipient"))
+        self.assertEqual(list(recipient_stream), [])
+        for call in subscribers:
+            call.cancel()
+
+    def test_async_newer_stream_takes_over(self):
+        """
+        Test the grpc.aio server with two streams for one user:
+        - Open a message stream, then a second one for the same user.
+        - The first stream ends, and the second keeps getting every message sent afterwards.
+        """
+        stub = self.start_leader("--aio")
+        client = ChatClient(LEADER_ADDRESS)
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("aio_twice_sender", password_hash_value))
+        self.assertTrue(client.create_account("aio_twice_recipient", password_hash_value))
+        first_stream = self.subscribe(stub, "aio_twice_recipient")
+        time.sleep(0.5)
+        second_stream = self.subscribe(stub, "aio_twice_recipient")
+        time.sleep(0.5)
+
+        self.assertEqual(list(first_stream), [])
+        for i in range(3):
+            self.assertNotEqual(client.send_message(0, "aio_twice_recipient", "aio_twice_sender", f"message {i}"), 0)
+        self.assertEqual([next(second_stream).msg for _ in range(3)], [f"message {i}" for i in range(3)])
+        second_stream.cancel()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from server import server
+from comm import chat_pb2
+
+class TestReadFreshness(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Start a lone server 0 (no other server answers, so it joins nobody) on a database of its own, as a replica.
+        """
+        self.saved_folder = server.database_folder
+        server.database_folder = tempfile.mkdtemp()
+        self.service = server.ChatService(0, "127.0.0.1")
+        self.service.IS_LEADER = False
+
+    def tearDown(self):
+        server.database_folder, folder = self.saved_folder, server.database_folder
+        shutil.rmtree(folder)
+
+    def apply(self, *usernames):
+        """
+        Apply one CreateAccount log entry per username, after the entries already applied.
+        """
+        with self.service.transaction():
+            first = self.service.get_last_seq(self.service.db_connection.cursor()) + 1
+            entries = [chat_pb2.ReplicationRequest(method="CreateAccount", seq=first + i, term=1,
+                                                   payload=chat_pb2.CreateAccountRequest(username=username, password_hash="hash").SerializeToString())
+                       for i, username in enumerate(usernames)]
+            self.assertTrue(self.service.apply_log_entries(entries, None)[0])
+        self.service.note_applied(first + len(usernames) - 1)
+
+    def test_empty_log_is_in_sync_with_leader_at_zero(self):
+        """
+        A leader heartbeat with commit_seq 0 puts a replica with an empty log in sync,
+        but not one that holds entries.
+        """
+        self.service.note_leader_position(0)
+        self.assertGreater(self.service.synced_at, 0)
+
+        self.service.synced_at = 0.0
+        self.apply("first_user")
+        self.service.note_leader_position(0)
+        self.assertEqual(self.service.synced_at, 0.0)
+
+    def test_replica_reports_no_seq_beyond_commit(self):
+        """
+        A replica answers from every entry it applied, but reports the seq only up to the leader's commit_seq.
+        """
+        self.apply("committed_user", "uncommitted_user")
+        self.service.note_leader_position(1)
+        response = self.service.ListAccounts(chat_pb2.ListAccountsRequest(), None)
+        self.assertEqual(list(response.usernames), ["committed_user", "uncommitted_user"])
+        self.assertEqual(response.seq, 1)
+
+        self.service.note_leader_position(2)
+        self.assertEqual(self.service.ListAccounts(chat_pb2.ListAccountsRequest(), None).seq, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,17 @@ import subprocess
 import time
 import os
 import shutil
+import sqlite3
 import sys
+import grpc
+from concurrent import futures
 
 # Ensure the parent directory is in sys.path to import our modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from client.chat_client import ChatClient
+from comm import chat_pb2
+from comm import chat_pb2_grpc
 from server.server_security import hash_password
 from config import config
 
@@ -331,5 +336,444 @@ class TestReplication(unittest.TestCase):
         accounts_new = client_new.list_accounts()
         self.assertIn(username, accounts_new, "New server did not replicate account data")
 
+    def test_new_server_copies_id_counters(self):
+        """
+        Test id counters in a snapshot:
+        - Start 3 servers, create two accounts and delete the newer one, so the counter is ahead of the rows.
+        - Start a new server (PID 3), which loads a snapshot of the rows.
+        - Verify that it continues from the leader's counters, so it would assign the same ids as the leader.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+0}")
+        self.assertTrue(client.create_account("kept_user", hash_password("password1")))
+        self.assertTrue(client.create_account("deleted_user", hash_password("password2")))
+        self.assertTrue(client.delete_account("deleted_user"))
+        time.sleep(1)
+
+        self.servers.append(start_server(3))
+        time.sleep(3)
+
+        counters = []
+        for pid in [0, 3]:
+            connection = sqlite3.connect(os.path.join(DATABASE_DIR, f"chat_database_{pid}.db"))
+            counters.append(connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'accounts'").fetchone())
+            connection.close()
+        self.assertEqual(counters[0], (2,))
+        self.assertEqual(counters[1], counters[0], "New server did not copy the leader's id counters")
+
+    def test_rejoining_server_catches_up(self):
+        """
+        Test catch-up of a restarted replica:
+        - Start 3 servers.
+        - Create an account, then kill server 2.
+        - Create a second account while server 2 is down.
+        - Restart server 2.
+        - Verify that server 2 has both accounts.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+0}")
+        success = client.create_account("before_restart_user", hash_password("password1"))
+        self.assertTrue(success, "Account creation failed")
+        time.sleep(2)
+
+        # Kill server 2 and write while it is down.
+        kill_server(self.servers[2])
+        self.servers.pop(2)
+        success = client.create_account("during_restart_user", hash_password("password2"))
+        self.assertTrue(success, "Account creation failed")
+        time.sleep(1)
+
+        # Restart server 2; it should catch up from the leader's replication log.
+        self.servers.append(start_server(2))
+        time.sleep(3)
+
+        client_restarted = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+2}")
+        accounts = client_restarted.list_accounts()
+        self.assertIn("before_restart_user", accounts, "Restarted server lost its old data")
+        self.assertIn("during_restart_user", accounts, "Restarted server did not catch up on missed writes")
+
+    def test_new_leader_accepts_writes(self):
+        """
+        Test leader election:
+        - Start 3 servers.
+        - Create an account, then kill the leader (server 0).
+        - Create a second account; the client finds the newly elected leader.
+        - Verify that both surviving servers have both accounts.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+0}")
+        success = client.create_account("before_election_user", hash_password("password1"))
+        self.assertTrue(success, "Account creation failed")
+        time.sleep(2)
+
+        # Kill the leader and give the replicas time to elect a new one.
+        kill_server(self.servers[0])
+        self.servers.pop(0)
+        time.sleep(2)
+
+        success = client.create_account("after_election_user", hash_password("password2"))
+        self.assertTrue(success, "New leader did not accept the write")
+        time.sleep(1)
+
+        for pid in [1, 2]:
+            accounts = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+pid}").list_accounts()
+            self.assertIn("before_election_user", accounts, f"Server {pid} lost data written before the election")
+            self.assertIn("after_election_user", accounts, f"Server {pid} missed data written after the election")
+
+    def test_restarted_leader_does_not_take_writes(self):
+        """
+        Test rejoining after a failover:
+        - Start 3 servers, create an account, then kill the leader (server 0) and let the others elect a new one.
+        - Restart server 0, first with its old database, then with none.
+        - Either way it rejoins as a follower: it names the new leader and refuses writes with "Not the leader".
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+0}")
+        self.assertTrue(client.create_account("before_failover_user", hash_password("password")))
+        time.sleep(1)
+
+        kill_server(self.servers[0])
+        self.servers.pop(0)
+        time.sleep(2)
+
+        for fresh in [False, True]:
+            if fresh:
+                kill_server(self.servers.pop())
+                for name in os.listdir(DATABASE_DIR):
+                    if name.startswith("chat_database_0.db"):
+                        os.remove(os.path.join(DATABASE_DIR, name))
+            self.start_servers([0])
+
+            with grpc.insecure_channel(f"{BASE_HOST}:{BASE_PORT+0}") as channel:
+                stub = chat_pb2_grpc.ChatServiceStub(channel)
+                leader = stub.GetLeader(chat_pb2.GetLeaderRequest())
+                request = chat_pb2.CreateAccountRequest(username=f"split_brain_user_{fresh}", password_hash=hash_password("password"),
+                                                        request_id=f"split-brain-write-{fresh}")
+                with self.assertRaises(grpc.RpcError) as refused:
+                    stub.CreateAccount(request)
+            self.assertIn(leader.leader_pid, [1, 2], "Restarted server 0 does not follow the new leader")
+            self.assertEqual(refused.exception.code(), grpc.StatusCode.FAILED_PRECONDITION)
+            self.assertEqual(refused.exception.details(), "Not the leader")
+
+    def test_replica_reads_see_own_writes(self):
+        """
+        Test follower reads:
+        - Start 3 servers.
+        - Connect a client through leader discovery, so its reads are spread over all servers.
+        - After each new account, the next read (whichever server serves it) includes it.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        self.assertEqual(len(client.replica_stubs), 3, "Client did not learn about all servers")
+        for i in range(6):
+            username = f"replica_read_user_{i}"
+            success = client.create_account(username, hash_password("password"))
+            self.assertTrue(success, "Account creation failed")
+            self.assertIn(username, client.list_accounts(), "Read did not reflect the client's own write")
+
+    def test_client_follows_pushed_leader_change(self):
+        """
+        Test leader change notifications:
+        - Start 3 servers, and connect a client through leader discovery.
+        - Kill the leader (server 0).
+        - Without sending any request, the client switches to the new leader.
+        - A write through the client succeeds right away.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        self.assertEqual(client.leader_address, f"{BASE_HOST}:{BASE_PORT+0}")
+        kill_server(self.servers[0])
+        self.servers.pop(0)
+
+        # The client learns about the new leader from a WatchLeader stream
+        deadline = time.time() + 5
+        while client.leader_address.endswith(str(BASE_PORT+0)) and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertNotEqual(client.leader_address, f"{BASE_HOST}:{BASE_PORT+0}", "Client was not told about the new leader")
+        success = client.create_account("pushed_leader_user", hash_password("password"))
+        self.assertTrue(success, "New leader did not accept the write")
+
+    def test_lone_survivor_does_not_elect_itself(self):
+        """
+        Test elections under partitions:
+        - Start 3 servers, create an account, then kill the leader (server 0) and server 1.
+        - Server 2 alone is a minority of the cluster, so over several election timeouts it never becomes leader.
+        - It still answers reads, which the client falls back to.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+2}")
+        self.assertTrue(client.create_account("minority_user", hash_password("password")))
+        time.sleep(1)
+
+        kill_server(self.servers[0])
+        kill_server(self.servers[1])
+        self.servers = [self.servers[2]]
+        time.sleep(3)
+
+        with grpc.insecure_channel(f"{BASE_HOST}:{BASE_PORT+2}") as channel:
+            response = chat_pb2_grpc.ChatServiceStub(channel).GetLeader(chat_pb2.GetLeaderRequest())
+        self.assertNotEqual(response.leader_pid, 2, "A single server out of 3 elected itself")
+        self.assertIn("minority_user", client.list_accounts(), "Reads failed without a leader")
+
+    def test_isolated_leader_loses_its_lease(self):
+        """
+        Test leader leases:
+        - Start 3 servers, then kill both replicas.
+        - The leader alone is no majority, so its lease runs out and it refuses reads that need fresh data.
+        """
+        self.start_servers([0, 1, 2])
+        time.sleep(1)
+        kill_server(self.servers[1])
+        kill_server(self.servers[2])
+        self.servers = [self.servers[0]]
+        time.sleep(2)
+
+        with grpc.insecure_channel(f"{BASE_HOST}:{BASE_PORT+0}") as channel:
+            stub = chat_pb2_grpc.ChatServiceStub(channel)
+            with self.assertRaises(grpc.RpcError) as refused:
+                stub.ListAccounts(chat_pb2.ListAccountsRequest(max_staleness=config.READ_MAX_STALENESS))
+        self.assertEqual(refused.exception.code(), grpc.StatusCode.UNAVAILABLE)
+
+    def test_write_without_majority_fails(self):
+        """
+        Test write acknowledgement:
+        - Start 3 servers, then kill both replicas.
+        - The leader can still log a write, but no majority holds it, so the write is not answered with success.
+        """
+        self.start_servers([0, 1, 2])
+        time.sleep(1)
+        kill_server(self.servers[1])
+        kill_server(self.servers[2])
+        self.servers = [self.servers[0]]
+        time.sleep(2)
+
+        with grpc.insecure_channel(f"{BASE_HOST}:{BASE_PORT+0}") as channel:
+            stub = chat_pb2_grpc.ChatServiceStub(channel)
+            request = chat_pb2.CreateAccountRequest(username="unreplicated_user", password_hash=hash_password("password"),
+                                                    request_id="unreplicated-write")
+            with self.assertRaises(grpc.RpcError) as refused:
+                stub.CreateAccount(request)
+        self.assertEqual(refused.exception.code(), grpc.StatusCode.UNAVAILABLE)
+
+    def test_write_to_replica_is_redirected(self):
+        """
+        Test redirects:
+        - Start 3 servers, and point a client at a replica (server 1).
+        - A write is refused by the replica and retried on the leader it names.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient(server_address=f"{BASE_HOST}:{BASE_PORT+1}")
+        success = client.create_account("redirected_user", hash_password("password"))
+        self.assertTrue(success, "Write was not redirected to the leader")
+        self.assertEqual(client.leader_address, f"{BASE_HOST}:{BASE_PORT+0}")
+
+    def test_retried_write_is_applied_once(self):
+        """
+        Test request deduplication:
+        - Start 3 servers, create two accounts.
+        - Send a message, then resend the same request (same request_id), as a client retry would.
+        - Kill the leader and resend it again to the new leader.
+        - Every attempt returns the same message, and the recipient has exactly one.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("dedup_sender", password_hash_value))
+        self.assertTrue(client.create_account("dedup_recipient", password_hash_value))
+        request = chat_pb2.SendMessageRequest(draft_id=0, recipient="dedup_recipient", sender="dedup_sender",
+                                              content="hello", request_id="dedup-test-1")
+        first = client.stub.SendMessage(request)
+        self.assertTrue(first.success)
+        self.assertEqual(client.stub.SendMessage(request).msg_id, first.msg_id)
+        time.sleep(1)
+
+        kill_server(self.servers[0])
+        self.servers.pop(0)
+        self.assertEqual(client.stub.SendMessage(request).msg_id, first.msg_id, "New leader applied the retry again")
+        inbox_count = client.login("dedup_recipient", password_hash_value)[0]
+        self.assertEqual(inbox_count, 1)
+
+    def test_inbox_counter_follows_writes(self):
+        """
+        Test inbox counters:
+        - Start 3 servers, create two accounts, and send three messages.
+        - Download one message, delete another from the inbox, and delete the downloaded one.
+        - Login reports one message in the inbox, and every server's counter agrees.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("counter_sender", password_hash_value))
+        self.assertTrue(client.create_account("counter_recipient", password_hash_value))
+        msg_ids = [client.send_message(0, "counter_recipient", "counter_sender", f"message {i}") for i in range(3)]
+        self.assertTrue(client.download_message("counter_recipient", msg_ids[0]))
+        self.assertTrue(client.download_message("counter_recipient", msg_ids[0]))
+        self.assertTrue(client.delete_message("counter_recipient", msg_ids[1]))
+        self.assertTrue(client.delete_message("counter_recipient", msg_ids[0]))
+
+        inbox_count, _, inbox_messages = client.login("counter_recipient", password_hash_value)[:3]
+        self.assertEqual(inbox_count, 1)
+        self.assertEqual(len(inbox_messages), 1)
+        time.sleep(1)
+        for pid in [0, 1, 2]:
+            connection = sqlite3.connect(os.path.join(DATABASE_DIR, f"chat_database_{pid}.db"))
+            counter = connection.execute("SELECT inbox_count FROM accounts WHERE username = ?", ("counter_recipient",)).fetchone()[0]
+            connection.close()
+            self.assertEqual(counter, 1, f"Server {pid} has a wrong inbox counter")
+
+    def test_login_and_lists_are_paged(self):
+        """
+        Test pagination:
+        - Start 3 servers, create two accounts, send seven messages and download the two oldest.
+        - Login with a page size of 3 returns the inbox count and only the newest 3 inbox messages.
+        - ListMessages continues from the cursor; ListDrafts pages through drafts the same way.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("page_sender", password_hash_value))
+        self.assertTrue(client.create_account("page_recipient", password_hash_value))
+        msg_ids = [client.send_message(0, "page_recipient", "page_sender", f"message {i}") for i in range(7)]
+        for msg_id in msg_ids[:2]:
+            self.assertTrue(client.download_message("page_recipient", msg_id))
+
+        response = client.stub.Login(chat_pb2.LoginRequest(username="page_recipient", password_hash=password_hash_value, page_size=3))
+        self.assertEqual(response.inbox_count, 5)
+        self.assertEqual([m.msg_id for m in response.inbox_messages], msg_ids[6:3:-1])
+        self.assertEqual(response.next_inbox_cursor, msg_ids[4])
+        self.assertEqual([m.msg_id for m in response.old_messages], msg_ids[1::-1])
+        self.assertEqual(response.next_old_cursor, 0)
+        client.observe_seq(response.seq)
+
+        messages, cursor = client.list_messages("page_recipient", True, response.next_inbox_cursor, page_size=3)
+        self.assertEqual([m.msg_id for m in messages], msg_ids[3:1:-1])
+        self.assertEqual(cursor, 0)
+
+        draft_ids = [client.add_draft("page_recipient", "page_sender", f"draft {i}", 0) for i in range(4)]
+        drafts, cursor = client.list_drafts("page_recipient", 0, page_size=3)
+        self.assertEqual([d.draft_id for d in drafts], draft_ids[:3])
+        drafts, cursor = client.list_drafts("page_recipient", cursor, page_size=3)
+        self.assertEqual([d.draft_id for d in drafts], draft_ids[3:])
+        self.assertEqual(cursor, 0)
+
+    def test_sync_mailbox_streams_whole_mailbox(self):
+        """
+        Test mailbox streaming:
+        - Start 3 servers, create two accounts, send five messages, download the two oldest, and add two drafts.
+        - SyncMailbox streams the inbox (newest first), then the old messages (newest first), then the drafts.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("sync_sender", password_hash_value))
+        self.assertTrue(client.create_account("sync_recipient", password_hash_value))
+        msg_ids = [client.send_message(0, "sync_recipient", "sync_sender", f"message {i}") for i in range(5)]
+        for msg_id in msg_ids[:2]:
+            self.assertTrue(client.download_message("sync_recipient", msg_id))
+        draft_ids = [client.add_draft("sync_recipient", "sync_sender", f"draft {i}", 0) for i in range(2)]
+
+        messages, drafts = [], []
+        for chunk_messages, chunk_drafts in client.sync_mailbox("sync_recipient"):
+            messages.extend(chunk_messages)
+            drafts.extend(chunk_drafts)
+        self.assertEqual([m.msg_id for m in messages], msg_ids[4:1:-1] + msg_ids[1::-1])
+        self.assertEqual([m.inbox for m in messages], [True] * 3 + [False] * 2)
+        self.assertEqual([d.draft_id for d in drafts], draft_ids)
+
+    def test_sync_since_returns_changes_after_failover(self):
+        """
+        Test delta sync:
+        - Start 3 servers, create two accounts, send three messages, and log in as the recipient.
+        - Send a new message, download one, delete another, and add a draft; then kill the leader (server 0).
+        - SyncSince from the login's seq, answered after the failover, returns exactly these changes.
+        - A second SyncSince from the returned seq has nothing new.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("delta_sender", password_hash_value))
+        self.assertTrue(client.create_account("delta_recipient", password_hash_value))
+        msg_ids = [client.send_message(0, "delta_recipient", "delta_sender", f"message {i}") for i in range(3)]
+        login_seq = client.login("delta_recipient", password_hash_value)[7]
+
+        new_msg_id = client.send_message(0, "delta_recipient", "delta_sender", "new message")
+        self.assertTrue(client.download_message("delta_recipient", msg_ids[0]))
+        self.assertTrue(client.delete_message("delta_recipient", msg_ids[1]))
+        draft_id = client.add_draft("delta_recipient", "delta_sender", "draft", 0)
+        time.sleep(1)
+        kill_server(self.servers[0])
+        self.servers.pop(0)
+
+        changes = client.sync_since("delta_recipient", login_seq)
+        self.assertTrue(changes.success)
+        self.assertFalse(changes.full_sync_required)
+        self.assertEqual([(m.msg_id, m.inbox) for m in changes.messages], [(new_msg_id, True), (msg_ids[0], False)])
+        self.assertEqual(list(changes.deleted_msg_ids), [msg_ids[1]])
+        self.assertEqual([d.draft_id for d in changes.drafts], [draft_id])
+        self.assertEqual(changes.inbox_count, 2)
+
+        again = client.sync_since("delta_recipient", changes.seq)
+        self.assertEqual((len(again.messages), len(again.drafts), len(again.deleted_msg_ids)), (0, 0, 0))
+
+    def test_concurrent_writes_are_group_committed(self):
+        """
+        Test group commit:
+        - Start 3 servers and send 40 messages at once from 20 threads, plus a few to an unknown recipient.
+        - Every send to the real recipient gets its own msg_id; the others fail without failing their batch.
+        - Every server holds all 40 messages, logged under consecutive seqs.
+        """
+        self.start_servers([0, 1, 2])
+        client = ChatClient()
+        password_hash_value = hash_password("password")
+        self.assertTrue(client.create_account("burst_sender", password_hash_value))
+        self.assertTrue(client.create_account("burst_recipient", password_hash_value))
+
+        recipients = ["burst_recipient"] * 40 + ["nobody"] * 4
+        with futures.ThreadPoolExecutor(max_workers=20) as pool:
+            msg_ids = list(pool.map(lambda i: client.send_message(0, recipients[i], "burst_sender", f"message {i}"),
+                                    range(len(recipients))))
+        self.assertEqual(msg_ids[40:], [0] * 4)
+        self.assertEqual(len(set(msg_ids[:40])), 40)
+        self.assertNotIn(0, msg_ids[:40])
+
+        inbox_count = client.login("burst_recipient", password_hash_value)[0]
+        self.assertEqual(inbox_count, 40)
+        time.sleep(1)
+        for pid in [0, 1, 2]:
+            connection = sqlite3.connect(os.path.join(DATABASE_DIR, f"chat_database_{pid}.db"))
+            stored = connection.execute("SELECT COUNT(*) FROM messages WHERE username = ?", ("burst_recipient",)).fetchone()[0]
+            seqs = [row[0] for row in connection.execute("SELECT seq FROM replication_log ORDER BY seq")]
+            connection.close()
+            self.assertEqual(stored, 40, f"Server {pid} is missing messages")
+            self.assertEqual(seqs, list(range(seqs[0], seqs[0] + len(seqs))), f"Server {pid} has a gap in its log")
+
+    def test_existing_database_gets_indexes(self):
+        """
+        Test schema migration:
+        - Create a database in the old layout, without indexes and with a duplicated username.
+        - Start server 0 on it.
+        - No account is deleted, usernames are not made UNIQUE while duplicated, and the per-user queries use indexes.
+        """
+        db_path = os.path.join(DATABASE_DIR, "chat_database_0.db")
+        connection = sqlite3.connect(db_path)
+        connection.execute("CREATE TABLE accounts (uuid INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, pwd TEXT NOT NULL, logged_in INTEGER NOT NULL CHECK (logged_in IN (0, 1)))")
+        connection.executemany("INSERT INTO accounts (username, pwd, logged_in) VALUES (?, ?, 0)", [("dup_user", "first"), ("dup_user", "second"), ("other_user", "pwd")])
+        connection.commit()
+        connection.close()
+
+        self.start_servers([0])
+        connection = sqlite3.connect(db_path)
+        self.assertEqual(connection.execute("SELECT username, pwd FROM accounts ORDER BY uuid").fetchall(),
+                         [("dup_user", "first"), ("dup_user", "second"), ("other_user", "pwd")])
+        self.assertIsNone(connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_accounts_username'").fetchone())
+        for query in ["SELECT 1 FROM accounts WHERE username = ?",
+                      "SELECT COUNT(*) FROM messages WHERE username = ? AND inbox = 1",
+                      "SELECT msg_id FROM messages WHERE username = ? AND inbox = 0",
+                      "SELECT draft_id FROM drafts WHERE username = ? ORDER BY draft_id"]:
+            plan = " ".join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + query, ("dup_user",)))
+            self.assertIn("USING", plan, f"Full table scan for: {query}")
+            self.assertNotIn("TEMP B-TREE", plan, f"Extra sort for: {query}")
+        connection.close()
+
 if __name__ == '__main__':
     unittest.main()
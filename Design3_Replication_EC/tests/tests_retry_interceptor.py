@@ -0,0 +1,137 @@
+import unittest
+import collections
+import os
+import sys
+import grpc
+
+# Ensure the parent directory is in sys.path to import our modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from client.retry_interceptor import RetryInterceptor
+from comm import chat_pb2
+from config import config
+
+CallDetails = collections.namedtuple("CallDetails", ["method", "timeout", "metadata", "credentials", "wait_for_ready", "compression"])
+
+class FakeCall(grpc.RpcError):
+    """
+    Outcome of one attempt: a response, or a failure with a status code.
+    """
+    def __init__(self, code=None, details="", trailing_metadata=()):
+        self.status = code
+        self.message = details
+        self.trailers = trailing_metadata
+
+    def result(self):
+        if self.status is not None:
+            raise self
+        return "response"
+
+    def code(self):
+        return self.status
+
+    def details(self):
+        return self.message
+
+    def trailing_metadata(self):
+        return self.trailers
+
+class FakeClient:
+    """
+    Records reconnects instead of looking for a leader.
+    """
+    def __init__(self):
+        self.leader_address = "leader:0"
+        self.reconnects = []
+
+    def reconnect(self, failed_address=None, hint="", deadline=None):
+        self.reconnects.append((failed_address, hint))
+        self.leader_address = hint or f"leader:{len(self.reconnects)}"
+        return True
+
+class TestRetryInterceptor(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (config.CLIENT_RETRY_BASE, config.CLIENT_RETRY_MAX_BACKOFF, config.CLIENT_CALL_DEADLINE)
+        config.CLIENT_RETRY_BASE, config.CLIENT_RETRY_MAX_BACKOFF, config.CLIENT_CALL_DEADLINE = 0.001, 0.01, 1
+        self.client = FakeClient()
+        self.interceptor = RetryInterceptor(self.client)
+        self.details = CallDetails("/chat.ChatService/CreateAccount", None, None, None, None, None)
+
+    def tearDown(self):
+        config.CLIENT_RETRY_BASE, config.CLIENT_RETRY_MAX_BACKOFF, config.CLIENT_CALL_DEADLINE = self.saved
+
+    def run_calls(self, outcomes):
+        """
+        Intercept one call whose attempts end with the given outcomes (the last one repeats).
+        Return: final outcome, list of the request sent by every attempt
+        """
+        attempts = []
+        def continuation(details, request):
+            attempts.append(request.SerializeToString())
+            return outcomes[min(len(attempts), len(outcomes)) - 1]
+        request = chat_pb2.CreateAccountRequest(username="user", password_hash="hash")
+        return self.interceptor.intercept_unary_unary(continuation, self.details, request), attempts
+
+    def test_retries_unavailable_with_same_request_id(self):
+        """
+        An unreachable leader is retried on the new one, with one idempotency token for all attempts.
+        """
+        call, attempts = self.run_calls([FakeCall(grpc.StatusCode.UNAVAILABLE), FakeCall(grpc.StatusCode.UNAVAILABLE), FakeCall()])
+        self.assertEqual(call.result(), "response")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.client.reconnects, [("leader:0", ""), ("leader:1", "")])
+        requests = [chat_pb2.CreateAccountRequest.FromString(attempt) for attempt in attempts]
+        self.assertTrue(requests[0].request_id)
+        self.assertEqual({request.request_id for request in requests}, {requests[0].request_id})
+
+    def test_follows_not_leader_hint(self):
+        """
+        A replica's "Not the leader" answer sends the retry straight to the leader it names.
+        """
+        not_leader = FakeCall(grpc.StatusCode.FAILED_PRECONDITION, "Not the leader", (("leader-address", "leader:7"),))
+        call, attempts = self.run_calls([not_leader, FakeCall()])
+        self.assertEqual(call.result(), "response")
+        self.assertEqual(self.client.reconnects, [("leader:0", "leader:7")])
+
+    def test_other_errors_are_not_retried(self):
+        """
+        Errors that a retry cannot fix are returned right away.
+        """
+        call, attempts = self.run_calls([FakeCall(grpc.StatusCode.INVALID_ARGUMENT)])
+        self.assertEqual(call.code(), grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(self.client.reconnects, [])
+
+    def test_retries_call_cancelled_by_leader_switch(self):
+        """
+        A call cancelled because another call switched leader (closing its channel) is retried on the new leader.
+        """
+        def continuation(details, request):
+            if self.client.leader_address == "leader:0":
+                self.client.leader_address = "leader:3"
+                return FakeCall(grpc.StatusCode.CANCELLED)
+            return FakeCall()
+        request = chat_pb2.CreateAccountRequest(username="user", password_hash="hash")
+        call = self.interceptor.intercept_unary_unary(continuation, self.details, request)
+        self.assertEqual(call.result(), "response")
+        self.assertEqual(self.client.reconnects, [("leader:0", "leader:3")])
+
+    def test_cancelled_call_is_not_retried_on_same_leader(self):
+        """
+        A call cancelled for any other reason is returned right away.
+        """
+        call, attempts = self.run_calls([FakeCall(grpc.StatusCode.CANCELLED)])
+        self.assertEqual(call.code(), grpc.StatusCode.CANCELLED)
+        self.assertEqual(len(attempts), 1)
+
+    def test_gives_up_at_deadline(self):
+        """
+        All attempts share one deadline; after it the last failure is returned.
+        """
+        call, attempts = self.run_calls([FakeCall(grpc.StatusCode.UNAVAILABLE)])
+        self.assertEqual(call.code(), grpc.StatusCode.UNAVAILABLE)
+        self.assertTrue(len(attempts) > 1)
+
+if __name__ == '__main__':
+    unittest.main()